@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { decodeFrame, isIdTable } from './simFrame';
 import JsonView from '@uiw/react-json-view';
 import { githubDarkTheme } from '@uiw/react-json-view/githubDark';
 
@@ -6,16 +7,31 @@ function WebSocketDebugger() {
   const [jsonData, setJsonData] = useState(null);
 
   useEffect(() => {
-    const socket = new WebSocket("ws://localhost:8000/simulation/ws");
+    // query parameters (e.g. ?format=binary&compress=true) are passed on to the server
+    const socket = new WebSocket("ws://localhost:8000/simulation/ws" + window.location.search);
+    socket.binaryType = "arraybuffer";
+    let idTable = null;
 
     socket.onopen = () => {
       console.log("[open] WebSocket connection established");
     };
 
-    socket.onmessage = (event) => {
+    socket.onmessage = async (event) => {
+      if (event.data instanceof ArrayBuffer) {
+        try {
+          setJsonData(await decodeFrame(event.data, idTable));
+        } catch (error) {
+          console.error("Error decoding frame:", error);
+        }
+        return;
+      }
       console.log(`[message] Data received from server: ${event.data}`);
       try {
         const parsedData = JSON.parse(event.data);
+        if (isIdTable(parsedData)) {
+          idTable = parsedData;
+          return;
+        }
         setJsonData(parsedData);
       } catch (error) {
         console.error("Error parsing JSON:", error);
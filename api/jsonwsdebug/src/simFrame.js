@@ -0,0 +1,60 @@
+// Decoder for the binary simulation stream (/simulation/ws?format=binary).
+// Layout and flags mirror api/utils/ws_binary.py.
+
+const VERSION = 1;
+const HEADER_SIZE = 28;
+const FLAG_PAUSED = 1;
+const FLAG_COMPRESSED = 2;
+
+export function isIdTable(message) {
+  return message && message.type === "ids";
+}
+
+async function inflate(bytes) {
+  // zlib stream, "deflate" in the Compression Streams API
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Uint8Array(await new Response(stream).arrayBuffer());
+}
+
+export async function decodeFrame(buffer, table) {
+  const header = new DataView(buffer, 0, HEADER_SIZE);
+  const magic = String.fromCharCode(header.getUint8(0), header.getUint8(1));
+  const version = header.getUint8(2);
+  if (magic !== "SF" || version !== VERSION) {
+    throw new Error(`Not a version ${VERSION} simulation frame`);
+  }
+  const flags = header.getUint8(3);
+  const nE1 = header.getUint16(20, true);
+  const nE2 = header.getUint16(22, true);
+  const nTls = header.getUint16(24, true);
+  const tableNumber = header.getUint16(26, true);
+  if (!table || table.table !== tableNumber) {
+    throw new Error(`Frame uses id table ${tableNumber}, waiting for it`);
+  }
+
+  let body = new Uint8Array(buffer, HEADER_SIZE);
+  if (flags & FLAG_COMPRESSED) {
+    body = await inflate(body);
+  }
+  const view = new DataView(body.buffer, body.byteOffset, body.byteLength);
+  const float = (i) => view.getFloat32(4 * i, true);
+  const intOffset = 4 * 2 * (nE1 + nE2);
+  const uint = (i) => view.getUint16(intOffset + 2 * i, true);
+
+  const detectors = (ids, floatStart, n, intStart) =>
+    Object.fromEntries(ids.map((id, i) => [id, {
+      vehicle_count: uint(intStart + i),
+      occupancy: float(floatStart + i),
+      mean_speed: float(floatStart + n + i),
+    }]));
+
+  return {
+    seq: header.getUint32(4, true),
+    time: header.getFloat64(8, true),
+    vehicles: header.getUint32(16, true),
+    paused: Boolean(flags & FLAG_PAUSED),
+    e1_sensors: detectors(table.e1, 0, nE1, 0),
+    e2_sensors: detectors(table.e2, 2 * nE1, nE2, nE1),
+    traffic_lights: Object.fromEntries(table.tls.map((id, i) => [id, uint(nE1 + nE2 + i)])),
+  };
+}
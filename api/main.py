@@ -1,6 +1,10 @@
 from fastapi import FastAPI
 from .routes.simulation import sim_router
 from .routes.model_api import model_router
+from .routes.metrics import metrics_router
+from .routes.replay import replay_router
+from .routes.debug import debug_router
+from .routes.configuration import config_router
 from .utils.logger import logger
 from asyncio import Event
 #from model.environment import TrafficControlEnv
@@ -44,6 +48,10 @@ if not hasattr(app.state, 'status_message'):
 #rutas 
 app.include_router(sim_router)
 app.include_router(model_router)
+app.include_router(metrics_router)
+app.include_router(replay_router)
+app.include_router(debug_router)
+app.include_router(config_router)
 
 @app.get("/")
 def app_root():
@@ -1,8 +1,11 @@
 from enum import Enum
+from typing import Optional
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
-from model.rewards import reward_composite, reward_maximize_speed, reward_minimize_queue_length, reward_minimize_waiting_time
+from model.rewards import (REWARD_COMPONENTS, parse_weights, reward_composite, reward_maximize_speed,
+                           reward_minimize_queue_length, reward_minimize_waiting_time)
+from model.rewards import reward_weights as weight_vector
 
 class ModelType(str, Enum):
     DQN = "DQN"
@@ -20,6 +23,10 @@ class ConfigRequest(BaseModel):
 
 config_router = APIRouter()
 
+# read by /train: model type and RewardEngine reward (preset name or {component: weight})
+selected_model = "PPO"
+selected_reward_function = "waiting_time"
+
 @config_router.post("/configdeprec", tags=["Configuration"])
 async def configure_model(config: ConfigRequest):
     global srl_env, selected_model, reward_function
@@ -51,23 +58,35 @@ async def configure_model(config: ConfigRequest):
 
 
 @config_router.post("/configure", tags= ["Configuration"])
-async def configure_training(model_name: str, reward_function: str):
+async def configure_training(
+    model_name: str,
+    reward_function: str = "waiting_time",
+    reward_weights: Optional[str] = Query(
+        None,
+        description=f"Custom composite overriding reward_function, e.g. 'queue=-0.5,speed=0.2' "
+                    f"(components: {', '.join(REWARD_COMPONENTS)})"
+    )
+):
     """
     Endpoint to configure model training.
     Args:
         model_name (str): Type of model ('PPO' or 'DQN').
-        reward_function (str): Reward function ('queue_length', 'waiting_time', 'speed', 'hybrid').
+        reward_function (str): Reward preset ('queue_length', 'waiting_time', 'speed', 'throughput', 'pressure', 'hybrid').
+        reward_weights (str): Weighted composite of reward components, replaces the preset.
     """
     global selected_model, selected_reward_function
 
     if model_name not in ["PPO", "DQN"]:
         return {"status": "error", "message": "Invalid model_name. Choose 'PPO' or 'DQN'."}
 
-    if reward_function not in ["queue_length", "waiting_time", "speed", "hybrid"]:
-        return {"status": "error", "message": "Invalid reward_function. Choose 'queue_length', 'waiting_time', 'speed', or 'hybrid'."}
+    try:
+        reward = parse_weights(reward_weights) if reward_weights else reward_function
+        weight_vector(reward)
+    except ValueError as e:
+        return {"status": "error", "message": f"Invalid reward: {str(e)}"}
 
     selected_model = model_name
-    selected_reward_function = reward_function
+    selected_reward_function = reward
 
     return {"status": "Configuration updated", "model": selected_model, "reward_function": selected_reward_function}
 
@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from api.utils.sim_registry import simulation_registry
+from api.utils.tracing import tracer
+
+
+# Pipeline traces and TraCI call accounting, see api/utils/tracing.py
+debug_router = APIRouter()
+
+
+@debug_router.get("/debug/traces", tags=["Debug"])
+async def recent_traces(
+    limit: int = Query(50, ge=1, le=1000, description="Most recent traces to return"),
+    name: Optional[str] = Query(None, description="Only traces of this kind: ws_frame, ws_send, step, env_step")
+):
+    """Latest traces with their spans, durations, round trips and bytes"""
+    return {"enabled": tracer.enabled, "traces": tracer.recent(limit, name)}
+
+
+@debug_router.get("/debug/traces/histograms", tags=["Debug"])
+async def trace_histograms():
+    """Latency histogram, percentiles and mean TraCI traffic of every trace and span"""
+    return {"enabled": tracer.enabled, **tracer.histograms()}
+
+
+@debug_router.delete("/debug/traces", tags=["Debug"])
+async def reset_traces():
+    tracer.reset()
+    return {"status": "Traces cleared"}
+
+
+@debug_router.get("/debug/traci", tags=["Debug"])
+async def traci_counters():
+    """Round trips, bytes and commands per simulation since tracing was enabled"""
+    return {
+        "enabled": tracer.enabled,
+        "simulations": {
+            sim.sim_id: sim.traci_counter.to_dict() if sim.traci_counter is not None else None
+            for sim in simulation_registry.list()
+        }
+    }
+
+
+@debug_router.post("/debug/tracing", tags=["Debug"])
+async def set_tracing(enabled: bool = Query(..., description="Turn tracing on or off")):
+    """Toggle tracing at runtime; counters stay installed once a connection was wrapped"""
+    tracer.enabled = enabled
+    if enabled:
+        simulation_registry.install_counters()
+    return {"enabled": tracer.enabled}
@@ -0,0 +1,55 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.routes.simulation import get_simulation
+from api.utils.sim_registry import SimulationInstance
+
+
+# History of the per-step metrics, read from the simulation's MetricsStore
+metrics_router = APIRouter()
+
+
+
+@metrics_router.get("/metrics", tags=["Monitoring"])
+async def get_metrics_catalog(sim: SimulationInstance = Depends(get_simulation)):
+    """Recorded kinds, their metrics and entity ids, retention and time range"""
+    return {"sim_id": sim.sim_id, **sim.metrics.catalog()}
+
+
+@metrics_router.get("/metrics/{kind}/latest", tags=["Monitoring"])
+async def get_latest_metrics(kind: str, sim: SimulationInstance = Depends(get_simulation)):
+    try:
+        return sim.metrics.latest(kind)
+    except KeyError:
+        raise HTTPException(404, f"Unknown metric kind '{kind}'")
+
+
+@metrics_router.get("/metrics/{kind}/{metric}", tags=["Monitoring"])
+async def get_metric_series(
+    kind: str,
+    metric: str,
+    sim: SimulationInstance = Depends(get_simulation),
+    ids: Optional[str] = Query(None, description="Comma separated entity ids, all when omitted"),
+    start: Optional[float] = Query(None, description="Simulation time to start from"),
+    end: Optional[float] = Query(None, description="Simulation time to end at"),
+    resolution: Optional[float] = Query(None, gt=0, description="Bucket size in seconds (min/mean/max)"),
+    points: Optional[int] = Query(None, ge=1, le=10000, description="Number of buckets (min/mean/max)")
+):
+    """
+    Time series of ``metric`` for the entities of ``kind``
+    (e1, e2, lanes, tls, directions, simulation, and the detector outputs
+    e1_log, e2_log, one series per detector on its own interval clock).
+
+    Raw values per recorded step, or min/mean/max per bucket when
+    ``resolution`` or ``points`` is given.
+    """
+    try:
+        return sim.metrics.query(
+            kind, metric,
+            ids=ids.split(",") if ids else None,
+            start=start, end=end,
+            resolution=resolution, points=points
+        )
+    except KeyError as e:
+        raise HTTPException(404, str(e.args[0]))
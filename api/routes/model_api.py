@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from api.routes import configuration
 from model.training import train_model
 from model.environment import TrafficControlEnv
 from threading import Thread
@@ -7,11 +8,6 @@ import matplotlib.pyplot as plt
 # Creating a router instance for model training-related endpoints
 model_router = APIRouter()
 
-# Define variables to store selected model and reward function
-selected_model = "PPO"
-selected_reward_function = "waiting_time"
-
-
 
 @model_router.post("/train")
 async def train_model_endpoint(timesteps: int):
@@ -20,7 +16,9 @@ async def train_model_endpoint(timesteps: int):
     Args:
         timesteps (int): Number of training steps.
     """
-    global selected_model, selected_reward_function
+    # model and reward as last set by /configure
+    selected_model = configuration.selected_model
+    selected_reward_function = configuration.selected_reward_function
 
     # Initialize the environment with the selected reward function
     env = TrafficControlEnv(reward_fn=selected_reward_function)
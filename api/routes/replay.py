@@ -0,0 +1,136 @@
+import os
+import re
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.routes.simulation import get_simulation
+from api.utils.replay import ReplayManager, SnapshotRecorder, list_recordings
+from api.utils.sim_registry import SimulationInstance, simulation_registry
+from api.utils.sumo_backend import sumo_cfg
+
+
+# Recording snapshots to disk and serving them again without SUMO
+replay_router = APIRouter()
+
+RECORDINGS_DIR = sumo_cfg.get("recordings_dir", "recordings")
+
+
+def _recording_path(name: str) -> str:
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise HTTPException(422, f"Invalid recording name '{name}'")
+    return os.path.join(RECORDINGS_DIR, name)
+
+
+def _replay_manager(sim: SimulationInstance) -> ReplayManager:
+    if not isinstance(sim.manager, ReplayManager):
+        raise HTTPException(409, f"Simulation '{sim.sim_id}' is not a replay")
+    return sim.manager
+
+
+def _play(sim: SimulationInstance, speed: float):
+    """(Re)start paced playback from the current frame, ``speed`` 0 runs as fast as possible"""
+    manager = _replay_manager(sim)
+    sim.driver.cancel_run()
+    remaining = len(manager.recording) - 1 - manager.position
+    if remaining <= 0:
+        return None
+    return sim.driver.start_run(steps=remaining, interval=manager.delta_t / speed if speed > 0 else 0.0)
+
+
+
+### Recording
+@replay_router.post("/simulation/record", tags=["Replay"])
+async def start_recording(
+    sim: SimulationInstance = Depends(get_simulation),
+    name: Optional[str] = Query(None, description="Recording name, <sim_id>-<timestamp> by default")
+):
+    """Append every step of the simulation to a recording under ``recordings_dir``"""
+    if sim.manager.snapshot is None:
+        raise HTTPException(409, "Simulation not running")
+    if sim.manager.recorder is not None or isinstance(sim.manager, ReplayManager):
+        raise HTTPException(409, f"Simulation '{sim.sim_id}' is already recording or a replay")
+
+    name = name or f"{sim.sim_id}-{time.strftime('%Y%m%d-%H%M%S')}"
+    path = _recording_path(name)
+    try:
+        recorder = SnapshotRecorder.for_manager(sim.manager, path, sim.cfg_file)
+    except FileExistsError as e:
+        raise HTTPException(409, str(e))
+    await sim.driver.call(sim.manager.attach_recorder, recorder)
+    return {"status": "recording", "name": name, "sim_id": sim.sim_id}
+
+
+@replay_router.post("/simulation/record/stop", tags=["Replay"])
+async def stop_recording(sim: SimulationInstance = Depends(get_simulation)):
+    recorder = await sim.driver.call(sim.manager.detach_recorder) if sim.manager.recorder else None
+    if recorder is None:
+        raise HTTPException(409, f"Simulation '{sim.sim_id}' is not recording")
+    return {"status": "stopped", **recorder.to_dict()}
+
+
+@replay_router.get("/recordings", tags=["Replay"])
+async def get_recordings():
+    if not os.path.isdir(RECORDINGS_DIR):
+        return []
+    return list_recordings(RECORDINGS_DIR)
+
+
+
+### Replay
+@replay_router.post("/replay/start", tags=["Replay"])
+async def start_replay(
+    name: str = Query(..., description="Recording to replay"),
+    sim_id: str = Query("replay", description="Instance id the replay is served as"),
+    speed: float = Query(1.0, ge=0, description="Playback speed, 1 = real time, 0 = as fast as possible"),
+    autoplay: bool = Query(True, description="Start playing right away")
+):
+    """Serve a recording through /simulation/ws and the REST getters (``?sim_id=``)"""
+    try:
+        sim = await simulation_registry.start_replay(sim_id, _recording_path(name))
+    except FileNotFoundError:
+        raise HTTPException(404, f"Recording '{name}' not found")
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+
+    run = _play(sim, speed) if autoplay else None
+    return {"sim_id": sim_id, **sim.manager.recording.to_dict(), "run": run.to_dict() if run else None}
+
+
+@replay_router.post("/replay/play", tags=["Replay"])
+async def play_replay(
+    sim: SimulationInstance = Depends(get_simulation),
+    speed: float = Query(1.0, ge=0, description="Playback speed, 1 = real time, 0 = as fast as possible")
+):
+    sim.driver.resume()
+    run = _play(sim, speed)
+    return {"sim_id": sim.sim_id, "run": run.to_dict() if run else None}
+
+
+@replay_router.post("/replay/seek", tags=["Replay"])
+async def seek_replay(
+    sim: SimulationInstance = Depends(get_simulation),
+    time_: float = Query(..., alias="time", ge=0, description="Simulation time to jump to")
+):
+    """Jump to the last frame at or before ``time``, playback continues from there"""
+    manager = _replay_manager(sim)
+    snapshot = await sim.driver.call(manager.seek, time_)
+    run = sim.driver.current_run
+    if run is not None and run.status == "running":
+        # keep the pace, the remaining frames changed
+        run = _play(sim, manager.delta_t / run.interval if run.interval else 0.0)
+    return {"sim_id": sim.sim_id, "time": snapshot.time, "position": manager.position}
+
+
+@replay_router.get("/replay/status", tags=["Replay"])
+async def get_replay_status(sim: SimulationInstance = Depends(get_simulation)):
+    manager = _replay_manager(sim)
+    run = sim.driver.current_run
+    return {
+        **sim.to_dict(),
+        "recording": manager.recording.to_dict(),
+        "position": manager.position,
+        "finished": manager.finished,
+        "run": run.to_dict() if run else None
+    }
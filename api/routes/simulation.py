@@ -4,22 +4,26 @@ import os
 from contextlib import asynccontextmanager
 
 from fastapi.responses import StreamingResponse
-import traci
+from api.utils.sumo_backend import traci
 
 from model.environment import TrafficControlEnv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import time
-import xmltodict
 import asyncio
-from typing import List, Dict, Annotated, Optional
+from typing import List, Dict, Annotated, FrozenSet, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, Query
 #from model.gymenv import TrafficControlEnv
-from api.schemas.models import WebSocketResponse, SimulationStartConfig, SimulationRunConfig
+from api.schemas.models import WebSocketResponse, SimulationStartConfig, SimulationRunConfig, VehicleContextSubscriptionData
 from api.services import lane_service, sensors_service, traffic_light_service
 from api.utils.traci_env import sumo_cfg, try_reconnect_sumo
 import api.utils.traci_env as traci_env
+from api.utils.traci_subscriptions import subscription_manager
+from api.utils.net_model import load_scenario
+from api.utils.sim_registry import DEFAULT_SIM_ID, SimulationInstance, simulation_registry
 from api.utils.model_observation import convert_numpy_to_lists
+from api.utils.ws_hub import broadcast_hubs
+from api.utils.tracing import tracer
 from api.utils.logger import logger
 import api.services.vehicle_service as veh_service
 
@@ -28,26 +32,61 @@ import api.services.vehicle_service as veh_service
 sim_router = APIRouter()
 
 
+def get_simulation(
+    sim_id: str = Query(DEFAULT_SIM_ID, description="Simulation instance id")
+) -> SimulationInstance:
+    try:
+        return simulation_registry.get(sim_id)
+    except KeyError:
+        raise HTTPException(404, f"Simulation '{sim_id}' not found")
+
+
 @sim_router.get("/simulation/details", tags=["Simulation"])
 async def get_simulation_details():
     try:
-        with open("../../escenario/osm2.sumocfg") as xmlcfg:
-            sumo_cfg["content"] = xmltodict.parse(xmlcfg.read())
-        return sumo_cfg
+        # parsed once per cfg change, the network model comes from the on-disk cache
+        config, network = load_scenario(sumo_cfg['cfg_file'])
+        return {**sumo_cfg, "content": config, "network": network.summary()}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting simulation details: {e}")
 
 
 
+### Network topology, answered from the offline model (no SUMO needed)
+@sim_router.get("/network/lanes", tags=["Network"])
+async def get_network_lanes():
+    _, network = load_scenario(sumo_cfg['cfg_file'])
+    return {
+        direction: {lane_id: network.lane_length_of(lane_id) for lane_id in lanes}
+        for direction, lanes in network.lanes_by_direction().items()
+    }
+
+
+@sim_router.get("/network/trafficlights/{tls_id}", tags=["Network"])
+async def get_network_traffic_light(tls_id: str):
+    _, network = load_scenario(sumo_cfg['cfg_file'])
+    if tls_id not in network.tls_index:
+        raise HTTPException(404, f"Traffic light '{tls_id}' not found")
+    return {
+        "tls_id": tls_id,
+        "controlled_lanes": network.controlled_lanes(tls_id),
+        "links": network.controlled_links(tls_id),
+        "phases": network.phases(tls_id)
+    }
+
+
+
 @sim_router.get("/simulation/status", tags=["Simulation"])
-async def get_simulation_status(request: Request):
+async def get_simulation_status(sim: SimulationInstance = Depends(get_simulation)):
     try:
-        app = request.app
-        if app.state.sumo_pid:
+        if sim.proc:
+            run = sim.driver.current_run
             return {
                 "status": True, 
-                "PID": app.state.sumo_pid.pid,
-                "paused": app.state.pause_event
+                "sim_id": sim.sim_id,
+                "PID": sim.proc.pid,
+                "paused": sim.driver.paused,
+                "run": run.to_dict() if run else None
                 }
         else:
             return {"status": False}
@@ -57,33 +96,23 @@ async def get_simulation_status(request: Request):
 
 
 @sim_router.post("/simulation/stop", tags=["Simulation"])
-async def stop_simulation(request: Request):
-    try:
-        app = request.app
-        
-        try:
-            traci_env.traci.close() # attempt to close traci connection
-            await asyncio.sleep(1) # wait for it to stop gracefully
-
-            if app.state.sumo_pid:
-                app.state.sumo_pid.terminate()
-                # X traci_env.close_traci() # -> traci.terminate
-                app.state.status_message = "Simulation stopped"
-                app.state.sumo_pid = None
-
-                traci.close()
-            else:
-                app.state.status_message = "No active simulation to stop"
-                return {"status": "Simulation not running"}
-    
-        except Exception as e:
-            print(f"Error closing traci connection: {e}")
+async def stop_simulation(request: Request, sim: SimulationInstance = Depends(get_simulation)):
+    app = request.app
+    if not sim.proc:
+        if sim.sim_id == DEFAULT_SIM_ID:
+            app.state.status_message = "No active simulation to stop"
+        return {"status": "Simulation not running"}
 
+    try:
+        # cancels the run, closes TraCI on the driver thread and terminates SUMO
+        await simulation_registry.stop(sim.sim_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error stopping simulation: {e}")
-    finally:
+
+    if sim.sim_id == DEFAULT_SIM_ID:
+        app.state.sumo_pid = None
         app.state.status_message = "No active simulation"
-        return {"status": "Simulation stopped successfully"}
+    return {"status": "Simulation stopped successfully", "sim_id": sim.sim_id}
    
 
 
@@ -97,6 +126,7 @@ async def stop_simulation(request: Request):
 )
 async def simulation_step(
     request: Request,
+    sim: SimulationInstance = Depends(get_simulation),
     steps: Annotated[
         int,
         Query(
@@ -115,20 +145,17 @@ async def simulation_step(
     - Status message with step count execution confirmation
     """
     try:
-        app = request.app
-        if not traci_env.is_traci_loaded():
+        if sim.manager.snapshot is None:
             return {"status": "TraCI not connected"}
         
-        executed = 0
-        for _ in range(steps):
-            if app.state.pause_event.is_set():
-                traci_env.simulationStep()
-                executed += 1
-            else:
-                await asyncio.sleep(0.1)
+        # steps run on the driver thread, the event loop keeps serving clients
+        with tracer.trace("step", sim.sim_id, sim.traci_counter):
+            executed = await sim.driver.step(steps)
         
         return {"status": f"Advanced {executed}/{steps} steps"}
     
+    except RuntimeError as e:  # a background run is stepping
+        raise HTTPException(409, detail=str(e))
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
@@ -149,7 +176,8 @@ async def start_simulation(
     step_length: float = Query(1.0, description="Simulation step duration in seconds"),
     num_steps: int = Query(0, description="Immediate steps to execute (headless only)"),
     autostart: bool = Query(True, description="Auto-start GUI simulation"),
-    gui_delay: int = Query(20, description="GUI refresh delay in milliseconds")
+    gui_delay: int = Query(20, description="GUI refresh delay in milliseconds"),
+    sim_id: str = Query(DEFAULT_SIM_ID, description="Id of the instance to start")
 ):
     """Initialize SUMO simulation instance"""
     try:
@@ -157,13 +185,8 @@ async def start_simulation(
 
         app.state.status_message = "Simulation starting..."
 
-        proc = await traci_env.initialize_traci(
-            use_gui=use_gui,
-            step_length=step_length,
-            autostart=autostart,
-            gui_delay=gui_delay,
-            num_steps=num_steps
-        )
+        cmd = traci_env.build_sumo_cmd(use_gui, step_length, autostart, gui_delay)
+        sim = await simulation_registry.start(sim_id, cmd)
 
 
         if not hasattr(app.state, "pause_event"):
@@ -173,15 +196,18 @@ async def start_simulation(
             app.state.status_message = "Simulation running"
 
 
-        app.state.sumo_pid = proc
-        app.state.status_message = f"Simulation started on port {str(sumo_cfg['port'])} with PID {proc.pid}"
+        if sim_id == DEFAULT_SIM_ID:
+            app.state.sumo_pid = sim.proc
+        app.state.status_message = sim.status_message
         
         return {
             "status": f"Simulation {'GUI' if use_gui else 'headless'} started",
+            "sim_id": sim.sim_id,
             "steps_executed": num_steps,
-            "port": sumo_cfg['port'],
-            "message": app.state.status_message,
-            "pid": proc.pid
+            "backend": traci_env.backend.name,
+            "port": sim.port,
+            "message": sim.status_message,
+            "pid": sim.proc.pid
         }
     
     except FileNotFoundError as e:
@@ -192,6 +218,9 @@ async def start_simulation(
         logger.error(f"TraCI failed: {str(e)}")
         app.state.status_message = f"Startup failed, {str(e)}"
         raise HTTPException(500, detail="TraCI connection failed")
+    except ValueError as e:
+        app.state.status_message = f"Startup failed, {str(e)}"
+        raise HTTPException(400, detail=str(e))
 
 
 
@@ -206,69 +235,161 @@ async def start_simulation(
 )
 async def run_simulation(
     request: Request,
+    sim: SimulationInstance = Depends(get_simulation),
     timestep: float = Query(100.0, description="Update interval in milliseconds")
 ):
-    """Run continuous simulation with flow control"""
+    """Start a continuous run on the simulation driver and return its handle"""
     app = request.app
-    app.state.status_message = "Simulation running"
 
     try:
-        proc = await traci_env.initialize_traci(
-            use_gui=False,
-            step_length=1,
-            gui_delay=timestep,
-            num_steps=100000
-        )
-
-        n = 0
-        while n <= 100000: # 100k steps
-            # Check if simulation is paused
-            await app.state.pause_event.wait()
-            
-            # Perform simulation step
-            traci.simulationStep()
-            
-            # Throttle to real-time pacing
-            await asyncio.sleep(timestep / 1000)  # Convert ms to seconds
-            n += 1
-        
-        proc.terminate()
-            
+        if not sim.running:
+            await simulation_registry.start(sim.sim_id, traci_env.build_sumo_cmd(use_gui=False, step_length=1))
+            if sim.sim_id == DEFAULT_SIM_ID:
+                app.state.sumo_pid = sim.proc
+
+        # 100k steps paced on the driver thread, pause/resume via /simulation/pause_simulation
+        run = sim.driver.start_run(steps=100000, interval=timestep / 1000)
+        app.state.status_message = "Simulation running"
+        return run.to_dict()
+
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(409, detail=str(e))
     except traci.TraCIException as e:
         logger.error(f"TraCI error: {str(e)}")
         raise HTTPException(500, detail="Lost connection to SUMO")
 
 
 
+@sim_router.post("/simulation/fast_forward", tags=["Simulation"],
+    summary="Advance to a target time as fast as SUMO allows",
+    response_description="Background run handle, poll /simulation/run/{run_id}"
+)
+async def fast_forward_simulation(
+    request: Request,
+    sim: SimulationInstance = Depends(get_simulation),
+    until_time: Optional[float] = Query(None, gt=0, description="Target simulation time in seconds"),
+    steps: Optional[int] = Query(None, ge=1, description="Steps to advance, instead of until_time"),
+    chunk_steps: int = Query(100, ge=1, le=100000, description="Steps per simulationStep call (progress granularity)"),
+    sample_every: Optional[int] = Query(None, ge=1, description="Record a sample every N steps (sets chunk_steps)")
+):
+    """Headless fast-forward on the driver thread: no pacing, no per-step round trips"""
+    if sim.manager.snapshot is None:
+        raise HTTPException(400, "Simulation not running")
+
+    hooks = []
+    if sample_every:
+        chunk_steps = sample_every
+        samples = []
+        hooks.append(lambda snapshot: samples.append({
+            "time": snapshot.time,
+            "vehicles": snapshot.vehicle_count,
+            "halting": sum(lane["halting_number"] for lane in snapshot.lanes.values()),
+            "arrived": len(snapshot.arrived)
+        }))
+
+    try:
+        run = sim.driver.start_fast_forward(until_time=until_time, steps=steps, chunk_steps=chunk_steps, hooks=hooks)
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(409, detail=str(e))
+    if sample_every:
+        run.samples = samples
+    if sim.sim_id == DEFAULT_SIM_ID:
+        request.app.state.status_message = "Simulation fast-forwarding"
+    return run.to_dict()
+
+
+
+@sim_router.get("/simulation/run/{run_id}", tags=["Simulation"],
+    summary="Background run progress"
+)
+async def get_run_status(
+    run_id: int,
+    sim: SimulationInstance = Depends(get_simulation),
+    samples: bool = Query(False, description="Include the samples recorded by the run")
+):
+    run = sim.driver.get_run(run_id)
+    if run is None:
+        raise HTTPException(404, "Run not found")
+    return run.to_dict(samples=samples)
+
+
+
+@sim_router.post("/simulation/run/{run_id}/cancel", tags=["Simulation"])
+async def cancel_run(run_id: int, sim: SimulationInstance = Depends(get_simulation)):
+    run = sim.driver.get_run(run_id)
+    if run is None:
+        raise HTTPException(404, "Run not found")
+    if run is sim.driver.current_run:
+        sim.driver.cancel_run()
+    return run.to_dict()
+
+
+
 
 
 # pause and resume actions
 @sim_router.post("/simulation/pause_simulation", tags=["Simulation"])
-async def pause_simulation(request: Request):
+async def pause_simulation(request: Request, sim: SimulationInstance = Depends(get_simulation)):
     app = request.app
     
     if not hasattr(app.state, "pause_event"):
         raise HTTPException(500, "Simulation not initialized")
 
     # Toggle state
-    if app.state.pause_event.is_set():
-        app.state.pause_event.clear()
+    if not sim.driver.paused:
+        sim.driver.pause()
         status = "paused"
-        app.state.status_message = "Simulation paused"
+        sim.status_message = "Simulation paused"
     else:
-        app.state.pause_event.set()
+        sim.driver.resume()
         status = "running"
-        app.state.status_message = "Simulation resumed"
+        sim.status_message = "Simulation resumed"
+
+    if sim.sim_id == DEFAULT_SIM_ID:
+        if sim.driver.paused:
+            app.state.pause_event.clear()
+        else:
+            app.state.pause_event.set()
+        app.state.status_message = sim.status_message
+
+    return {"status": status, "sim_id": sim.sim_id, "paused": sim.driver.paused}
+
 
-    return {"status": status, "paused": not app.state.pause_event.is_set()}
+
+@sim_router.get("/simulation/instances", tags=["Simulation"],
+    summary="List simulation instances"
+)
+async def list_simulations():
+    return [sim.to_dict() for sim in simulation_registry.list()]
+
+
+
+@sim_router.post("/simulation/instances", tags=["Simulation"],
+    summary="Start several headless instances side by side",
+    response_description="The started instances, address them with ?sim_id="
+)
+async def start_simulations(
+    count: int = Query(1, ge=1, le=32, description="Number of instances to start"),
+    step_length: float = Query(1.0, description="Simulation step duration in seconds"),
+    cfg_file: Optional[str] = Query(None, description="sumocfg to run, defaults to sumo_config.json")
+):
+    try:
+        cmd = traci_env.build_sumo_cmd(step_length=step_length, cfg_file=cfg_file)
+        started = await simulation_registry.start_many(count, cmd)
+        return [sim.to_dict() for sim in started]
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    except (ConnectionError, traci.FatalTraCIError) as e:
+        raise HTTPException(500, detail=f"TraCI connection failed: {e}")
 
 
 
 @sim_router.get("/simulation/tls_test", tags=["Simulation", "Test"])
-async def test_tls_data():
-    data = traffic_light_service.get_traffic_lights_data()
-    data_aggregate = sensors_service.aggregate_e2_sensor_data_per_edge(),
-    sensors_ids = sensors_service.get_sensor_ids()
+async def test_tls_data(sim: SimulationInstance = Depends(get_simulation)):
+    snapshot = sim.manager.snapshot
+    data = traffic_light_service.get_traffic_lights_data(snapshot)
+    data_aggregate = sensors_service.aggregate_e2_sensor_data_per_edge(snapshot),
+    sensors_ids = sensors_service.get_sensor_ids(snapshot)
     return {
         "raw": data,
         "raw_e2_aggregate": data_aggregate,
@@ -284,6 +405,7 @@ async def streaming_start_simulation(
 ):
     """Start simulation with real-time streaming updates"""
     app = request.app
+    sim = simulation_registry.get(DEFAULT_SIM_ID)
     
     async def event_stream():
         # Check for existing live process
@@ -292,15 +414,12 @@ async def streaming_start_simulation(
                 yield {"status": "already_running", "pid": app.state.sumo_pid.pid}
                 
                 # Verify TraCI connection
-                if traci.isLoaded():
-                    try:
-                        traci.simulation.getTime()
-                        yield {"status": "reusing_connection"}
-                    except traci.TraCIException:
-                        traci.close()
-                        yield {"status": "reconnecting"}
-                        await _initialize_traci_connection()
+                connection = await sim.driver.call(_probe_connection)
+                if connection == "reusing_connection":
+                    yield {"status": connection}
                 else:
+                    if connection == "reconnecting":
+                        yield {"status": connection}
                     await _initialize_traci_connection()
                 
                 # Skip to streaming
@@ -314,18 +433,9 @@ async def streaming_start_simulation(
 
         # Fresh start
         try:
-            proc = await asyncio.create_subprocess_exec(
-                'sumo-gui' if use_gui else 'sumo',
-                '-c', sumo_cfg['cfg_file'],
-                '--remote-port', str(sumo_cfg['port']),
-                '--step-length', str(step_length),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT
-            )
-            app.state.sumo_pid = proc
+            await simulation_registry.start(DEFAULT_SIM_ID, traci_env.build_sumo_cmd(use_gui, step_length))
+            proc = app.state.sumo_pid = sim.proc
             yield {"status": "process_started", "pid": proc.pid}
-
-            await _initialize_traci_connection()
             yield {"status": "connected"}
             
             # Initialize pause event if not exists
@@ -342,11 +452,23 @@ async def streaming_start_simulation(
                 app.state.sumo_pid = None
 
 
+    def _probe_connection() -> Optional[str]:
+        """Whether the default connection still answers, on the driver thread: None when it is not loaded"""
+        if not traci.isLoaded():
+            return None
+        try:
+            traci.simulation.getTime()
+            return "reusing_connection"
+        except traci.TraCIException:
+            traci_env.close_traci()
+            return "reconnecting"
+
     async def _initialize_traci_connection():
-        """Helper to establish TraCI connection"""
+        """Helper to establish TraCI connection (on the driver thread, like every TraCI call)"""
         for attempt in range(3):
             try:
-                traci.init(sumo_cfg['port'])
+                await sim.driver.call(traci.init, sumo_cfg['port'])
+                await sim.driver.call(sim.manager.subscribe_all)
                 return
             except traci.FatalTraCIError:
                 await asyncio.sleep(0.5 * (attempt + 1))
@@ -363,8 +485,8 @@ async def streaming_start_simulation(
             try:
                 yield {
                     "status": "running",
-                    "time": traci.simulation.getTime(),
-                    "vehicles": traci.vehicle.getIDCount(),
+                    "time": subscription_manager.snapshot.time,
+                    "vehicles": subscription_manager.snapshot.vehicle_count,
                     "paused": not app.state.pause_event.is_set(),
                     "timestamp": time.time()
                 }
@@ -408,46 +530,99 @@ async def streaming_start_simulation(
 
 ### WebSockets: real-time data streaming
 @sim_router.websocket("/simulation/ws", name="sim_websocket")
-async def websocket_simulation_ctrl(ws: WebSocket):
+async def websocket_simulation_ctrl(
+    ws: WebSocket,
+    sim_id: str = Query(DEFAULT_SIM_ID, description="Simulation instance id"),
+    queue_size: int = Query(sumo_cfg.get("ws_queue_size", 8), ge=1, description="Frames buffered for this client"),
+    policy: str = Query(sumo_cfg.get("ws_policy", "drop_oldest"), description="drop_oldest | latest"),
+    topics: Optional[str] = Query(None, description="Comma separated: tls,lanes,e1,e2,aggregates,observation,vehicles"),
+    delta: bool = Query(False, description="Send only what changed since the previous frame (needs topics)"),
+    keyframe_every: int = Query(sumo_cfg.get("ws_keyframe_every", 30), ge=1, description="Full frame every n frames"),
+    format: str = Query("json", description="json | binary (packed detector and phase arrays)"),
+    compress: bool = Query(False, description="zlib-compress binary frame bodies")
+):
     """
     Real-time simulation data channel with dual modes:
     - Training Mode: RL observation space + metrics
     - Simulation Mode: Full traffic system metrics
+
+    Frames come from the simulation's broadcast hub, built once per step and
+    shared by all clients. A slow client drops frames according to ``policy``.
+
+    Without ``topics`` every frame is the full WebSocketResponse. With topics,
+    frames are ``{"type": "key"|"delta", "seq", "base", "time", ...}`` and only
+    carry the subscribed fields; delta frames hold the changes against frame
+    ``base`` (removed keys are null). Clients may send
+    ``{"topics": [...], "delta": bool}`` or ``{"resync": true}`` at any time.
+
+    ``format=binary`` sends the id table as JSON, then packed little-endian
+    arrays per step (layout in api/utils/ws_binary.py).
     """
     await ws.accept()
     app = ws.app
-    last_step = -1
-    
+    hub = broadcast_hubs.get(sim_id, lambda sim, fields: _build_websocket_response(app, sim, fields))
     try:
-        while True:
-            if not app.state.sumo_pid or not traci.isLoaded():
-                await ws.send_json({"error": "Simulation not running"})
-                await asyncio.sleep(1)
-                continue
-
-            # Pause handling
-            if not app.state.pause_event.is_set():
-                # Send paused status once
-                response = await _build_websocket_response(app)
-                response.update({"paused": True, "message": "Simulation paused"})
-                await ws.send_json(response)
-                
-                # Wait until resumed
-                await app.state.pause_event.wait()
-                continue
+        subscriber = hub.subscribe(
+            queue_size, policy, topics=topics, delta=delta, keyframe_every=keyframe_every,
+            format=format, compress=compress
+        )
+    except ValueError as e:
+        await ws.send_json({"error": str(e), "sim_id": sim_id})
+        await ws.close()
+        return
 
-            # Normal operation: send updates
-            current_time = traci.simulation.getTime()
-            if current_time != last_step:
-                response = await _build_websocket_response(app)
-                response["paused"] = False
-                await ws.send_json(response)
-                last_step = current_time
+    tasks = [
+        asyncio.create_task(_send_frames(ws, subscriber, sim_id)),
+        asyncio.create_task(_receive_controls(ws, subscriber))
+    ]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), (WebSocketDisconnect, type(None))):
+                logger.error(f"WebSocket error: {str(task.exception())}")
+        logger.info("Client disconnected")
+    finally:
+        for task in tasks:
+            task.cancel()
+        hub.unsubscribe(subscriber)
+
+
+async def _send_frames(ws: WebSocket, subscriber, sim_id: str):
+    while True:
+        await subscriber.ready()
+        # encoding is per client, traced apart from the shared frame build
+        with tracer.trace("ws_send", sim_id):
+            message = await subscriber.get()
+            with tracer.span("send"):
+                if isinstance(message, bytes):
+                    await ws.send_bytes(message)
+                else:
+                    await ws.send_text(message)
 
-            await asyncio.sleep(0.01)  # Prevent tight loop
 
-    except WebSocketDisconnect:
-        logger.info("Client disconnected")
+async def _receive_controls(ws: WebSocket, subscriber):
+    """Subscription changes sent by the client, also notices disconnects"""
+    while True:
+        try:
+            message = json.loads(await ws.receive_text())
+        except ValueError:
+            await ws.send_json({"error": "Control messages must be JSON objects"})
+            continue
+        if not isinstance(message, dict):
+            continue
+        try:
+            if "topics" in message or "delta" in message:
+                subscriber.subscribe(message.get("topics"), message.get("delta"))
+            elif message.get("resync"):
+                subscriber.resync()
+        except ValueError as e:
+            await ws.send_json({"error": str(e)})
+
+
+@sim_router.get("/simulation/ws/stats", tags=["Simulation"])
+async def websocket_hub_stats():
+    """Frames produced and per-client queue state of every broadcast hub"""
+    return {"hubs": [hub.to_dict() for hub in broadcast_hubs.list()]}
 
     #     _validate_simulation_state(app)
     #     start_time = time.time()
@@ -488,29 +663,59 @@ def _validate_simulation_state(app):
         )
 
 
-async def _build_websocket_response(app) -> dict:
+async def _build_websocket_response(app, sim: SimulationInstance, fields: Optional[FrozenSet[str]] = None) -> dict:
+    """WebSocketResponse of the current step, only ``fields`` (plus vehicles) when given"""
+    # one snapshot per frame: every getter below reads the same step
+    snapshot = sim.manager.snapshot
+    is_default = sim.sim_id == DEFAULT_SIM_ID
     base_payload = {
         "timestamp": round(time.time(), 3),
-        "vehicles": veh_service.get_vehicle_count(),
-        "message": app.state.status_message
+        "vehicles": veh_service.get_vehicle_count(snapshot),
+        "message": app.state.status_message if is_default else sim.status_message
     }
-    
-    if app.state.training_mode and app.state.rl_env:
-        return WebSocketResponse(
-            observation=convert_numpy_to_lists(
-                app.state.rl_env.get_observation()
-            ),
-            **base_payload
-        ).model_dump()
-    
-    return WebSocketResponse(
-        traffic_lights=traffic_light_service.get_traffic_lights_data(),
-        lanes=lane_service.get_lanes_by_street(),
-        e1_sensors=sensors_service.get_e1_sensors_data(),
-        e2_sensors=sensors_service.get_e2_sensors_data(),
-        e2_aggregated=sensors_service.aggregate_e2_sensor_data_per_edge(),
-        **base_payload
-    ).model_dump()
+    # the RL env drives the default connection only
+    training = is_default and app.state.training_mode and app.state.rl_env
+
+    if fields is not None:
+        payload = dict(base_payload)
+        for field in fields:
+            if field == "observation":
+                if training:
+                    with tracer.span("observation"):
+                        payload[field] = convert_numpy_to_lists(
+                            await sim.driver.call(app.state.rl_env.get_observation)
+                        )
+            elif field in _SNAPSHOT_FIELDS:
+                with tracer.span(field):
+                    payload[field] = _SNAPSHOT_FIELDS[field](snapshot)
+        return payload
+
+    if training:
+        with tracer.span("observation"):
+            observation = convert_numpy_to_lists(await sim.driver.call(app.state.rl_env.get_observation))
+        with tracer.span("validate"):
+            return WebSocketResponse(observation=observation, **base_payload).model_dump()
+
+    with tracer.span("getters"):
+        data = dict(
+            traffic_lights=traffic_light_service.get_traffic_lights_data(snapshot),
+            lanes=lane_service.get_lanes_by_street(snapshot),
+            e1_sensors=sensors_service.get_e1_sensors_data(snapshot),
+            e2_sensors=sensors_service.get_e2_sensors_data(snapshot),
+            e2_aggregated=sensors_service.aggregate_e2_sensor_data_per_edge(snapshot)
+        )
+    with tracer.span("validate"):
+        return WebSocketResponse(**data, **base_payload).model_dump()
+
+
+# WebSocketResponse fields computed from the snapshot alone
+_SNAPSHOT_FIELDS = {
+    "traffic_lights": traffic_light_service.get_traffic_lights_data,
+    "lanes": lane_service.get_lanes_by_street,
+    "e1_sensors": sensors_service.get_e1_sensors_data,
+    "e2_sensors": sensors_service.get_e2_sensors_data,
+    "e2_aggregated": sensors_service.aggregate_e2_sensor_data_per_edge
+}
 
 
 async def _cleanup_websocket(app, ws):
@@ -531,22 +736,25 @@ async def _cleanup_websocket(app, ws):
 async def set_traffic_phase(
     tls_id: str,
     phase_index: int = Query(..., ge=0, le=7, example=0),
-    duration: Optional[int] = Query(None, gt=0)
+    duration: Optional[int] = Query(None, gt=0),
+    sim: SimulationInstance = Depends(get_simulation)
 ):
     try:
         # Validate traffic light exists
-        if tls_id not in traci.trafficlight.getIDList():
+        if sim.manager.snapshot is None or tls_id not in sim.manager.snapshot.traffic_lights:
             raise HTTPException(404, "Traffic light not found")
             
-        # Get available phases
-        program = traci.trafficlight.getAllProgramLogics(tls_id)[0]
+        # Get available phases (traci resolves to the instance's connection on its driver thread)
+        program = (await sim.driver.call(lambda: traci.trafficlight.getAllProgramLogics(tls_id)))[0]
         if phase_index >= len(program.phases):
             raise HTTPException(400, "Invalid phase index")
         
         # Set phase with optional duration
-        traci.trafficlight.setPhase(tls_id, phase_index)
-        if duration:
-            traci.trafficlight.setPhaseDuration(tls_id, duration)
+        def _apply_phase():
+            traci.trafficlight.setPhase(tls_id, phase_index)
+            if duration:
+                traci.trafficlight.setPhaseDuration(tls_id, duration)
+        await sim.driver.call(_apply_phase)
             
         return {
             "status": f"Phase changed to {phase_index}",
@@ -560,10 +768,44 @@ async def set_traffic_phase(
 
 
 @sim_router.get("/lanes/metrics", response_model=Dict[str, lane_service.DirectionMetrics])
-async def get_lane_metrics():
-    return lane_service.get_detailed_directional_metrics()
+async def get_lane_metrics(sim: SimulationInstance = Depends(get_simulation)):
+    return await sim.driver.call(lane_service.get_detailed_directional_metrics, sim.manager.snapshot)
+
+
+@sim_router.get("/vehicles/junction", response_model=VehicleContextSubscriptionData)
+async def get_junction_vehicles(sim: SimulationInstance = Depends(get_simulation)):
+    snapshot = sim.manager.snapshot
+    if snapshot is None:
+        raise HTTPException(400, "Simulation not running")
+    return veh_service.get_junction_vehicles(snapshot)
+
+
+@sim_router.get("/vehicles/fleet")
+async def get_fleet_metrics(sim: SimulationInstance = Depends(get_simulation)):
+    """Speed, waiting and halted vehicles over the whole network, total and by direction"""
+    snapshot = sim.manager.snapshot
+    if snapshot is None:
+        raise HTTPException(400, "Simulation not running")
+    return veh_service.get_fleet_metrics(snapshot)
+
+
+@sim_router.get("/vehicles/trips")
+async def get_trip_statistics(
+    sim: SimulationInstance = Depends(get_simulation),
+    start: Optional[float] = Query(None, description="Only trips arriving at or after this simulation time"),
+    end: Optional[float] = Query(None, description="Only trips arriving at or before this simulation time")
+):
+    """
+    Travel time, time loss, delay (time halted) and stops of the trips
+    completed in this run: mean, min, max, sum and p50/p90/p95.
+    """
+    trips = sim.manager.trips
+    if trips is None:
+        raise HTTPException(400, "Simulation not running")
+    summary = await sim.driver.call(veh_service.get_trip_statistics, trips, start, end)
+    return {"sim_id": sim.sim_id, "running": len(sim.manager.vehicles), **summary}
 
 
 @sim_router.get("/trafficlights/{tls_id}/phases")
-async def get_phase_information(tls_id: str):
-    return traffic_light_service.get_phase_info(tls_id)
\ No newline at end of file
+async def get_phase_information(tls_id: str, sim: SimulationInstance = Depends(get_simulation)):
+    return await sim.driver.call(traffic_light_service.get_phase_info, tls_id)
\ No newline at end of file
@@ -74,6 +74,8 @@ class SensorSubscriptionData(BaseModel):
 class VehicleData(BaseModel):
     id: str
     speed: float
+    waiting_time: float
+    accumulated_waiting_time: float
     position: float # relative to lane
     lane: str # lane id where the vehicle is on
 
@@ -1,7 +1,8 @@
-from typing import Dict, List
-import traci
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
+from api.utils.traci_subscriptions import SimulationSnapshot, subscription_manager
+
 class LaneMetrics(BaseModel):
     queue: int
     density: float
@@ -15,20 +16,17 @@ class DirectionMetrics(BaseModel):
     total_vehicles: int
     lanes: Dict[str, LaneMetrics]
 
-def get_lanes_by_direction() -> Dict[str, List[str]]:
+def get_lanes_by_direction(snapshot: Optional[SimulationSnapshot] = None) -> Dict[str, List[str]]:
     """Group lanes by their cardinal direction"""
-    directions = {'N': [], 'S': [], 'E': [], 'W': []}
-    for lane in traci.lane.getIDList():
-        if lane.startswith('N'): directions['N'].append(lane)
-        elif lane.startswith('S'): directions['S'].append(lane)
-        elif lane.startswith('E'): directions['E'].append(lane)
-        elif lane.startswith('W'): directions['W'].append(lane)
-    return directions
+    snapshot = snapshot or subscription_manager.snapshot
+    return snapshot.network.lanes_by_direction()
 
 
 
-def get_detailed_directional_metrics() -> Dict[str, DirectionMetrics]:
-    directions = get_lanes_by_direction()
+def get_detailed_directional_metrics(snapshot: Optional[SimulationSnapshot] = None) -> Dict[str, DirectionMetrics]:
+    snapshot = snapshot or subscription_manager.snapshot
+    network = snapshot.network
+    directions = network.lanes_by_direction()
     metrics = {}
     
     for direction, lanes in directions.items():
@@ -42,16 +40,14 @@ def get_detailed_directional_metrics() -> Dict[str, DirectionMetrics]:
         
         total_density = 0
         for lane in lanes:
-            vehicle_count = traci.lane.getLastStepVehicleNumber(lane)
-            lane_length = traci.lane.getLength(lane)
+            lane_state = snapshot.lanes[lane]
+            vehicle_count = lane_state["vehicle_count"]
+            lane_length = network.length(lane)
             
             lane_data = LaneMetrics(
-                queue=traci.lane.getLastStepHaltingNumber(lane),
+                queue=lane_state["halting_number"],
                 density=vehicle_count / lane_length if lane_length > 0 else 0,
-                waiting_time=sum(
-                    traci.vehicle.getWaitingTime(veh) 
-                    for veh in traci.lane.getLastStepVehicleIDs(lane)
-                ),
+                waiting_time=lane_state["waiting_time"], # sum of the waiting time of the lane's vehicles
                 vehicle_count=vehicle_count
             )
             
@@ -68,80 +64,63 @@ def get_detailed_directional_metrics() -> Dict[str, DirectionMetrics]:
 
 
 
-def get_len_lanes():
-    return len(traci.len.getIDList())
+def get_len_lanes(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    return len(snapshot.lanes)
 
 
-def get_lanes_by_street():
-    lanes_by_street = {
-        "N": [],
-        "S": [],
-        "W": [],
-        "E": []
-    }
-    
-    # Get all lanes in the network
-    lanes = traci.lane.getIDList()
-    
-    # Group lanes by street direction (N, S, W, E)
-    for lane in lanes:
-        if lane.startswith("N"):
-            lanes_by_street["N"].append(lane)
-        elif lane.startswith("S"):
-            lanes_by_street["S"].append(lane)
-        elif lane.startswith("W"):
-            lanes_by_street["W"].append(lane)
-        elif lane.startswith("E"):
-            lanes_by_street["E"].append(lane)
+def get_lanes_by_street(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    # Group lanes by street direction (N, S, W, E), resolved once per connection
+    return snapshot.network.lanes_by_direction()
 
-    return lanes_by_street
 
 
 
-
-def get_detailed_lane_data():
-    lanes = traci.lane.getIDList()
+def get_detailed_lane_data(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    network = snapshot.network
     return {
         lane_id: {
-            "queue": traci.lane.getLastStepHaltingNumber(lane_id),
-            "density": traci.lane.getLastStepVehicleNumber(lane_id)/traci.lane.getLength(lane_id),
-            "waiting_time": sum(
-                traci.vehicle.getWaitingTime(veh) 
-                for veh in traci.lane.getLastStepVehicleIDs(lane_id)
-            )
+            "queue": lane_state["halting_number"],
+            "density": lane_state["vehicle_count"]/network.length(lane_id),
+            "waiting_time": lane_state["waiting_time"]
         }
-        for lane_id in lanes
+        for lane_id, lane_state in snapshot.lanes.items()
     }
 
 
 
-def get_avg_speed_by_street():
-    lanes_by_street = get_lanes_by_street()
+def get_avg_speed_by_street(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    lanes_by_street = get_lanes_by_street(snapshot)
     avg_speed_by_street = {}
 
     for street, lanes in lanes_by_street.items():
         total_speed = 0
         total_vehicles = 0
 
+        # lane mean speed x vehicle count is the speed sum, no per-vehicle calls
         for lane in lanes:
-            vehicles = traci.lane.getLastStepVehicleIDs(lane)
-            total_vehicles += len(vehicles)
-
-            for vehicle in vehicles:
-                total_speed += traci.vehicle.getSpeed(vehicle)
+            lane_state = snapshot.lanes[lane]
+            total_vehicles += lane_state["vehicle_count"]
+            total_speed += lane_state["mean_speed"] * lane_state["vehicle_count"]
 
         avg_speed_by_street[street] = total_speed / total_vehicles if total_vehicles > 0 else 0
 
+    return avg_speed_by_street
 
 
-def get_lane_density(laneid):
-    lane_length = traci.lane.getLength(laneid)
-    lane_vehicles = traci.lane.getLastStepVehicleNumber(laneid)
+def get_lane_density(laneid, snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    lane_length = snapshot.network.length(laneid)
+    lane_vehicles = snapshot.lanes[laneid]["vehicle_count"]
     return lane_vehicles / lane_length if lane_length > 0 else 0
 
 
-def get_lane_queue_length(laneid):
-    return traci.lane.getLastStepHaltingNumber(laneid) # number of vehicles in the lane that are not moving
+def get_lane_queue_length(laneid, snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    return snapshot.lanes[laneid]["halting_number"] # number of vehicles in the lane that are not moving
 
 
 
@@ -1,13 +1,12 @@
-import traci 
+from typing import Optional
 
+from api.utils.traci_subscriptions import SimulationSnapshot, subscription_manager
 
-def collect_metrics():
-    vehicle_count = traci.vehicle.getIDCount()
-    vehicle_speeds = [traci.vehicle.getSpeed(veh) for veh in traci.vehicle.getIDList() if traci.vehicle.getSpeed(veh) > 0]
-    avg_speed = sum(vehicle_speeds) / len(vehicle_speeds) if vehicle_speeds else 0
 
+def collect_metrics(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
     return {
-        "vehicle_count": vehicle_count,
-        "average_speed": avg_speed
+        "vehicle_count": snapshot.vehicle_count,
+        # mean over the moving vehicles
+        "average_speed": snapshot.fleet.get("moving_mean_speed", 0)
     }
-
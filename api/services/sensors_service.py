@@ -1,14 +1,15 @@
-from collections import defaultdict
-from typing import Dict
-import traci
+from typing import Dict, Optional
+from api.utils.sumo_backend import traci
 
 from schemas.models import InductionLoopData, LaneAreaData
+from api.utils.traci_subscriptions import SimulationSnapshot, subscription_manager
 
 
-def get_sensor_ids():
+def get_sensor_ids(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
     return {
-        "lanearea": traci.lanearea.getIDList(),
-        "inductionloop": traci.inductionloop.getIDList()
+        "lanearea": list(snapshot.e2),
+        "inductionloop": list(snapshot.e1)
     }
 
 def subscribe_e1_sensors():
@@ -56,42 +57,30 @@ def subscribe_e2_sensors():
 #     return e1dict
 
 
-def get_e1_sensors_data() -> Dict[str, dict]:
+def get_e1_sensors_data(snapshot: Optional[SimulationSnapshot] = None) -> Dict[str, dict]:
+    snapshot = snapshot or subscription_manager.snapshot
     return {
-        sensor_id: InductionLoopData(
-            id=sensor_id,
-            vehicle_count=traci.inductionloop.getLastStepVehicleNumber(sensor_id),
-            occupancy=traci.inductionloop.getLastStepOccupancy(sensor_id),
-            mean_speed=traci.inductionloop.getLastStepMeanSpeed(sensor_id)
-        ).model_dump()
-        for sensor_id in traci.inductionloop.getIDList()
+        sensor_id: InductionLoopData(id=sensor_id, **data).model_dump()
+        for sensor_id, data in snapshot.e1.items()
     }
 
 
 
-def get_e2_sensors_data() -> Dict[str, dict]:
+def get_e2_sensors_data(snapshot: Optional[SimulationSnapshot] = None) -> Dict[str, dict]:
+    snapshot = snapshot or subscription_manager.snapshot
     return {
-        sensor_id: LaneAreaData(
-            id=sensor_id,
-            vehicle_count=traci.lanearea.getLastStepVehicleNumber(sensor_id),
-            occupancy=traci.lanearea.getLastStepOccupancy(sensor_id),
-            mean_speed=traci.lanearea.getLastStepMeanSpeed(sensor_id)
-        ).model_dump()
-        for sensor_id in traci.lanearea.getIDList()
+        sensor_id: LaneAreaData(id=sensor_id, **data).model_dump()
+        for sensor_id, data in snapshot.e2.items()
     }
 
 
 
-def aggregate_e2_sensor_data_per_edge() -> Dict[str, dict]:
+def aggregate_e2_sensor_data_per_edge(snapshot: Optional[SimulationSnapshot] = None) -> Dict[str, dict]:
+    snapshot = snapshot or subscription_manager.snapshot
     edge_aggregates = {}
-    valid_sensors = traci.lanearea.getIDList()  # Get ACTUAL existing sensors
     
-    # Group sensors by edge direction
-    sensor_groups = defaultdict(list)
-    for sensor in valid_sensors:
-        if sensor.startswith('E2_'):
-            direction = sensor[3]  # Assuming format E2_W0 -> 'W'
-            sensor_groups[direction].append(sensor)
+    # Group sensors by the direction of the lane they sit on
+    sensor_groups = snapshot.network.e2_by_direction
     
     for direction, sensors in sensor_groups.items():
         if not sensors:
@@ -102,10 +91,10 @@ def aggregate_e2_sensor_data_per_edge() -> Dict[str, dict]:
         total_occupancy = 0.0
         
         for sensor_id in sensors:
-            data = traci.lanearea.getSubscriptionResults(sensor_id) or {}
-            total_vehicles += data.get(traci.constants.LAST_STEP_VEHICLE_NUMBER, 0)
-            total_speed += data.get(traci.constants.LAST_STEP_MEAN_SPEED, 0.0)
-            total_occupancy += data.get(traci.constants.LAST_STEP_OCCUPANCY, 0.0)
+            data = snapshot.e2[sensor_id]
+            total_vehicles += data["vehicle_count"]
+            total_speed += data["mean_speed"]
+            total_occupancy += data["occupancy"]
         
         count = len(sensors) or 1
         edge_aggregates[direction] = {
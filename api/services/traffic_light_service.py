@@ -1,9 +1,9 @@
-from typing import Dict
-import traci
-import traci.constants
+from typing import Dict, Optional
+from api.utils.sumo_backend import traci
 
-from api.utils import logger
+from api.utils.logger import logger
 from schemas.models import TrafficLightData
+from api.utils.traci_subscriptions import SimulationSnapshot, subscription_manager
 
 def subscribe_traffic_lights():
     try:
@@ -32,26 +32,19 @@ PHASE_DIRECTIONS = {
 }
 
 
-def get_traffic_lights_data() -> Dict[str, dict]:
+def get_traffic_lights_data(snapshot: Optional[SimulationSnapshot] = None) -> Dict[str, dict]:
+    snapshot = snapshot or subscription_manager.snapshot
     tls_response = {}
 
-    for tls_id in traci.trafficlight.getIDList():
+    for tls_id, tls_data in snapshot.traffic_lights.items():
         try:
-            tls_data = traci.trafficlight.getSubscriptionResults(tls_id)
-            phase_idx = tls_data.get(traci.constants.TL_CURRENT_PHASE, 0)
-            if not tls_data:
-                continue
+            phase_idx = tls_data["current_phase"]
 
             # Create TrafficLightData instance
             tl_data = TrafficLightData(
                 id=tls_id,
-                red_yellow_green_state=tls_data.get(traci.constants.TL_RED_YELLOW_GREEN_STATE, "unknown"),
-                phase_duration=tls_data.get(traci.constants.TL_PHASE_DURATION, 0.0),
-                current_phase=phase_idx,
-                spent_duration=tls_data.get(traci.constants.TL_SPENT_DURATION, 0.0),
-                next_switch=tls_data.get(traci.constants.TL_NEXT_SWITCH, 0.0),
-                #current_program=tls_data.get(traci.constants.TL_CURRENT_PROGRAM, "unknown"),
-                phase_name=PHASE_DIRECTIONS.get(phase_idx, "Unknown Phase")
+                phase_name=PHASE_DIRECTIONS.get(phase_idx, "Unknown Phase"),
+                **tls_data
             )
             
             # Convert to dictionary immediately
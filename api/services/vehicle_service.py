@@ -1,59 +1,50 @@
-import traci
+from typing import Optional
 
+from api.schemas.models import VehicleContextSubscriptionData
+from api.services.lane_service import get_lanes_by_street
+from api.utils.traci_subscriptions import SimulationSnapshot, subscription_manager
+from api.utils.trip_stats import TripLog
 
-def get_vehicle_count():
-    return traci.vehicle.getIDCount()
 
+def get_vehicle_count(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    return snapshot.vehicle_count
 
-def get_average_speed():
-    vehicle_ids = traci.vehicle.getIDList()
-    speeds = [traci.vehicle.getSpeed(veh_id) for veh_id in vehicle_ids]
-    if speeds:
-        return sum(speeds) / len(speeds)
-    return 0
 
+def get_junction_vehicles(snapshot: Optional[SimulationSnapshot] = None) -> VehicleContextSubscriptionData:
+    """Vehicles around the controlled junction, from its context subscription"""
+    snapshot = snapshot or subscription_manager.snapshot
+    return VehicleContextSubscriptionData(vehicles=snapshot.junction_vehicles)
 
-def get_waiting_time():
-    vehicle_ids = traci.vehicle.getIDList()
-    waiting_times = [traci.vehicle.getWaitingTime(veh_id) for veh_id in vehicle_ids]
-    return sum(waiting_times)
 
+def get_fleet_metrics(snapshot: Optional[SimulationSnapshot] = None) -> dict:
+    """Aggregates over every running vehicle, from the per-vehicle subscriptions"""
+    snapshot = snapshot or subscription_manager.snapshot
+    return snapshot.fleet
 
-def get_queue_length():
-    vehicle_ids = traci.vehicle.getIDList()
-    return len(vehicle_ids)
 
+def get_trip_statistics(trips: TripLog, start: Optional[float] = None, end: Optional[float] = None) -> dict:
+    """Per-trip KPIs (travel time, time loss, delay, stops) of the trips arriving in [start, end]"""
+    return trips.summary(start, end)
 
 
-def get_lanes_by_street():
-    lanes_by_street = {
-        "N": [],
-        "S": [],
-        "W": [],
-        "E": []
-    }
-    
-    # Get all lanes in the network
-    lanes = traci.lane.getIDList()
-    
-    # Group lanes by street direction (N, S, W, E)
-    for lane in lanes:
-        if lane.startswith("N"):
-            lanes_by_street["N"].append(lane)
-        elif lane.startswith("S"):
-            lanes_by_street["S"].append(lane)
-        elif lane.startswith("W"):
-            lanes_by_street["W"].append(lane)
-        elif lane.startswith("E"):
-            lanes_by_street["E"].append(lane)
+def get_average_speed(snapshot: Optional[SimulationSnapshot] = None):
+    return get_fleet_metrics(snapshot).get("mean_speed", 0)
+
+
+def get_waiting_time(snapshot: Optional[SimulationSnapshot] = None):
+    return get_fleet_metrics(snapshot).get("waiting_time", 0)
 
-    return lanes_by_street
 
+def get_queue_length(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    return snapshot.vehicle_count
 
 
 
-def get_avg_speed_by_street():
-    lanes_by_street = get_lanes_by_street()
+def get_avg_speed_by_street(snapshot: Optional[SimulationSnapshot] = None):
+    snapshot = snapshot or subscription_manager.snapshot
+    lanes_by_street = get_lanes_by_street(snapshot)
     avg_speed_by_street = {}
     
     for street, lanes in lanes_by_street.items():
@@ -61,10 +52,9 @@ def get_avg_speed_by_street():
         total_vehicles = 0
         
         for lane in lanes:
-            vehicles = traci.lane.getLastStepVehicleIDs(lane)
-            total_vehicles += len(vehicles)
-            for vehicle in vehicles:
-                total_speed += traci.vehicle.getSpeed(vehicle)
+            lane_state = snapshot.lanes[lane]
+            total_vehicles += lane_state["vehicle_count"]
+            total_speed += lane_state["mean_speed"] * lane_state["vehicle_count"]
         
         if total_vehicles > 0:
             avg_speed_by_street[street] = total_speed / total_vehicles
@@ -0,0 +1,148 @@
+"""Follow the XML outputs of the E1/E2 detectors while SUMO appends to them.
+
+SUMO writes one ``<interval>`` per detector and aggregation period (or per
+phase change for ``tl=`` detectors) to the ``file`` of its definition. A
+``DetectorLogTail`` keeps the byte offset it has read up to and feeds only
+the new bytes to an incremental parser, so every poll costs what was
+appended since the last one and the file is never parsed from the start
+again. ``DetectorLogFollower`` polls all detector files of a network into
+the ``e1_log``/``e2_log`` interval series of a MetricsStore; this is
+detector data that costs no TraCI call.
+"""
+import asyncio
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Sequence, Tuple
+
+from .logger import logger
+from .metrics_store import MetricsStore
+from .net_model import NetworkModel, config_files, load_scenario
+
+
+E1_LOG_METRICS = ("nVehContrib", "flow", "occupancy", "speed", "harmonicMeanSpeed", "length", "nVehEntered")
+E2_LOG_METRICS = (
+    "sampledSeconds", "nVehEntered", "nVehLeft", "nVehSeen", "meanSpeed", "meanTimeLoss", "meanOccupancy",
+    "maxOccupancy", "meanMaxJamLengthInMeters", "maxJamLengthInMeters", "meanHaltingDuration",
+    "startedHalts", "meanVehicleNumber", "maxVehicleNumber"
+)
+
+Interval = Tuple[str, float, Dict[str, float]]  # (detector id, end, values)
+
+
+class DetectorLogTail:
+    """New ``<interval>`` elements of one output file since the last ``read``.
+
+    A file that shrinks was rewritten (SUMO restarted) and is read again from
+    the start.
+    """
+    def __init__(self, path: str, metrics: Sequence[str], chunk_size: int = 1 << 20):
+        self.path = path
+        self.metrics = tuple(metrics)
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self._parser = self._new_parser()
+        self._root = None  # document element, from the parser's first "start" event
+
+    @staticmethod
+    def _new_parser() -> ET.XMLPullParser:
+        return ET.XMLPullParser(events=("start", "end"))
+
+    def rewind(self):
+        self.offset = 0
+        self._parser = self._new_parser()
+        self._root = None
+
+    def read(self) -> List[Interval]:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return []  # not written yet
+        if size < self.offset:
+            self.rewind()
+
+        intervals = []
+        with open(self.path, "rb") as fp:
+            fp.seek(self.offset)
+            while self.offset < size:
+                data = fp.read(min(self.chunk_size, size - self.offset))
+                if not data:
+                    break
+                self.offset += len(data)
+                self._parser.feed(data)
+                intervals.extend(self._drain())
+        return intervals
+
+    def _drain(self) -> List[Interval]:
+        intervals = []
+        root = self._root
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = self._root = elem
+                continue
+            if elem.tag == "interval":
+                a = elem.attrib
+                intervals.append((a["id"], float(a["end"]),
+                                  {m: float(a[m]) for m in self.metrics if m in a}))
+            elem.clear()
+            # processed children leave the root, which holds at most the one being parsed
+            if elem is not root and len(root) and root[-1] is elem:
+                del root[-1]
+        return intervals
+
+
+class DetectorLogFollower:
+    """Tails the output files of a network's E1 and E2 detectors into ``metrics``.
+
+    Detectors sharing a file share one tail. The ``file`` attributes are
+    resolved against ``base_dir``, the folder of the additional file that
+    defines the detectors (SUMO resolves them the same way).
+    """
+    def __init__(self, network: NetworkModel, base_dir: str, metrics: MetricsStore):
+        self.metrics = metrics
+        self._tails: Dict[str, List[DetectorLogTail]] = {}
+        self._ids: Dict[str, frozenset] = {}
+        for kind, ids, files, names in (("e1_log", network.e1_ids, network.e1_file, E1_LOG_METRICS),
+                                        ("e2_log", network.e2_ids, network.e2_file, E2_LOG_METRICS)):
+            paths = {os.path.normpath(os.path.join(base_dir, str(f))) for f in files if str(f)}
+            if not paths:
+                continue
+            self._ids[kind] = frozenset(metrics.add_intervals(kind, [str(i) for i in ids], names).ids)
+            self._tails[kind] = [DetectorLogTail(path, names) for path in sorted(paths)]
+
+    @classmethod
+    def for_cfg(cls, cfg_file: str, metrics: MetricsStore) -> "DetectorLogFollower":
+        config, network = load_scenario(cfg_file)
+        additional = config_files(cfg_file, "additional-files", config)
+        base_dir = os.path.dirname(additional[0]) if additional else os.path.dirname(os.path.abspath(cfg_file))
+        return cls(network, base_dir, metrics)
+
+    @property
+    def paths(self) -> List[str]:
+        return [tail.path for tails in self._tails.values() for tail in tails]
+
+    def poll(self) -> int:
+        """Read what was appended to every file, returns the number of new intervals"""
+        count = 0
+        for kind, tails in self._tails.items():
+            for tail in tails:
+                try:
+                    intervals = tail.read()
+                except ET.ParseError as e:
+                    # intervals already stored are skipped when the file is read again
+                    logger.warning(f"Restarting detector log {tail.path}: {str(e)}")
+                    tail.rewind()
+                    continue
+                ids = self._ids[kind]
+                known = [i for i in intervals if i[0] in ids]
+                if known:
+                    self.metrics.append_intervals(kind, known)
+                count += len(known)
+        return count
+
+    async def run(self, interval: float = 1.0):
+        """Poll every ``interval`` seconds until cancelled"""
+        while True:
+            await asyncio.to_thread(self.poll)
+            await asyncio.sleep(interval)
+
@@ -0,0 +1,352 @@
+"""Per-step metric history in preallocated numpy ring buffers.
+
+Every recorded snapshot writes one row: a float32 array per metric holds one
+column per entity (detector, lane, traffic light, direction), all rows share
+the ``time`` column. Once ``retention`` rows are stored the oldest ones are
+overwritten, memory never grows past the arrays allocated for the network.
+
+Rows are recorded per ``SubscriptionManager.step`` call, a targetTime jump
+(fast-forward, multi-step requests) adds a single row at its end; queries
+bucket by simulation time so uneven spacing is fine.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .network_index import DIRECTIONS, NetworkIndex
+from .traci_subscriptions import SimulationSnapshot
+
+
+DETECTOR_METRICS = ("vehicle_count", "occupancy", "mean_speed")
+LANE_METRICS = ("vehicle_count", "halting_number", "mean_speed", "waiting_time", "density")
+TLS_METRICS = ("current_phase", "spent_duration")
+DIRECTION_METRICS = ("vehicle_count", "halting_number", "mean_speed", "waiting_time")
+SIMULATION_METRICS = ("vehicle_count", "min_expected", "departed", "arrived", "mean_speed", "halting_number")
+
+_NO_VALUES: dict = {}
+
+
+@dataclass
+class SeriesGroup:
+    """Metrics of one kind of entity, ``values[metric]`` is ``(retention, len(ids))``"""
+    ids: Tuple[str, ...]
+    values: Dict[str, np.ndarray]
+
+    @classmethod
+    def allocate(cls, ids: Sequence[str], metrics: Sequence[str], retention: int) -> "SeriesGroup":
+        return cls(
+            ids=tuple(ids),
+            values={metric: np.zeros((retention, len(ids)), dtype=np.float32) for metric in metrics}
+        )
+
+    def write(self, row: int, metric: str, values):
+        self.values[metric][row] = values
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.values.values())
+
+
+def _column(entries: Dict[str, dict], ids: Sequence[str], key: str) -> np.ndarray:
+    return np.fromiter((entries.get(i, _NO_VALUES).get(key, 0.0) for i in ids), dtype=np.float64, count=len(ids))
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def _series(times: np.ndarray, values: np.ndarray, entities: Sequence[str],
+            resolution: Optional[float] = None, points: Optional[int] = None) -> dict:
+    """Columns of ``values`` by entity, or min/mean/max per time bucket"""
+    if points and len(times) and resolution is None:
+        resolution = max((times[-1] - times[0]) / points, 0.0) or None
+    if not resolution or not len(times):
+        return {
+            "time": times.tolist(),
+            "values": {entity: values[:, i].tolist() for i, entity in enumerate(entities)}
+        }
+
+    buckets = np.floor((times - times[0]) / resolution).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    sizes = np.diff(np.r_[starts, len(times)])
+    mins = np.minimum.reduceat(values, starts, axis=0)
+    maxs = np.maximum.reduceat(values, starts, axis=0)
+    means = np.add.reduceat(values.astype(np.float64), starts, axis=0) / sizes[:, None]
+    return {
+        "resolution": float(resolution),
+        "time": times[starts].tolist(),
+        "count": sizes.tolist(),
+        "values": {
+            entity: {"min": mins[:, i].tolist(), "mean": means[:, i].tolist(), "max": maxs[:, i].tolist()}
+            for i, entity in enumerate(entities)
+        }
+    }
+
+
+class IntervalSeries:
+    """Ring buffers for data on its own clock, one per entity.
+
+    Detector output files report intervals whose ends do not line up with
+    simulation steps (nor between files), so every entity keeps its own time
+    column and head. ``times`` holds interval ends.
+    """
+    def __init__(self, ids: Sequence[str], metrics: Sequence[str], retention: int):
+        self.ids = tuple(ids)
+        self.retention = retention
+        self._columns = {entity: i for i, entity in enumerate(self.ids)}
+        self.times = np.zeros((retention, len(self.ids)), dtype=np.float64)
+        self.values = {metric: np.zeros((retention, len(self.ids)), dtype=np.float32) for metric in metrics}
+        self._head = np.zeros(len(self.ids), dtype=np.int64)
+        self._count = np.zeros(len(self.ids), dtype=np.int64)
+
+    def append(self, entity: str, end: float, values: Dict[str, float]):
+        column = self._columns[entity]
+        if self._count[column] and end <= self.times[(self._head[column] - 1) % self.retention, column]:
+            return  # already stored, e.g. a file read again from the start
+        row = self._head[column]
+        self.times[row, column] = end
+        for metric, array in self.values.items():
+            array[row, column] = values.get(metric, 0.0)
+        self._head[column] = (row + 1) % self.retention
+        self._count[column] = min(self._count[column] + 1, self.retention)
+
+    def clear(self):
+        self._head[:] = 0
+        self._count[:] = 0
+
+    def _rows(self, column: int, start: Optional[float], end: Optional[float]) -> np.ndarray:
+        count = self._count[column]
+        rows = (self._head[column] - count + np.arange(count)) % self.retention
+        times = self.times[rows, column]
+        lo = np.searchsorted(times, start, side="left") if start is not None else 0
+        hi = np.searchsorted(times, end, side="right") if end is not None else len(rows)
+        return rows[lo:hi]
+
+    def query(self, metric: str, ids: Optional[Sequence[str]] = None, start: Optional[float] = None,
+              end: Optional[float] = None, resolution: Optional[float] = None,
+              points: Optional[int] = None) -> Dict[str, dict]:
+        series = {}
+        for entity in ids or self.ids:
+            column = self._columns[entity]
+            rows = self._rows(column, start, end)
+            values = self.values[metric][rows, column][:, None]
+            part = _series(self.times[rows, column], values, [entity], resolution, points)
+            series[entity] = {**part, "values": part["values"][entity]}
+        return series
+
+    def latest(self) -> Dict[str, Dict[str, float]]:
+        latest = {}
+        for entity, column in self._columns.items():
+            if self._count[column]:
+                row = (self._head[column] - 1) % self.retention
+                latest[entity] = {"end": float(self.times[row, column])}
+                latest[entity].update((metric, float(a[row, column])) for metric, a in self.values.items())
+        return latest
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + sum(array.nbytes for array in self.values.values())
+
+
+class MetricsStore:
+    """Ring-buffered history of the snapshots of one simulation.
+
+    ``record`` runs on the driver thread after every step, queries come from
+    the event loop, a lock keeps rows consistent between the two.
+    """
+    def __init__(self, retention: int = 3600):
+        self.retention = max(1, int(retention))
+        self.times = np.zeros(self.retention, dtype=np.float64)
+        self.groups: Dict[str, SeriesGroup] = {}
+        self.intervals: Dict[str, IntervalSeries] = {}  # filled outside of the step (detector outputs)
+        self._network: Optional[NetworkIndex] = None
+        self._head = 0  # next row to write
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._count = 0
+            for series in self.intervals.values():
+                series.clear()
+
+    def _allocate(self, snapshot: SimulationSnapshot):
+        network = snapshot.network
+        n = self.retention
+        self.groups = {
+            "e1": SeriesGroup.allocate(network.e1_ids, DETECTOR_METRICS, n),
+            "e2": SeriesGroup.allocate(network.e2_ids, DETECTOR_METRICS, n),
+            "lanes": SeriesGroup.allocate(network.lane_ids, LANE_METRICS, n),
+            "tls": SeriesGroup.allocate(tuple(network.tls_controlled), TLS_METRICS, n),
+            "directions": SeriesGroup.allocate(DIRECTIONS, DIRECTION_METRICS, n),
+            "simulation": SeriesGroup.allocate(("all",), SIMULATION_METRICS, n)
+        }
+        self._network = network
+        self._head = 0
+        self._count = 0
+
+    def add_intervals(self, kind: str, ids: Sequence[str], metrics: Sequence[str]) -> IntervalSeries:
+        """Interval series ``kind``, kept while the entities and metrics stay the same"""
+        with self._lock:
+            series = self.intervals.get(kind)
+            if series is None or series.ids != tuple(ids) or tuple(series.values) != tuple(metrics):
+                series = self.intervals[kind] = IntervalSeries(ids, metrics, self.retention)
+            return series
+
+    def append_intervals(self, kind: str, intervals: Sequence[Tuple[str, float, Dict[str, float]]]):
+        """Store ``(entity, end, values)`` intervals of ``kind``"""
+        with self._lock:
+            series = self.intervals[kind]
+            for entity, end, values in intervals:
+                series.append(entity, end, values)
+
+    def record(self, snapshot: SimulationSnapshot):
+        """Store ``snapshot`` as the newest row"""
+        if snapshot.network is None:
+            return
+        with self._lock:
+            if snapshot.network is not self._network:
+                self._allocate(snapshot)
+            elif self._count and snapshot.time < self.times[(self._head - 1) % self.retention]:
+                # time went back (reload, restored state): a new history
+                self._head = 0
+                self._count = 0
+            self._write(self._head, snapshot)
+            self.times[self._head] = snapshot.time
+            self._head = (self._head + 1) % self.retention
+            self._count = min(self._count + 1, self.retention)
+
+    def _write(self, row: int, snapshot: SimulationSnapshot):
+        network = self._network
+        groups = self.groups
+
+        for kind, readings in (("e1", snapshot.e1), ("e2", snapshot.e2)):
+            group = groups[kind]
+            for metric in DETECTOR_METRICS:
+                group.write(row, metric, _column(readings, group.ids, metric))
+
+        lanes = groups["lanes"]
+        count = _column(snapshot.lanes, lanes.ids, "vehicle_count")
+        halting = _column(snapshot.lanes, lanes.ids, "halting_number")
+        speed = _column(snapshot.lanes, lanes.ids, "mean_speed")
+        waiting = _column(snapshot.lanes, lanes.ids, "waiting_time")
+        lanes.write(row, "vehicle_count", count)
+        lanes.write(row, "halting_number", halting)
+        lanes.write(row, "mean_speed", speed)
+        lanes.write(row, "waiting_time", waiting)
+        lanes.write(row, "density", _ratio(count, network.lane_lengths))
+
+        tls = groups["tls"]
+        for metric in TLS_METRICS:
+            tls.write(row, metric, _column(snapshot.traffic_lights, tls.ids, metric))
+
+        # lane mean speed x vehicle count is the speed sum of the lane
+        speed_sum = speed * count
+        directed = network.lane_direction >= 0
+        by_direction = network.lane_direction[directed]
+
+        def per_direction(values):
+            return np.bincount(by_direction, weights=values[directed], minlength=len(DIRECTIONS))
+
+        directions = groups["directions"]
+        direction_count = per_direction(count)
+        directions.write(row, "vehicle_count", direction_count)
+        directions.write(row, "halting_number", per_direction(halting))
+        directions.write(row, "waiting_time", per_direction(waiting))
+        directions.write(row, "mean_speed", _ratio(per_direction(speed_sum), direction_count))
+
+        simulation = groups["simulation"]
+        simulation.write(row, "vehicle_count", snapshot.vehicle_count)
+        simulation.write(row, "min_expected", snapshot.min_expected)
+        simulation.write(row, "departed", len(snapshot.departed))
+        simulation.write(row, "arrived", len(snapshot.arrived))
+        simulation.write(row, "halting_number", halting.sum())
+        simulation.write(row, "mean_speed", speed_sum.sum() / count.sum() if count.sum() > 0 else 0.0)
+
+    # queries
+    def _rows(self, start: Optional[float], end: Optional[float]) -> np.ndarray:
+        """Row indices in time order within [start, end]"""
+        rows = (self._head - self._count + np.arange(self._count)) % self.retention
+        times = self.times[rows]
+        lo = np.searchsorted(times, start, side="left") if start is not None else 0
+        hi = np.searchsorted(times, end, side="right") if end is not None else len(rows)
+        return rows[lo:hi]
+
+    def query(self, kind: str, metric: str, ids: Optional[Sequence[str]] = None,
+              start: Optional[float] = None, end: Optional[float] = None,
+              resolution: Optional[float] = None, points: Optional[int] = None) -> dict:
+        """Values of ``metric`` for ``ids`` (all when None) between ``start`` and ``end``.
+
+        With ``resolution`` (seconds) or ``points`` the rows are grouped in time
+        buckets and every bucket returns its min, mean and max.
+        """
+        with self._lock:
+            if kind in self.intervals:
+                return self._query_intervals(kind, metric, ids, start, end, resolution, points)
+            group = self.groups.get(kind)
+            if group is None:
+                raise KeyError(f"Unknown metric kind '{kind}', expected one of {[*self.groups, *self.intervals]}")
+            if metric not in group.values:
+                raise KeyError(f"Unknown metric '{metric}' for '{kind}', expected one of {list(group.values)}")
+            unknown = [i for i in ids or () if i not in group.ids]
+            if unknown:
+                raise KeyError(f"Unknown {kind} ids {unknown}")
+            columns = [group.ids.index(i) for i in ids] if ids else list(range(len(group.ids)))
+            rows = self._rows(start, end)
+            times = self.times[rows]
+            values = group.values[metric][rows][:, columns]
+
+        return {"kind": kind, "metric": metric, **_series(times, values, [group.ids[c] for c in columns],
+                                                           resolution, points)}
+
+    def _query_intervals(self, kind, metric, ids, start, end, resolution, points) -> dict:
+        series = self.intervals[kind]
+        if metric not in series.values:
+            raise KeyError(f"Unknown metric '{metric}' for '{kind}', expected one of {list(series.values)}")
+        unknown = [i for i in ids or () if i not in series.ids]
+        if unknown:
+            raise KeyError(f"Unknown {kind} ids {unknown}")
+        return {"kind": kind, "metric": metric, "series": series.query(metric, ids, start, end, resolution, points)}
+
+    def latest(self, kind: str) -> Dict[str, Dict[str, float]]:
+        """Newest row of every metric of ``kind``, by entity"""
+        with self._lock:
+            if kind in self.intervals:
+                return self.intervals[kind].latest()
+            group = self.groups[kind]
+            if not self._count:
+                return {}
+            row = (self._head - 1) % self.retention
+            return {
+                entity: {metric: float(array[row, i]) for metric, array in group.values.items()}
+                for i, entity in enumerate(group.ids)
+            }
+
+    def catalog(self) -> dict:
+        with self._lock:
+            rows = self._rows(None, None)
+            return {
+                "retention": self.retention,
+                "count": self._count,
+                "start": float(self.times[rows[0]]) if len(rows) else None,
+                "end": float(self.times[rows[-1]]) if len(rows) else None,
+                "nbytes": self.nbytes,
+                "kinds": {
+                    kind: {"metrics": list(group.values), "ids": list(group.ids)}
+                    for kind, group in self.groups.items()
+                },
+                "intervals": {
+                    kind: {"metrics": list(series.values), "ids": list(series.ids)}
+                    for kind, series in self.intervals.items()
+                }
+            }
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + sum(group.nbytes for group in (*self.groups.values(), *self.intervals.values()))
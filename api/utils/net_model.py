@@ -0,0 +1,342 @@
+"""Offline network model: topology questions answered without a SUMO process.
+
+The sumocfg, net file and detector definitions are read once with a streaming
+parser (``iterparse``, elements are cleared as soon as they are consumed) into
+flat numpy arrays. The arrays are cached on disk as an ``.npz`` keyed by the
+hash of the source files, so later startups skip the XML entirely.
+"""
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, fields
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .logger import logger
+from .network_index import DIRECTIONS, direction_of
+
+
+CACHE_FORMAT = 1
+CACHE_DIR_NAME = ".netcache"
+
+
+# sumocfg
+def parse_sumocfg(cfg_file: str) -> Dict[str, Dict[str, str]]:
+    """Options of a sumocfg grouped by section: ``{"input": {"net-file": "osm.net.xml", ...}}``"""
+    config: Dict[str, Dict[str, str]] = {}
+    depth = 0
+    section = None
+    for event, elem in ET.iterparse(cfg_file, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if depth == 2:
+                section = config.setdefault(elem.tag, {})
+            continue
+        if depth == 3 and section is not None and "value" in elem.attrib:
+            section[elem.tag] = elem.attrib["value"]
+        depth -= 1
+        elem.clear()
+    return config
+
+
+def config_files(cfg_file: str, option: str, config: Optional[dict] = None) -> List[str]:
+    """Paths listed by a file option (net-file, route-files, ...), resolved against the cfg's folder"""
+    config = config or parse_sumocfg(cfg_file)
+    value = config.get("input", {}).get(option, "")
+    base = os.path.dirname(os.path.abspath(cfg_file))
+    return [os.path.join(base, name) for name in value.replace(",", " ").split()]
+
+
+# network
+@dataclass(frozen=True)
+class NetworkModel:
+    """Array-backed view of a SUMO network and its detectors.
+
+    Every entity lives at an integer position; relations are stored as index
+    arrays (``lane_edge``, ``link_from_lane``, ...) and ``-1`` marks a missing
+    reference. Lanes of edge ``e`` are ``edge_lane_start[e]:edge_lane_start[e + 1]``.
+    """
+    junction_ids: np.ndarray
+    junction_type: np.ndarray
+    junction_xy: np.ndarray  # (n, 2) meters
+    edge_ids: np.ndarray
+    edge_function: np.ndarray  # "" for normal edges, "internal", ...
+    edge_from: np.ndarray  # junction index
+    edge_to: np.ndarray
+    edge_lane_start: np.ndarray  # n_edges + 1 offsets into the lane arrays
+    lane_ids: np.ndarray
+    lane_edge: np.ndarray
+    lane_length: np.ndarray
+    lane_speed: np.ndarray
+    tls_ids: np.ndarray
+    tls_type: np.ndarray
+    phase_tls: np.ndarray  # tls index of each phase, in program order
+    phase_duration: np.ndarray
+    phase_state: np.ndarray
+    link_tls: np.ndarray  # connections controlled by a traffic light
+    link_index: np.ndarray
+    link_from_lane: np.ndarray
+    link_to_lane: np.ndarray
+    link_via_lane: np.ndarray
+    link_dir: np.ndarray
+    e1_ids: np.ndarray
+    e1_lane: np.ndarray
+    e1_pos: np.ndarray
+    e1_file: np.ndarray
+    e2_ids: np.ndarray
+    e2_lane: np.ndarray
+    e2_pos: np.ndarray
+    e2_length: np.ndarray
+    e2_file: np.ndarray
+
+    # lookups
+    @cached_property
+    def lane_index(self) -> Dict[str, int]:
+        return {lane_id: i for i, lane_id in enumerate(self.lane_ids.tolist())}
+
+    @cached_property
+    def edge_index(self) -> Dict[str, int]:
+        return {edge_id: i for i, edge_id in enumerate(self.edge_ids.tolist())}
+
+    @cached_property
+    def junction_index(self) -> Dict[str, int]:
+        return {junction_id: i for i, junction_id in enumerate(self.junction_ids.tolist())}
+
+    @cached_property
+    def tls_index(self) -> Dict[str, int]:
+        return {tls_id: i for i, tls_id in enumerate(self.tls_ids.tolist())}
+
+    # lanes and edges
+    def lane_length_of(self, lane_id: str) -> float:
+        return float(self.lane_length[self.lane_index[lane_id]])
+
+    def edge_lanes(self, edge_id: str) -> List[str]:
+        e = self.edge_index[edge_id]
+        return self.lane_ids[self.edge_lane_start[e]:self.edge_lane_start[e + 1]].tolist()
+
+    def lanes_by_direction(self) -> Dict[str, List[str]]:
+        """Same grouping as ``NetworkIndex.lanes_by_direction`` without a connection"""
+        groups = {direction: [] for direction in DIRECTIONS}
+        for lane_id in self.lane_ids.tolist():
+            d = direction_of(lane_id)
+            if d >= 0:
+                groups[DIRECTIONS[d]].append(lane_id)
+        return groups
+
+    def junction_position(self, junction_id: str) -> Tuple[float, float]:
+        x, y = self.junction_xy[self.junction_index[junction_id]]
+        return float(x), float(y)
+
+    # traffic lights
+    def controlled_links(self, tls_id: str) -> List[dict]:
+        """Connections of ``tls_id`` by link index, as ``traci.trafficlight.getControlledLinks`` lists them"""
+        rows = np.flatnonzero(self.link_tls == self.tls_index[tls_id])
+        rows = rows[np.argsort(self.link_index[rows], kind="stable")]
+        return [
+            {
+                "link_index": int(self.link_index[r]),
+                "from_lane": str(self.lane_ids[self.link_from_lane[r]]),
+                "to_lane": str(self.lane_ids[self.link_to_lane[r]]),
+                "via_lane": str(self.lane_ids[self.link_via_lane[r]]) if self.link_via_lane[r] >= 0 else None,
+                "dir": str(self.link_dir[r])
+            }
+            for r in rows
+        ]
+
+    def controlled_lanes(self, tls_id: str) -> List[str]:
+        """Unique incoming lanes of ``tls_id`` in link order"""
+        return list(dict.fromkeys(link["from_lane"] for link in self.controlled_links(tls_id)))
+
+    def phases(self, tls_id: str) -> List[dict]:
+        rows = np.flatnonzero(self.phase_tls == self.tls_index[tls_id])
+        return [
+            {"index": i, "duration": float(self.phase_duration[r]), "state": str(self.phase_state[r])}
+            for i, r in enumerate(rows)
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "junctions": len(self.junction_ids),
+            "edges": int(np.count_nonzero(self.edge_function == "")),
+            "internal_edges": int(np.count_nonzero(self.edge_function == "internal")),
+            "lanes": len(self.lane_ids),
+            "traffic_lights": self.tls_ids.tolist(),
+            "e1_detectors": len(self.e1_ids),
+            "e2_detectors": len(self.e2_ids)
+        }
+
+    # persistence
+    def save(self, path: str):
+        np.savez(path, **{f.name: getattr(self, f.name) for f in fields(self)})
+
+    @classmethod
+    def load(cls, path: str) -> "NetworkModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(**{f.name: data[f.name] for f in fields(cls)})
+
+
+def _str_array(values: Sequence[str]) -> np.ndarray:
+    return np.array(values, dtype=np.str_) if values else np.empty(0, dtype="<U1")
+
+
+def _float(attrib: dict, key: str, default: float = 0.0) -> float:
+    value = attrib.get(key)
+    return float(value) if value is not None else default
+
+
+def parse_network(net_file: str, additional_files: Sequence[str] = ()) -> NetworkModel:
+    """Stream ``net_file`` (and detector definitions in ``additional_files``) into a NetworkModel"""
+    junctions, junction_type, junction_xy = [], [], []
+    edges, edge_function, edge_from, edge_to, edge_lane_start = [], [], [], [], []
+    lanes, lane_edge, lane_length, lane_speed = [], [], [], []
+    tls, tls_type, phase_tls, phase_duration, phase_state = [], [], [], [], []
+    connections = []
+    next_lane_start = 0
+
+    for _, elem in ET.iterparse(net_file, events=("end",)):
+        tag, a = elem.tag, elem.attrib
+        if tag == "lane":
+            lanes.append(a["id"])
+            lane_edge.append(len(edges))  # the enclosing edge closes after its lanes
+            lane_length.append(_float(a, "length"))
+            lane_speed.append(_float(a, "speed"))
+        elif tag == "edge":
+            edge_lane_start.append(next_lane_start)
+            next_lane_start = len(lanes)
+            edges.append(a["id"])
+            edge_function.append(a.get("function", ""))
+            edge_from.append(a.get("from", ""))
+            edge_to.append(a.get("to", ""))
+        elif tag == "junction":
+            junctions.append(a["id"])
+            junction_type.append(a.get("type", ""))
+            junction_xy.append((_float(a, "x"), _float(a, "y")))
+        elif tag == "phase":
+            phase_tls.append(len(tls))  # phases close before their tlLogic
+            phase_duration.append(_float(a, "duration"))
+            phase_state.append(a.get("state", ""))
+        elif tag == "tlLogic":
+            tls.append(a["id"])
+            tls_type.append(a.get("type", "static"))
+        elif tag == "connection" and "tl" in a:
+            connections.append((a["tl"], int(a.get("linkIndex", -1)),
+                                f'{a["from"]}_{a["fromLane"]}', f'{a["to"]}_{a["toLane"]}',
+                                a.get("via"), a.get("dir", "")))
+        elem.clear()
+    edge_lane_start.append(len(lanes))
+
+    e1, e2 = [], []
+    for add_file in additional_files:
+        for _, elem in ET.iterparse(add_file, events=("end",)):
+            a = elem.attrib
+            if elem.tag in ("inductionLoop", "e1Detector"):
+                e1.append((a["id"], a["lane"], _float(a, "pos"), a.get("file", "")))
+            elif elem.tag in ("laneAreaDetector", "e2Detector"):
+                e2.append((a["id"], a["lane"], _float(a, "pos"), _float(a, "length"), a.get("file", "")))
+            elem.clear()
+
+    junction_idx = {junction_id: i for i, junction_id in enumerate(junctions)}
+    tls_idx = {tls_id: i for i, tls_id in enumerate(tls)}
+    lane_idx = {lane_id: i for i, lane_id in enumerate(lanes)}
+
+    return NetworkModel(
+        junction_ids=_str_array(junctions),
+        junction_type=_str_array(junction_type),
+        junction_xy=np.array(junction_xy, dtype=np.float64).reshape(-1, 2),
+        edge_ids=_str_array(edges),
+        edge_function=_str_array(edge_function),
+        edge_from=np.array([junction_idx.get(j, -1) for j in edge_from], dtype=np.int32),
+        edge_to=np.array([junction_idx.get(j, -1) for j in edge_to], dtype=np.int32),
+        edge_lane_start=np.array(edge_lane_start, dtype=np.int32),
+        lane_ids=_str_array(lanes),
+        lane_edge=np.array(lane_edge, dtype=np.int32),
+        lane_length=np.array(lane_length, dtype=np.float64),
+        lane_speed=np.array(lane_speed, dtype=np.float64),
+        tls_ids=_str_array(tls),
+        tls_type=_str_array(tls_type),
+        phase_tls=np.array(phase_tls, dtype=np.int32),
+        phase_duration=np.array(phase_duration, dtype=np.float64),
+        phase_state=_str_array(phase_state),
+        link_tls=np.array([tls_idx.get(c[0], -1) for c in connections], dtype=np.int32),
+        link_index=np.array([c[1] for c in connections], dtype=np.int32),
+        link_from_lane=np.array([lane_idx.get(c[2], -1) for c in connections], dtype=np.int32),
+        link_to_lane=np.array([lane_idx.get(c[3], -1) for c in connections], dtype=np.int32),
+        link_via_lane=np.array([lane_idx.get(c[4], -1) for c in connections], dtype=np.int32),
+        link_dir=_str_array([c[5] for c in connections]),
+        e1_ids=_str_array([d[0] for d in e1]),
+        e1_lane=np.array([lane_idx.get(d[1], -1) for d in e1], dtype=np.int32),
+        e1_pos=np.array([d[2] for d in e1], dtype=np.float64),
+        e1_file=_str_array([d[3] for d in e1]),
+        e2_ids=_str_array([d[0] for d in e2]),
+        e2_lane=np.array([lane_idx.get(d[1], -1) for d in e2], dtype=np.int32),
+        e2_pos=np.array([d[2] for d in e2], dtype=np.float64),
+        e2_length=np.array([d[3] for d in e2], dtype=np.float64),
+        e2_file=_str_array([d[4] for d in e2])
+    )
+
+
+def files_hash(paths: Sequence[str]) -> str:
+    digest = hashlib.sha1(f"netmodel-{CACHE_FORMAT}".encode())
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_network(net_file: str, additional_files: Sequence[str] = (), cache_dir: Optional[str] = None) -> NetworkModel:
+    """NetworkModel for these files, from the on-disk cache when the files are unchanged"""
+    sources = [net_file, *additional_files]
+    cache_dir = Path(cache_dir or Path(net_file).parent / CACHE_DIR_NAME)
+    cache_file = cache_dir / f"{Path(net_file).stem}.{files_hash(sources)}.npz"
+
+    if cache_file.exists():
+        try:
+            return NetworkModel.load(str(cache_file))
+        except Exception as e:  # stale format or truncated write, rebuild below
+            logger.warning(f"Ignoring network cache {cache_file}: {str(e)}")
+
+    model = parse_network(net_file, additional_files)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".tmp.npz")
+        model.save(str(tmp_file))
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write network cache {cache_file}: {str(e)}")
+    return model
+
+
+@lru_cache(maxsize=8)
+def _scenario_sources(cfg_file: str, mtime: float) -> Tuple[str, ...]:
+    """The cfg and the files its network model is built from (net file, additional files)"""
+    config = parse_sumocfg(cfg_file)
+    return (cfg_file, *config_files(cfg_file, "net-file", config), *config_files(cfg_file, "additional-files", config))
+
+
+def _stamps(paths: Sequence[str]) -> Tuple[Tuple[str, int, int], ...]:
+    stats = [os.stat(path) for path in paths]
+    return tuple((path, stat.st_mtime_ns, stat.st_size) for path, stat in zip(paths, stats))
+
+
+@lru_cache(maxsize=8)
+def _load_scenario(cfg_file: str, stamps: tuple) -> Tuple[Dict[str, Dict[str, str]], NetworkModel]:
+    config = parse_sumocfg(cfg_file)
+    net_file, = config_files(cfg_file, "net-file", config)
+    network = load_network(net_file, config_files(cfg_file, "additional-files", config))
+    return config, network
+
+
+def load_scenario(cfg_file: str) -> Tuple[Dict[str, Dict[str, str]], NetworkModel]:
+    """Parsed sumocfg and its network model, memoized until one of their files changes.
+
+    The memo is keyed by the mtime and size of every source file, a changed
+    file is then looked up (by hash) in the on-disk cache like at startup.
+    """
+    cfg_file = os.path.abspath(cfg_file)
+    sources = _scenario_sources(cfg_file, os.path.getmtime(cfg_file))
+    return _load_scenario(cfg_file, _stamps(sources))
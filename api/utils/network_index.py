@@ -0,0 +1,137 @@
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+# approach directions, lanes are assigned by the first letter of their id
+DIRECTIONS = ("N", "S", "W", "E")
+NO_DIRECTION = -1
+
+
+def direction_of(lane_id: str) -> int:
+    for i, direction in enumerate(DIRECTIONS):
+        if lane_id.startswith(direction):
+            return i
+    return NO_DIRECTION
+
+
+@dataclass(frozen=True)
+class NetworkIndex:
+    """Static topology of the loaded network, built once per connection.
+
+    Lanes, detectors and traffic lights do not change while SUMO runs, so their
+    ids are resolved to integer positions once and per-step code indexes numpy
+    arrays instead of asking TraCI again. Arrays are indexed by the position of
+    the id in ``lane_ids``/``e1_ids``/``e2_ids``.
+    """
+    lane_ids: Tuple[str, ...]
+    lane_lengths: np.ndarray  # meters
+    lane_direction: np.ndarray  # index into DIRECTIONS, NO_DIRECTION for internal lanes
+    e1_ids: Tuple[str, ...] = ()
+    e1_lanes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    e2_ids: Tuple[str, ...] = ()
+    e2_lanes: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int32))
+    tls_controlled: Dict[str, np.ndarray] = field(default_factory=dict)  # unique lanes, signal order
+    lane_index: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, conn) -> "NetworkIndex":
+        lane_ids = tuple(conn.lane.getIDList())
+        lane_index = {lane_id: i for i, lane_id in enumerate(lane_ids)}
+
+        e1_ids = tuple(conn.inductionloop.getIDList())
+        e2_ids = tuple(conn.lanearea.getIDList())
+
+        return cls(
+            lane_ids=lane_ids,
+            lane_lengths=np.array([conn.lane.getLength(lane_id) for lane_id in lane_ids], dtype=np.float64),
+            lane_direction=np.array([direction_of(lane_id) for lane_id in lane_ids], dtype=np.int8),
+            e1_ids=e1_ids,
+            e1_lanes=np.array([lane_index[conn.inductionloop.getLaneID(d)] for d in e1_ids], dtype=np.int32),
+            e2_ids=e2_ids,
+            e2_lanes=np.array([lane_index[conn.lanearea.getLaneID(d)] for d in e2_ids], dtype=np.int32),
+            tls_controlled={
+                tls_id: np.array(
+                    [lane_index[lane_id] for lane_id in dict.fromkeys(conn.trafficlight.getControlledLanes(tls_id))],
+                    dtype=np.int32
+                )
+                for tls_id in conn.trafficlight.getIDList()
+            },
+            lane_index=lane_index
+        )
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, ``from_dict`` restores it (recordings keep the index)"""
+        return {
+            "lane_ids": list(self.lane_ids),
+            "lane_lengths": self.lane_lengths.tolist(),
+            "lane_direction": self.lane_direction.tolist(),
+            "e1_ids": list(self.e1_ids),
+            "e1_lanes": self.e1_lanes.tolist(),
+            "e2_ids": list(self.e2_ids),
+            "e2_lanes": self.e2_lanes.tolist(),
+            "tls_controlled": {tls_id: lanes.tolist() for tls_id, lanes in self.tls_controlled.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NetworkIndex":
+        lane_ids = tuple(data["lane_ids"])
+        return cls(
+            lane_ids=lane_ids,
+            lane_lengths=np.array(data["lane_lengths"], dtype=np.float64),
+            lane_direction=np.array(data["lane_direction"], dtype=np.int8),
+            e1_ids=tuple(data["e1_ids"]),
+            e1_lanes=np.array(data["e1_lanes"], dtype=np.int32),
+            e2_ids=tuple(data["e2_ids"]),
+            e2_lanes=np.array(data["e2_lanes"], dtype=np.int32),
+            tls_controlled={
+                tls_id: np.array(lanes, dtype=np.int32) for tls_id, lanes in data["tls_controlled"].items()
+            },
+            lane_index={lane_id: i for i, lane_id in enumerate(lane_ids)}
+        )
+
+    # lanes
+    def direction_lanes(self, direction: str) -> np.ndarray:
+        """Indices of the lanes approaching from ``direction``"""
+        return np.flatnonzero(self.lane_direction == DIRECTIONS.index(direction))
+
+    @cached_property
+    def direction_groups(self) -> Dict[str, Tuple[str, ...]]:
+        return {
+            direction: tuple(self.lane_ids[i] for i in self.direction_lanes(direction))
+            for direction in DIRECTIONS
+        }
+
+    def lanes_by_direction(self) -> Dict[str, List[str]]:
+        return {direction: list(lanes) for direction, lanes in self.direction_groups.items()}
+
+    def length(self, lane_id: str) -> float:
+        return float(self.lane_lengths[self.lane_index[lane_id]])
+
+    # detectors
+    def e1_lane(self, loop_id: str) -> str:
+        return self.lane_ids[self.e1_lanes[self.e1_ids.index(loop_id)]]
+
+    def e2_lane(self, area_id: str) -> str:
+        return self.lane_ids[self.e2_lanes[self.e2_ids.index(area_id)]]
+
+    @cached_property
+    def e2_by_direction(self) -> Dict[str, Tuple[str, ...]]:
+        """E2 detectors grouped by the direction of the lane they cover"""
+        directions = self.lane_direction[self.e2_lanes]
+        return {
+            direction: tuple(self.e2_ids[i] for i in np.flatnonzero(directions == d))
+            for d, direction in enumerate(DIRECTIONS)
+        }
+
+    # traffic lights
+    def controlled_lanes(self, tls_id: str) -> List[str]:
+        return [self.lane_ids[i] for i in self.tls_controlled[tls_id]]
+
+    def controlled_detectors(self, tls_id: str, kind: str = "e1") -> List[str]:
+        """Detectors of ``kind`` (e1/e2) placed on lanes controlled by ``tls_id``"""
+        ids, lanes = (self.e1_ids, self.e1_lanes) if kind == "e1" else (self.e2_ids, self.e2_lanes)
+        controlled = np.isin(lanes, self.tls_controlled[tls_id])
+        return [ids[i] for i in np.flatnonzero(controlled)]
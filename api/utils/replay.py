@@ -0,0 +1,268 @@
+"""Record snapshots to disk and replay them without SUMO.
+
+A recording is a directory with
+
+- ``meta.json``: network index, step length, cfg and creation time
+- ``frames.bin``: append-only, one zlib-compressed JSON snapshot per step
+- ``index.bin``: one ``INDEX_DTYPE`` record per frame (time, step, offset, size)
+
+Replay memory-maps the frames and loads the (small) index. ``ReplayManager``
+stands in for the SubscriptionManager of a simulation instance, so the
+driver, the broadcast hub, the metrics store and every snapshot-based getter
+work unchanged; the recording also takes the place of the SUMO process and
+the connection. The replay's driver binds a ``ReplayConnection`` so that
+TraCI calls on its thread fail instead of reaching the default connection.
+"""
+import json
+import mmap
+import os
+import time
+import zlib
+from dataclasses import fields
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from .network_index import NetworkIndex
+from .sumo_backend import backend
+from .traci_cache import DOMAINS, RESETS
+from .traci_subscriptions import SimulationSnapshot, SubscriptionManager
+
+
+INDEX_DTYPE = np.dtype([("time", "<f8"), ("step", "<i8"), ("offset", "<u8"), ("size", "<u4")])
+META_FILE = "meta.json"
+FRAMES_FILE = "frames.bin"
+INDEX_FILE = "index.bin"
+
+# stored per frame, the network is in meta.json
+_FRAME_FIELDS = tuple(f.name for f in fields(SimulationSnapshot) if f.name != "network")
+
+
+def _encode_snapshot(snapshot: SimulationSnapshot) -> bytes:
+    data = {name: getattr(snapshot, name) for name in _FRAME_FIELDS}
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode(), 1)
+
+
+def _decode_snapshot(payload: bytes, network: NetworkIndex) -> SimulationSnapshot:
+    data = json.loads(zlib.decompress(payload))
+    data["departed"] = tuple(data["departed"])
+    data["arrived"] = tuple(data["arrived"])
+    return SimulationSnapshot(**data, network=network)
+
+
+class SnapshotRecorder:
+    """Appends every recorded snapshot of a simulation to ``directory``"""
+    def __init__(self, directory: str, network: NetworkIndex, delta_t: float, cfg_file: Optional[str] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if (self.directory / INDEX_FILE).exists():
+            raise FileExistsError(f"Recording '{directory}' already exists")
+        (self.directory / META_FILE).write_text(json.dumps({
+            "delta_t": delta_t,
+            "cfg_file": cfg_file,
+            "created_at": time.time(),
+            "network": network.to_dict()
+        }))
+        self._frames = open(self.directory / FRAMES_FILE, "ab")
+        self._index = open(self.directory / INDEX_FILE, "ab")
+        self._entry = np.zeros(1, dtype=INDEX_DTYPE)
+        self._last_time: Optional[float] = None
+        self.count = 0
+
+    @classmethod
+    def for_manager(cls, manager: SubscriptionManager, directory: str, cfg_file: Optional[str] = None):
+        return cls(directory, manager.network, manager.delta_t, cfg_file)
+
+    def record(self, snapshot: SimulationSnapshot):
+        if self._last_time is not None and snapshot.time <= self._last_time:
+            return  # the time index only moves forward
+        payload = _encode_snapshot(snapshot)
+        entry = self._entry[0]
+        entry["time"], entry["step"] = snapshot.time, snapshot.step
+        entry["offset"], entry["size"] = self._frames.tell(), len(payload)
+        self._frames.write(payload)
+        self._frames.flush()
+        # the index entry goes last, readers never see a frame that is not written yet
+        self._index.write(self._entry.tobytes())
+        self._index.flush()
+        self._last_time = snapshot.time
+        self.count += 1
+
+    def close(self):
+        self._frames.close()
+        self._index.close()
+
+    def to_dict(self) -> dict:
+        return {"directory": str(self.directory), "frames": self.count, "last_time": self._last_time}
+
+
+class ReplayFile:
+    """Read-only, memory-mapped view of a recording.
+
+    Also stands in for the SUMO process of a replayed instance: ``pid`` is
+    None and ``terminate`` closes the maps.
+    """
+    pid = None
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.meta = json.loads((self.directory / META_FILE).read_text())
+        self.network = NetworkIndex.from_dict(self.meta["network"])
+        index_path = self.directory / INDEX_FILE
+        count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        if count == 0:
+            raise ValueError(f"Recording '{directory}' has no frames")
+        self.index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+        with open(self.directory / FRAMES_FILE, "rb") as fp:
+            self._frames = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.returncode: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def times(self) -> np.ndarray:
+        return self.index["time"]
+
+    def find(self, sim_time: float) -> int:
+        """Position of the last frame at or before ``sim_time`` (the first one if none)"""
+        return max(0, int(np.searchsorted(self.times, sim_time, side="right")) - 1)
+
+    def snapshot(self, position: int) -> SimulationSnapshot:
+        entry = self.index[position]
+        offset = int(entry["offset"])
+        return _decode_snapshot(self._frames[offset:offset + int(entry["size"])], self.network)
+
+    def close(self):
+        if self.returncode is None:
+            self._frames.close()
+            self.returncode = 0
+
+    terminate = close
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.directory.name,
+            "frames": len(self),
+            "start": float(self.times[0]),
+            "end": float(self.times[-1]),
+            "delta_t": self.meta["delta_t"],
+            "cfg_file": self.meta.get("cfg_file"),
+            "created_at": self.meta.get("created_at")
+        }
+
+
+class ReplayConnection:
+    """Stands in for the TraCI connection of a replay: domains and commands raise TraCIException"""
+    def __init__(self, sim_id: str):
+        self.sim_id = sim_id
+
+    def __getattr__(self, name):
+        if name in DOMAINS or name in RESETS:
+            raise backend.module.TraCIException(f"Simulation '{self.sim_id}' is a replay, it has no TraCI connection")
+        raise AttributeError(name)  # module level helpers (constants, exceptions) resolve on the backend
+
+
+class ReplayManager:
+    """SubscriptionManager interface over a ReplayFile.
+
+    ``step`` moves to the next frame (or to the last one before
+    ``target_time``), ``seek`` jumps anywhere. At the end of the recording
+    the last frame stays current.
+    """
+    def __init__(self, recording: ReplayFile):
+        self.recording = recording
+        self.conn = recording  # closed by SimulationRegistry.stop
+        self.delta_t = recording.meta["delta_t"]
+        self._position = -1
+        self._snapshot: Optional[SimulationSnapshot] = None
+        self._metrics = None
+
+    def subscribe_all(self):
+        if self._snapshot is None:
+            self._load(0)
+
+    def resubscribe(self) -> SimulationSnapshot:
+        return self._snapshot
+
+    def reset(self):
+        self._position = -1
+        self._snapshot = None
+        self._metrics = None
+
+    @property
+    def subscribed(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def network(self) -> NetworkIndex:
+        return self.recording.network
+
+    @property
+    def snapshot(self) -> Optional[SimulationSnapshot]:
+        return self._snapshot
+
+    @property
+    def demand(self):
+        return None
+
+    @property
+    def recorder(self):
+        return None
+
+    @property
+    def trips(self):
+        return None
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @property
+    def position(self) -> int:
+        return self._position
+
+    @property
+    def finished(self) -> bool:
+        return self._position >= len(self.recording) - 1
+
+    def attach_metrics(self, metrics):
+        metrics.clear()
+        self._metrics = metrics
+        if self._snapshot is not None:
+            metrics.record(self._snapshot)
+
+    def _load(self, position: int) -> SimulationSnapshot:
+        position = min(max(position, 0), len(self.recording) - 1)
+        if position != self._position:
+            self._position = position
+            self._snapshot = self.recording.snapshot(position)
+            if self._metrics is not None:
+                self._metrics.record(self._snapshot)
+        return self._snapshot
+
+    def step(self, target_time: float = 0.) -> SimulationSnapshot:
+        position = self._position + 1
+        if target_time > 0:
+            position = max(position, self.recording.find(target_time))
+        return self._load(position)
+
+    def refresh(self) -> SimulationSnapshot:
+        return self._snapshot
+
+    def seek(self, sim_time: float) -> SimulationSnapshot:
+        return self._load(self.recording.find(sim_time))
+
+
+def list_recordings(directory: str) -> List[dict]:
+    recordings = []
+    for path in sorted(Path(directory).glob(f"*/{META_FILE}")):
+        try:
+            recording = ReplayFile(str(path.parent))
+        except (ValueError, OSError) as e:
+            recordings.append({"name": path.parent.name, "error": str(e)})
+            continue
+        recordings.append(recording.to_dict())
+        recording.close()
+    return recordings
@@ -0,0 +1,260 @@
+"""Demand streaming: vehicles enter SUMO through TraCI shortly before they depart.
+
+A route file is read once (``iterparse``), sorted by depart time (an external
+merge sort of fixed-size runs) and split into time-window shards on disk, keyed by the file hash like the network cache.
+SUMO then starts without route files and ``DemandStreamer.feed`` loads one
+shard at a time, adding the vehicles that depart within the lookahead with
+``route.add``/``vehicle.add``; trips start on a route of their first edge and
+are routed by SUMO with ``setVia``/``changeTarget``. Startup no longer parses the demand and memory
+only holds the shards around the current time.
+"""
+import heapq
+import json
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from collections import deque
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .logger import logger
+from .net_model import config_files, files_hash
+from .sumo_backend import traci
+
+
+CACHE_DIR_NAME = ".routecache"
+SHARD_FORMAT = 3  # part of the shard directory name, bumped when the records change
+SORT_CHUNK = 100_000  # records sorted in memory at once while sharding
+
+# vehicle attributes passed on to traci.vehicle.add
+VEHICLE_ATTRS = {
+    "type": "typeID",
+    "departLane": "departLane",
+    "departPos": "departPos",
+    "departSpeed": "departSpeed",
+    "arrivalLane": "arrivalLane",
+    "arrivalPos": "arrivalPos",
+    "arrivalSpeed": "arrivalSpeed",
+    "line": "line",
+    "personCapacity": "personCapacity",
+    "personNumber": "personNumber"
+}
+
+
+@dataclass
+class DemandShard:
+    file: str
+    begin: float  # depart time of the first vehicle
+    end: float  # depart time of the last vehicle
+    count: int
+
+
+def _iter_demand(route_file: str, vtypes: List[str]):
+    """Yield ``[depart, id, edges, attrs]`` for every vehicle and
+    ``[depart, id, from, attrs, to, via]`` for every trip in ``route_file``.
+
+    Named routes are resolved to their edges, vType definitions are collected
+    into ``vtypes`` (serialized) since TraCI cannot create types from scratch.
+    """
+    routes: Dict[str, str] = {}
+    depth = 0
+    for event, elem in ET.iterparse(route_file, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        tag, a = elem.tag, elem.attrib
+
+        if tag == "route" and depth == 1 and "id" in a:
+            routes[a["id"]] = a["edges"]
+        elif tag == "vType" and depth == 1:
+            vtypes.append(ET.tostring(elem, encoding="unicode").strip())
+        elif tag == "vehicle":
+            if "route" in a:
+                edges = routes[a["route"]]
+            else:
+                route = elem.find("route")
+                edges = route.attrib["edges"] if route is not None else ""
+            yield [float(a["depart"]), a["id"], edges, {k: a[k] for k in VEHICLE_ATTRS if k in a}]
+        elif tag == "trip":
+            if "from" not in a or "to" not in a:
+                # fromJunction/fromTaz trips need routing SUMO does not offer through TraCI
+                logger.warning(f"Demand streaming skips <trip id='{a.get('id')}'> without from/to edges in {route_file}")
+            else:
+                yield [float(a["depart"]), a["id"], a["from"], {k: a[k] for k in VEHICLE_ATTRS if k in a},
+                       a["to"], a.get("via", "").split()]
+        elif tag in ("flow", "routeFlow", "person", "personFlow", "container"):
+            logger.warning(f"Demand streaming skips <{tag} id='{a.get('id')}'> in {route_file}")
+        else:
+            continue
+        if depth <= 1:
+            elem.clear()
+
+
+def _depart(record: list) -> float:
+    return record[0]
+
+
+def _spill(chunk: List[list], stack: ExitStack) -> Iterator[list]:
+    """Sort ``chunk`` into a temporary file (JSON lines), returns a reader of it"""
+    chunk.sort(key=_depart)
+    fp = stack.enter_context(tempfile.TemporaryFile("w+"))
+    for record in chunk:
+        fp.write(json.dumps(record, separators=(",", ":")))
+        fp.write("\n")
+    fp.seek(0)
+    return (json.loads(line) for line in fp)
+
+
+def _sorted_demand(records: Iterable[list], chunk_size: int = SORT_CHUNK) -> Iterator[list]:
+    """``records`` by depart time, earlier records first on ties.
+
+    Sorted runs of ``chunk_size`` records are spilled to temporary files and
+    merged, memory holds one run whatever the size of the demand.
+    """
+    with ExitStack() as stack:
+        runs = []
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                runs.append(_spill(chunk, stack))
+                chunk = []
+        chunk.sort(key=_depart)
+        # heapq.merge keeps the order of the runs for equal departs, stable like one sort
+        runs.append(iter(chunk))
+        yield from heapq.merge(*runs, key=_depart)
+
+
+def shard_routes(route_files: Sequence[str], window: float = 300.0, cache_dir: Optional[str] = None,
+                 chunk_size: int = SORT_CHUNK) -> dict:
+    """Sort the demand in ``route_files`` by depart time and write ``window``-second shards.
+
+    Returns the manifest (also stored as manifest.json). Shards are reused as
+    long as the route files and the window are unchanged.
+    """
+    key = files_hash(route_files)
+    cache_dir = Path(cache_dir or Path(route_files[0]).parent / CACHE_DIR_NAME)
+    shard_dir = cache_dir / f"{Path(route_files[0]).stem}.{key}.w{int(window)}.v{SHARD_FORMAT}"
+    manifest_file = shard_dir / "manifest.json"
+    if manifest_file.exists():
+        return json.loads(manifest_file.read_text())
+
+    vtypes: List[str] = []
+    demand = (record for route_file in route_files for record in _iter_demand(route_file, vtypes))
+
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    shards = []
+    vehicles = 0
+
+    def write_shard(records: List[list]):
+        name = f"shard_{len(shards):05d}.json"
+        (shard_dir / name).write_text(json.dumps(records, separators=(",", ":")))
+        shards.append(asdict(DemandShard(name, records[0][0], records[-1][0], len(records))))
+
+    shard: List[list] = []
+    window_end = 0.0
+    for record in _sorted_demand(demand, chunk_size):
+        if shard and record[0] >= window_end:
+            write_shard(shard)
+            shard = []
+        if not shard:
+            window_end = (record[0] // window + 1) * window
+        shard.append(record)
+        vehicles += 1
+    if shard:
+        write_shard(shard)
+
+    # written without types too: it replaces the cfg's route files on the command line
+    vtype_file = shard_dir / "vtypes.rou.xml"
+    vtype_file.write_text("<routes>\n" + "".join(f"{vtype}\n" for vtype in vtypes) + "</routes>\n")
+
+    manifest = {
+        "sources": [os.path.abspath(f) for f in route_files],
+        "hash": key,
+        "window": window,
+        "vehicles": vehicles,
+        "vtype_file": str(vtype_file),
+        "dir": str(shard_dir),
+        "shards": shards
+    }
+    manifest_file.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+class DemandStreamer:
+    """Feeds sharded demand into a running simulation ``lookahead`` seconds ahead.
+
+    Attach it to a SubscriptionManager (``attach_demand``), which calls
+    ``feed`` before every step with the current simulation time.
+    """
+    def __init__(self, route_files: Sequence[str], window: float = 300.0, lookahead: float = 60.0,
+                 cache_dir: Optional[str] = None):
+        self.manifest = shard_routes(route_files, window, cache_dir)
+        self.lookahead = lookahead
+        self.reset()
+
+    @classmethod
+    def for_cfg(cls, cfg_file: str, **kwargs) -> "DemandStreamer":
+        """Streamer for the route files a sumocfg would load"""
+        return cls(config_files(cfg_file, "route-files"), **kwargs)
+
+    def sumo_cmd(self, cmd: List[str]) -> List[str]:
+        """``cmd`` with the cfg's route files replaced (only vehicle types stay)"""
+        return cmd + ["--route-files", self.manifest["vtype_file"]]
+
+    def reset(self):
+        """Start over from the first shard (new connection or reloaded scenario)"""
+        self._next_shard = 0
+        self._pending: Deque[list] = deque()
+        self._routes: Dict[str, str] = {}  # edges -> route id added to SUMO
+        self.injected = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next_shard >= len(self.manifest["shards"]) and not self._pending
+
+    def feed(self, conn, sim_time: float) -> int:
+        """Add every vehicle departing before ``sim_time + lookahead``, returns how many"""
+        horizon = sim_time + self.lookahead
+        shards = self.manifest["shards"]
+        while self._next_shard < len(shards) and shards[self._next_shard]["begin"] <= horizon:
+            shard_file = os.path.join(self.manifest["dir"], shards[self._next_shard]["file"])
+            with open(shard_file) as fp:
+                self._pending.extend(json.load(fp))
+            self._next_shard += 1
+
+        added = 0
+        pending = self._pending
+        while pending and pending[0][0] <= horizon:
+            depart, veh_id, edges, attrs, *trip = pending.popleft()
+            route_id = self._routes.get(edges)
+            if route_id is None:
+                route_id = f"stream_r{len(self._routes)}"
+                conn.route.add(route_id, edges.split())
+                self._routes[edges] = route_id
+            try:
+                conn.vehicle.add(
+                    veh_id, route_id,
+                    depart=f"{depart:.2f}" if depart > sim_time else "now",
+                    **{VEHICLE_ATTRS[k]: v for k, v in attrs.items()}
+                )
+            except traci.TraCIException as e:
+                logger.warning(f"Demand streaming could not add vehicle '{veh_id}': {str(e)}")
+                continue
+            if trip:
+                # a trip starts on its first edge, SUMO routes it to the target through the via edges
+                to, via = trip
+                try:
+                    if via:
+                        conn.vehicle.setVia(veh_id, via)
+                    conn.vehicle.changeTarget(veh_id, to)
+                except traci.TraCIException as e:
+                    logger.warning(f"Demand streaming could not route trip '{veh_id}': {str(e)}")
+                    conn.vehicle.remove(veh_id)
+                    continue
+            added += 1
+        self.injected += added
+        return added
@@ -0,0 +1,269 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import itertools
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .logger import logger
+from .sumo_backend import bind_connection
+from .traci_subscriptions import SimulationSnapshot, SubscriptionManager, subscription_manager
+
+
+@dataclass
+class RunHandle:
+    """Progress of a background run started with ``SimulationDriver.start_run``
+    or ``SimulationDriver.start_fast_forward``"""
+    run_id: int
+    steps: int
+    interval: float  # seconds between steps, 0 runs as fast as SUMO allows
+    executed: int = 0
+    status: str = "running"  # running | finished | cancelled | failed
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    # fast-forward: jump to target_time in chunks of chunk_steps, hooks run after every chunk
+    target_time: Optional[float] = None
+    chunk_steps: int = 1
+    sim_time: Optional[float] = None
+    hooks: List[Callable[[SimulationSnapshot], None]] = field(default_factory=list, repr=False)
+    samples: List[dict] = field(default_factory=list, repr=False)  # filled by sampling hooks
+    finished_at: Optional[float] = None
+
+    @property
+    def mode(self) -> str:
+        return "paced" if self.target_time is None else "fast_forward"
+
+    def to_dict(self, samples: bool = False) -> dict:
+        data = {
+            "run_id": self.run_id,
+            "mode": self.mode,
+            "steps": self.steps,
+            "executed": self.executed,
+            "interval_ms": self.interval * 1000,
+            "target_time": self.target_time,
+            "sim_time": self.sim_time,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "sample_count": len(self.samples)
+        }
+        if samples:
+            data["samples"] = self.samples
+        return data
+
+
+class SimulationDriver:
+    """Owns the TraCI connection on a dedicated thread.
+
+    Endpoints never call TraCI on the event loop: they submit callables through
+    a command queue and await the returned future, while the step loop of a
+    background run executes on the driver thread between commands.
+
+    ``conn`` is a labeled TraCI connection; the driver thread binds it so that
+    ``traci`` calls inside submitted callables reach this instance.
+    """
+    def __init__(self, manager: SubscriptionManager = subscription_manager, conn=None):
+        self.manager = manager
+        self.conn = conn
+        self._commands: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._run: Optional[RunHandle] = None
+        self._runs: Dict[int, RunHandle] = {}
+        self._run_ids = itertools.count(1)
+
+    # lifecycle
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._loop, name="sumo-driver", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        self.cancel_run()
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def paused(self) -> bool:
+        return not self._resume.is_set()
+
+    def pause(self):
+        self._resume.clear()
+
+    def resume(self):
+        self._resume.set()
+
+    # commands
+    def submit(self, fn: Callable, *args, **kwargs) -> "asyncio.Future":
+        """Queue ``fn(*args, **kwargs)`` for the driver thread, awaitable from the event loop.
+
+        ``fn`` runs in the caller's context (the current trace, see utils.tracing).
+        """
+        self.start()
+        future = concurrent.futures.Future()
+        self._commands.put((contextvars.copy_context(), fn, args, kwargs, future))
+        return asyncio.wrap_future(future)
+
+    async def call(self, fn: Callable, *args, **kwargs):
+        return await self.submit(fn, *args, **kwargs)
+
+    async def step(self, steps: int = 1) -> int:
+        """Advance ``steps`` steps in one call to SUMO, none while paused.
+
+        Refused (RuntimeError) while a background run is stepping: its pacing,
+        progress and per-step hooks would see the extra steps as a jump.
+        """
+        return await self.call(self._step_n, steps)
+
+    def _step_n(self, steps: int) -> int:
+        run = self._run
+        if run is not None and run.status == "running":
+            raise RuntimeError(f"Run {run.run_id} is running, cancel it before stepping manually")
+        if self.paused or steps < 1:
+            return 0
+        if steps == 1:
+            self.manager.step()
+        else:
+            # one targetTime jump instead of a round trip per step
+            snapshot = self.manager.snapshot
+            self.manager.step(target_time=snapshot.time + steps * self.manager.delta_t)
+        return steps
+
+    # background runs
+    def start_run(self, steps: int, interval: float = 0.0) -> RunHandle:
+        """Step ``steps`` times on the driver thread, ``interval`` seconds apart"""
+        if self._run and self._run.status == "running":
+            raise RuntimeError(f"Run {self._run.run_id} is still running")
+        run = RunHandle(run_id=next(self._run_ids), steps=steps, interval=interval)
+        self._runs[run.run_id] = run
+        self._run = run
+        self.start()
+        return run
+
+    def start_fast_forward(
+        self,
+        until_time: Optional[float] = None,
+        steps: Optional[int] = None,
+        chunk_steps: int = 100,
+        hooks: Sequence[Callable[[SimulationSnapshot], None]] = ()
+    ) -> RunHandle:
+        """Advance to simulation time ``until_time`` (or by ``steps``) as fast as SUMO allows.
+
+        Each chunk of ``chunk_steps`` steps is one ``simulationStep(targetTime)``
+        call; progress, pause, cancel and queued commands are handled between
+        chunks and every hook gets the snapshot at the end of each chunk, so
+        ``chunk_steps`` is also the sampling period.
+        """
+        if self._run and self._run.status == "running":
+            raise RuntimeError(f"Run {self._run.run_id} is still running")
+        snapshot = self.manager.snapshot
+        if snapshot is None:
+            raise RuntimeError("Simulation not running")
+        if (until_time is None) == (steps is None):
+            raise ValueError("Give either until_time or steps")
+
+        dt = self.manager.delta_t
+        if until_time is None:
+            until_time = snapshot.time + steps * dt
+        if until_time <= snapshot.time:
+            raise ValueError(f"Target time {until_time} is not after the current time {snapshot.time}")
+
+        run = RunHandle(
+            run_id=next(self._run_ids),
+            steps=round((until_time - snapshot.time) / dt),
+            interval=0.0,
+            target_time=until_time,
+            chunk_steps=max(1, chunk_steps),
+            sim_time=snapshot.time,
+            hooks=list(hooks)
+        )
+        self._runs[run.run_id] = run
+        self._run = run
+        self.start()
+        return run
+
+    def get_run(self, run_id: int) -> Optional[RunHandle]:
+        return self._runs.get(run_id)
+
+    @property
+    def current_run(self) -> Optional[RunHandle]:
+        return self._run
+
+    def cancel_run(self):
+        run = self._run
+        if run and run.status == "running":
+            run.status = "cancelled"
+
+    def _loop(self):
+        if self.conn is not None:
+            bind_connection(self.conn)
+        next_step_at = 0.0
+        while not self._stopping.is_set():
+            run = self._run
+            active = run is not None and run.status == "running" and not self.paused
+
+            # serve pending commands first, wait for them until the next step is due
+            timeout = max(0.0, next_step_at - time.perf_counter()) if active else 0.05
+            try:
+                command = self._commands.get(timeout=timeout) if timeout else self._commands.get_nowait()
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                self._execute(*command)
+                continue
+
+            if not active:
+                continue
+
+            try:
+                if run.target_time is None:
+                    self.manager.step()
+                    run.executed += 1
+                else:
+                    self._fast_forward_chunk(run)
+            except Exception as e:
+                logger.error(f"Simulation run {run.run_id} failed: {str(e)}")
+                run.status, run.error = "failed", str(e)
+                run.finished_at = time.time()
+                continue
+
+            if run.executed >= run.steps:
+                run.status = "finished"
+                run.finished_at = time.time()
+            next_step_at = time.perf_counter() + run.interval
+
+    def _fast_forward_chunk(self, run: RunHandle):
+        dt = self.manager.delta_t
+        before = self.manager.snapshot.time
+        target = min(run.target_time, before + run.chunk_steps * dt)
+        snapshot = self.manager.step(target_time=target)
+        run.sim_time = snapshot.time
+        run.executed += round((snapshot.time - before) / dt)
+        for hook in run.hooks:
+            hook(snapshot)
+        if snapshot.time < target - dt / 2:
+            # SUMO stopped short of the target (scenario ended)
+            run.executed = run.steps
+
+    @staticmethod
+    def _execute(context: contextvars.Context, fn, args, kwargs, future: concurrent.futures.Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn, *args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+
+simulation_driver = SimulationDriver()
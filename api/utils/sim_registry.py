@@ -0,0 +1,260 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from sumolib.miscutils import getFreeSocketPort
+
+from .detector_logs import DetectorLogFollower
+from .logger import logger
+from .metrics_store import MetricsStore
+from .replay import ReplayConnection, ReplayFile, ReplayManager
+from .route_streamer import DemandStreamer
+from .sim_driver import SimulationDriver, simulation_driver
+from .sumo_backend import backend, sumo_cfg
+from .traci_cache import cached
+from .traci_subscriptions import SubscriptionManager, subscription_manager
+from .tracing import TraciCounter, tracer
+
+
+DEFAULT_SIM_ID = "default"
+
+
+@dataclass
+class SimulationInstance:
+    """One SUMO process with its own TraCI connection, snapshot and driver"""
+    sim_id: str
+    manager: SubscriptionManager
+    driver: SimulationDriver
+    port: Optional[int] = None
+    cfg_file: Optional[str] = None
+    proc: Any = None
+    started_at: Optional[float] = None
+    status_message: str = "Not started"
+    metrics: MetricsStore = field(default_factory=lambda: MetricsStore(sumo_cfg.get("metrics_retention", 3600)))
+    log_follower: Optional[asyncio.Task] = None
+    traci_counter: Optional[TraciCounter] = None  # installed while tracing is enabled
+
+    @property
+    def running(self) -> bool:
+        return self.proc is not None and self.manager.snapshot is not None
+
+    def to_dict(self) -> dict:
+        snapshot = self.manager.snapshot
+        run = self.driver.current_run
+        return {
+            "sim_id": self.sim_id,
+            "running": self.running,
+            "port": self.port,
+            "pid": self.proc.pid if self.proc else None,
+            "cfg_file": self.cfg_file,
+            "started_at": self.started_at,
+            "time": snapshot.time if snapshot else None,
+            "vehicles": snapshot.vehicle_count if snapshot else None,
+            "paused": self.driver.paused,
+            "run": run.to_dict() if run else None,
+            "message": self.status_message
+        }
+
+
+class SimulationRegistry:
+    """Simulation instances addressed by ``sim_id``.
+
+    The ``default`` instance wraps the module-level subscription manager and
+    driver on TraCI's default connection, so code that predates the registry
+    (the RL env, scripts) keeps talking to it. Every other instance gets its
+    own SUMO process on a free port and a TraCI connection labeled with its id.
+    """
+    def __init__(self):
+        self._instances: Dict[str, SimulationInstance] = {
+            DEFAULT_SIM_ID: SimulationInstance(
+                sim_id=DEFAULT_SIM_ID,
+                manager=subscription_manager,
+                driver=simulation_driver,
+                port=sumo_cfg['port']
+            )
+        }
+        self._starting: Set[str] = set()  # ids reserved by a start in progress
+        self._lock = asyncio.Lock()
+
+    def get(self, sim_id: str = DEFAULT_SIM_ID) -> SimulationInstance:
+        return self._instances[sim_id]
+
+    def list(self) -> List[SimulationInstance]:
+        return list(self._instances.values())
+
+    async def start(self, sim_id: str, cmd: List[str]) -> SimulationInstance:
+        """Launch ``cmd`` (a sumo command line without --remote-port) as ``sim_id``"""
+        async with self._lock:
+            instance = self._instances.get(sim_id)
+            if instance is not None and instance.running:
+                raise ValueError(f"Simulation '{sim_id}' is already running")
+            if sim_id in self._starting:
+                raise ValueError(f"Simulation '{sim_id}' is already starting")
+            # reserved until registered or failed, concurrent starts of the id are refused
+            self._starting.add(sim_id)
+            port = sumo_cfg['port'] if sim_id == DEFAULT_SIM_ID else getFreeSocketPort()
+
+        proc = instance = None
+        try:
+            cfg_file = cmd[cmd.index('-c') + 1]
+            demand = None
+            if sumo_cfg.get("stream_routes"):
+                # SUMO starts without the demand, vehicles are added ahead of their depart
+                demand = await asyncio.to_thread(
+                    DemandStreamer.for_cfg, cfg_file,
+                    window=sumo_cfg.get("stream_window", 300),
+                    lookahead=sumo_cfg.get("stream_lookahead", 60)
+                )
+                cmd = demand.sumo_cmd(cmd)
+
+            proc = await backend.start(cmd, port, label=sim_id)
+            raw_conn = backend.connection(sim_id)
+            # the manager steps through the cache too, so stepping invalidates it
+            conn = cached(raw_conn)
+
+            if sim_id == DEFAULT_SIM_ID:
+                instance = self._instances[DEFAULT_SIM_ID]
+            else:
+                manager = SubscriptionManager(conn=conn)
+                instance = SimulationInstance(
+                    sim_id=sim_id,
+                    manager=manager,
+                    driver=SimulationDriver(manager, conn=conn)
+                )
+            instance.port = port
+            instance.proc = proc
+            instance.cfg_file = cfg_file
+            instance.started_at = time.time()
+
+            instance.traci_counter = TraciCounter.install(raw_conn) if tracer.enabled else None
+            await instance.driver.call(instance.manager.subscribe_all)
+            if demand is not None:
+                await instance.driver.call(instance.manager.attach_demand, demand)
+            await instance.driver.call(instance.manager.attach_metrics, instance.metrics)
+            if sumo_cfg.get("detector_logs"):
+                await self._follow_detector_logs(instance)
+            instance.status_message = f"Simulation started on port {port} with PID {proc.pid}"
+            self._instances[sim_id] = instance
+            return instance
+        except Exception as e:
+            if proc is not None:
+                logger.warning(f"Starting simulation '{sim_id}' failed, stopping its SUMO process: {str(e)}")
+                await self._abandon(sim_id, instance, proc)
+            raise
+        finally:
+            self._starting.discard(sim_id)
+
+    async def _abandon(self, sim_id: str, instance: Optional[SimulationInstance], proc):
+        """Close the connection and terminate the process of a start that failed after launching SUMO"""
+        if instance is None:
+            try:
+                backend.connection(sim_id).close()
+            except Exception:  # no connection registered
+                pass
+        else:
+            if instance.log_follower is not None:
+                instance.log_follower.cancel()
+                instance.log_follower = None
+            try:
+                await instance.driver.call(self._close, instance)
+            except Exception as e:
+                logger.warning(f"Error closing simulation '{sim_id}': {str(e)}")
+            instance.proc = None
+            instance.traci_counter = None
+            instance.status_message = "Start failed"
+            if sim_id != DEFAULT_SIM_ID:
+                instance.driver.shutdown()
+        if getattr(proc, "returncode", None) is None:
+            try:
+                proc.terminate()
+            except ProcessLookupError:  # SUMO exited meanwhile
+                pass
+
+    @staticmethod
+    async def _follow_detector_logs(instance: SimulationInstance):
+        """Tail the detector output files of the instance's cfg into its metrics (``e1_log``/``e2_log``)"""
+        if instance.log_follower is not None:
+            instance.log_follower.cancel()
+            instance.log_follower = None
+        try:
+            follower = await asyncio.to_thread(DetectorLogFollower.for_cfg, instance.cfg_file, instance.metrics)
+        except Exception as e:
+            logger.warning(f"Not following detector logs of '{instance.sim_id}': {str(e)}")
+            return
+        if follower.paths:
+            instance.log_follower = asyncio.create_task(follower.run(sumo_cfg.get("detector_poll_interval", 1.0)))
+
+    async def start_replay(self, sim_id: str, directory: str) -> SimulationInstance:
+        """Serve the recording in ``directory`` as ``sim_id``, no SUMO process involved"""
+        if sim_id == DEFAULT_SIM_ID:
+            raise ValueError("The default simulation cannot be a replay")
+        async with self._lock:
+            instance = self._instances.get(sim_id)
+            if instance is not None and instance.running:
+                raise ValueError(f"Simulation '{sim_id}' is already running")
+            recording = await asyncio.to_thread(ReplayFile, directory)
+            manager = ReplayManager(recording)
+            instance = SimulationInstance(
+                sim_id=sim_id,
+                manager=manager,
+                # traci calls on the driver thread must not fall back to the default connection
+                driver=SimulationDriver(manager, conn=ReplayConnection(sim_id)),
+                cfg_file=recording.meta.get("cfg_file"),
+                proc=recording,
+                started_at=time.time()
+            )
+            await instance.driver.call(manager.subscribe_all)
+            self._instances[sim_id] = instance
+
+        await instance.driver.call(manager.attach_metrics, instance.metrics)
+        instance.status_message = f"Replaying {recording.directory.name}"
+        return instance
+
+    def install_counters(self):
+        """Count round trips and bytes of every running TraCI connection (tracing was enabled)"""
+        for instance in self._instances.values():
+            if instance.running and instance.traci_counter is None and not isinstance(instance.manager, ReplayManager):
+                try:
+                    instance.traci_counter = TraciCounter.install(backend.connection(instance.sim_id))
+                except Exception as e:  # no such connection (closed meanwhile)
+                    logger.warning(f"No TraCI counter for '{instance.sim_id}': {str(e)}")
+
+    async def start_many(self, count: int, cmd: List[str], prefix: str = "sim") -> List[SimulationInstance]:
+        """Start ``count`` instances side by side, ids ``<prefix><n>`` not yet in use"""
+        sim_ids, n = [], 1
+        while len(sim_ids) < count:
+            if f"{prefix}{n}" not in self._instances and f"{prefix}{n}" not in self._starting:
+                sim_ids.append(f"{prefix}{n}")
+            n += 1
+        return await asyncio.gather(*(self.start(sim_id, cmd) for sim_id in sim_ids))
+
+    async def stop(self, sim_id: str):
+        instance = self._instances[sim_id]
+        instance.driver.cancel_run()
+        if instance.log_follower is not None:
+            instance.log_follower.cancel()
+            instance.log_follower = None
+        try:
+            if instance.manager.snapshot is not None:
+                await instance.driver.call(self._close, instance)
+        except Exception as e:
+            logger.warning(f"Error closing simulation '{sim_id}': {str(e)}")
+
+        if instance.proc is not None:
+            if getattr(instance.proc, "returncode", None) is None:
+                instance.proc.terminate()
+            instance.proc = None
+        instance.status_message = "Simulation stopped"
+
+        if sim_id != DEFAULT_SIM_ID:
+            instance.driver.shutdown()
+            del self._instances[sim_id]
+
+    @staticmethod
+    def _close(instance: SimulationInstance):
+        instance.manager.conn.close()
+        instance.manager.reset()
+
+
+simulation_registry = SimulationRegistry()
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from .traci_cache import CachedConnection, cached
+
+import traci as traci_socket
+
+try:
+    import libsumo
+except ImportError:  # libsumo wheels are optional, the socket path always works
+    libsumo = None
+
+
+# Load config relative to this file's location
+sumo_cfg_path = Path(__file__).parent.parent / "sumo_config.json"
+sumo_cfg = json.loads(sumo_cfg_path.read_text())
+
+
+class InProcessHandle:
+    """Stands in for the SUMO subprocess when SUMO runs inside this process.
+
+    Routes keep ``app.state.sumo_pid`` and call ``.pid``/``.terminate()`` on it,
+    so the libsumo backend hands out one of these instead of a Process.
+    """
+    def __init__(self, backend: "LibsumoBackend"):
+        self._backend = backend
+        self.pid = os.getpid()
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return None if self._backend.is_loaded() else 0
+
+    def terminate(self):
+        self._backend.close()
+
+    kill = terminate
+
+
+class TraciSocketBackend:
+    """SUMO as a subprocess, driven over the TraCI TCP socket"""
+    name = "traci"
+    in_process = False
+    module = traci_socket
+
+    def is_loaded(self) -> bool:
+        return self.module.isLoaded()
+
+    async def start(self, cmd: List[str], port: int, retries: int = 3, label: str = "default") -> asyncio.subprocess.Process:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, '--remote-port', str(port),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        for _ in range(retries):
+            try:
+                # labeled instances must not steal the module-level current connection
+                self.module.init(port, label=label, doSwitch=(label == "default"))
+                return proc
+            except self.module.FatalTraCIError:
+                # a failure after connecting (getVersion) leaves the label registered
+                self._discard(label)
+                await asyncio.sleep(0.5)
+
+        try:
+            proc.terminate()
+        except ProcessLookupError:  # SUMO exited at startup
+            pass
+        raise ConnectionError("Failed to connect to SUMO")
+
+    def _discard(self, label: str):
+        """Forget the connection a failed init left under ``label``, so the next init can use it"""
+        try:
+            conn = self.module.getConnection(label)
+        except self.module.TraCIException:
+            return
+        try:
+            conn.close(wait=False)
+        except Exception:  # SUMO is gone, closing the socket fails before the label is dropped
+            pass
+        connections = self.module.connection._connections
+        for key in [key for key, value in connections.items() if value is conn]:
+            del connections[key]
+
+    def start_sync(self, cmd: List[str]):
+        """Blocking start for scripts, training and benchmarks"""
+        self.module.start(cmd)
+
+    def connection(self, label: str = "default"):
+        return self.module.getConnection(label)
+
+    def close(self):
+        if self.module.isLoaded():
+            self.module.close()
+
+
+class LibsumoBackend:
+    """SUMO loaded in-process through libsumo: no socket, no subprocess.
+
+    Every TraCI call becomes a plain function call. There is no GUI and only
+    one simulation per Python process.
+    """
+    name = "libsumo"
+    in_process = True
+
+    def __init__(self):
+        if libsumo is None:
+            raise ImportError("backend 'libsumo' selected but the libsumo module is not installed (pip install libsumo)")
+        self.module = libsumo
+
+    def is_loaded(self) -> bool:
+        return self.module.isLoaded()
+
+    async def start(self, cmd: List[str], port: int = None, retries: int = 3, label: str = "default") -> InProcessHandle:
+        if cmd[0].endswith('sumo-gui'):
+            raise ValueError("libsumo backend runs headless only, use the 'traci' backend for sumo-gui")
+        if label != "default":
+            raise ValueError("libsumo runs a single simulation per process, use the 'traci' backend for several instances")
+        self.start_sync(cmd)
+        return InProcessHandle(self)
+
+    def start_sync(self, cmd: List[str]):
+        self.module.start(cmd)
+
+    def connection(self, label: str = "default"):
+        return self.module
+
+    def close(self):
+        if self.module.isLoaded():
+            self.module.close()
+
+
+BACKENDS = {
+    TraciSocketBackend.name: TraciSocketBackend,
+    LibsumoBackend.name: LibsumoBackend
+}
+
+
+def get_backend(name: str = None):
+    """Backend by name, defaults to ``backend`` in sumo_config.json"""
+    name = name or sumo_cfg.get("backend", TraciSocketBackend.name)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SUMO backend '{name}', choose one of {list(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+backend = get_backend()
+
+
+_bound = threading.local()
+
+
+def bind_connection(conn):
+    """Route ``traci`` calls made on this thread to ``conn`` (a labeled connection), behind a step cache"""
+    _bound.conn = cached(conn) if conn is not None else None
+
+
+class ConnectionProxy:
+    """Drop-in for ``import traci``.
+
+    Resolves to the connection bound to the calling thread (each simulation
+    driver binds its own instance) and otherwise to the backend module, so the
+    traci package and libsumo, with their shared domains, constants and
+    exceptions, are used the same way by every service. Both sit behind a
+    CachedConnection: getters repeated within a step cost no round trip.
+    """
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        conn = getattr(_bound, "conn", None)
+        if conn is not None:
+            try:
+                return getattr(conn, name)
+            except AttributeError:
+                pass  # module level helpers (isLoaded, constants, exceptions)
+        return getattr(self._module, name)
+
+
+traci = ConnectionProxy(CachedConnection(backend.module))
@@ -0,0 +1,141 @@
+"""Step-scoped memoization of TraCI getters.
+
+Between two ``simulationStep`` calls SUMO's state only changes through our
+own commands, so a getter asked twice for the same object returns the same
+value. ``CachedConnection`` wraps a connection (or the traci/libsumo module)
+and answers repeated getters from a dict instead of a round trip:
+
+- ``get*`` results are kept per (domain, object, method, args) until the
+  next ``simulationStep``; subscription results are local already and are
+  not cached
+- ``subscribe*``/``unsubscribe*`` change no state and pass through
+- ``set*`` calls drop what was cached for their object (and the domain's
+  id lists)
+- any other domain command (``add``, ``remove``, ``moveTo``...) drops
+  the whole domain, and anything on ``simulation`` besides getters
+  (``loadState``, ``saveState``...) or ``load``/``close`` drops everything
+
+Cached values are shared between callers, treat them as read-only (e.g. the
+Logic objects of ``getAllProgramLogics``).
+"""
+from typing import Any, Callable, Dict
+
+
+DOMAINS = (
+    "busstop", "calibrator", "chargingstation", "edge", "gui", "inductionloop", "junction", "lane",
+    "lanearea", "meandata", "multientryexit", "overheadwire", "parkingarea", "person", "poi", "polygon",
+    "rerouter", "route", "routeprobe", "simulation", "trafficlight", "variablespeedsign", "vehicle",
+    "vehicletype"
+)
+
+# connection level calls after which nothing cached holds
+RESETS = ("simulationStep", "load", "close", "start", "init", "switch")
+
+_DOMAIN_WIDE = None  # object key of getters without an object (getIDList, getIDCount...)
+
+
+class CachedConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.hits = 0
+        self.misses = 0
+        # domain -> object id -> (method, args) -> value
+        self._cache: Dict[str, Dict[Any, Dict[tuple, Any]]] = {}
+        self._domains: Dict[str, CachedDomain] = {}
+
+    def invalidate(self, domain: str = None, obj=None):
+        """Forget everything, a domain, or one object of a domain"""
+        if domain is None:
+            self._cache.clear()
+            return
+        if obj is None:
+            self._cache.pop(domain, None)
+            return
+        objects = self._cache.get(domain)
+        if objects is not None:
+            objects.pop(obj, None)
+            objects.pop(_DOMAIN_WIDE, None)
+
+    def simulationStep(self, *args, **kwargs):
+        self._cache.clear()
+        return self.conn.simulationStep(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name in DOMAINS:
+            domain = self._domains.get(name)
+            if domain is None:
+                domain = self._domains[name] = CachedDomain(self, name, getattr(self.conn, name))
+            return domain
+        value = getattr(self.conn, name)
+        if name in RESETS:
+            def reset(*args, **kwargs):
+                self._cache.clear()
+                return value(*args, **kwargs)
+            return reset
+        return value
+
+
+class CachedDomain:
+    """One traci domain, getters memoized in the connection's cache"""
+    def __init__(self, owner: CachedConnection, name: str, domain):
+        self._owner = owner
+        self._name = name
+        self._domain = domain
+
+    def __getattr__(self, method):
+        fn = getattr(self._domain, method)
+        if not callable(fn):
+            return fn
+        if method.startswith("get") and "Subscription" not in method:
+            wrapper = self._getter(method, fn)
+        elif method.startswith(("get", "subscribe", "unsubscribe")):
+            wrapper = fn
+        elif method.startswith("set"):
+            wrapper = self._setter(fn)
+        else:
+            wrapper = self._command(fn)
+        # later lookups find the wrapper without going through __getattr__
+        setattr(self, method, wrapper)
+        return wrapper
+
+    def _getter(self, method: str, fn: Callable) -> Callable:
+        owner, name = self._owner, self._name
+
+        def getter(*args, **kwargs):
+            key = (method, args, tuple(sorted(kwargs.items()))) if kwargs else (method, args)
+            obj = args[0] if args else _DOMAIN_WIDE
+            try:
+                values = owner._cache.setdefault(name, {}).setdefault(obj, {})
+                if key in values:
+                    owner.hits += 1
+                    return values[key]
+            except TypeError:  # unhashable arguments, not cached
+                return fn(*args, **kwargs)
+            owner.misses += 1
+            value = values[key] = fn(*args, **kwargs)
+            return value
+        return getter
+
+    def _setter(self, fn: Callable) -> Callable:
+        owner, name = self._owner, self._name
+
+        def setter(*args, **kwargs):
+            if name == "simulation":
+                owner.invalidate()
+            else:
+                owner.invalidate(name, args[0] if args else None)
+            return fn(*args, **kwargs)
+        return setter
+
+    def _command(self, fn: Callable) -> Callable:
+        owner, name = self._owner, self._name
+
+        def command(*args, **kwargs):
+            owner.invalidate(None if name == "simulation" else name)
+            return fn(*args, **kwargs)
+        return command
+
+
+def cached(conn) -> CachedConnection:
+    """``conn`` behind a step cache, connections already wrapped are returned as they are"""
+    return conn if isinstance(conn, CachedConnection) else CachedConnection(conn)
@@ -1,19 +1,9 @@
 import asyncio
 import sys
 import os
-import subprocess
-import json
 from typing import Dict, List
-import traci
 
-from pathlib import Path
-
-# Get the directory of this file
-current_dir = Path(__file__).parent.parent
-
-# Load config relative to this file's location
-sumo_cfg_path = current_dir / "sumo_config.json"
-sumo_cfg = json.loads(sumo_cfg_path.read_text())
+from .sumo_backend import backend, sumo_cfg, traci
 
 
 from services.sensors_service import subscribe_e1_sensors, subscribe_e2_sensors
@@ -35,13 +25,37 @@ def is_traci_loaded():
     return traci.isLoaded()
 
 def simulationStep():
-    traci.simulationStep()
+    return subscription_manager.step()
 
 def set_simulation_time_step(step_length: float = 16.6): # en ms
     traci.simulation.setDeltaT(step_length)
 
 
 
+def build_sumo_cmd(
+    use_gui: bool = False,
+    step_length: float = 1.0,
+    autostart: bool = True,
+    gui_delay: int = 20,
+    cfg_file: str = None
+) -> List[str]:
+    # Base command
+    sumo_bin = 'sumo-gui' if use_gui else 'sumo'
+    cmd = [
+        sumo_bin,
+        '-c', cfg_file or sumo_cfg['cfg_file'],
+        '--step-length', str(step_length)
+    ]
+
+    # GUI-specific parameters
+    if use_gui:
+        if autostart:
+            cmd.append('--start')
+        cmd.extend(['--delay', str(gui_delay)])
+    return cmd
+
+
+
 async def initialize_traci(
     use_gui: bool = False,
     step_length: float = 1.0,
@@ -64,37 +78,13 @@ async def initialize_traci(
         print("SUMO is already running")
         return
 
-    # Base command
-    sumo_bin = 'sumo-gui' if use_gui else 'sumo'
-    cmd = [
-        sumo_bin,
-        '-c', sumo_cfg['cfg_file'],
-        '--remote-port', str(sumo_cfg['port']),
-        '--step-length', str(step_length)
-    ]
-
-    # GUI-specific parameters
-    if use_gui:
-        if autostart:
-            cmd.append('--start')
-        cmd.extend(['--delay', str(gui_delay)])
+    cmd = build_sumo_cmd(use_gui, step_length, autostart, gui_delay)
     
-    # Start process
-    #process = subprocess.Popen(cmd)
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT
-    )
-    #traci.init(sumo_cfg['port'])
-    for _ in range(3):
-        try:
-            traci.init(sumo_cfg['port'])
-            # Init subscriptions (traci)
-            subscription_manager.subscribe_all()
-            return proc
-        except traci.FatalTraCIError:
-            await asyncio.sleep(0.5)
+    # Start SUMO through the configured backend (socket subprocess or in-process libsumo)
+    proc = await backend.start(cmd, sumo_cfg['port'])
+    # Init subscriptions (traci)
+    subscription_manager.subscribe_all()
+    return proc
 
     # sensor_map = {
     #     'e1': _map_sensors(traci.inductionloop.getIDList(), 'E1'),
@@ -106,8 +96,6 @@ async def initialize_traci(
     # subscribe_e2_sensors(sensor_map['e2'])
     # subscribe_traffic_lights()
 
-    raise ConnectionError("Failed to connect to SUMO")
-
 
 
 def _map_sensors(sensor_ids: List[str], sensor_type: str) -> Dict[str, dict]:
@@ -135,6 +123,8 @@ def _map_sensors(sensor_ids: List[str], sensor_type: str) -> Dict[str, dict]:
 
 
 def try_reconnect_sumo():
+    if backend.in_process:
+        return traci.isLoaded()
     if not traci.isLoaded():
         # Attempt to reconnect to SUMO on the default port or another port used in your setup
         try:
@@ -151,6 +141,7 @@ def close_traci():
     if traci.isLoaded():
     #.getConnection("default")
         traci.close()
+    subscription_manager.reset()
 
 
 
@@ -1,6 +1,7 @@
-import traci
+from .sumo_backend import traci
 from sumo_rl.environment.traffic_signal import TrafficSignal
 from .traci_env import initialize_traci, close_traci, sumo_cfg
+from .traci_subscriptions import subscription_manager
 
 
 
@@ -25,7 +26,7 @@ def custom_reset(self):
 
 # lanes
 def get_len_lanes():
-    return len(traci.lane.getIDList())
+    return len(subscription_manager.network.lane_ids)
 
 #cuantos detectors hay en el escenario
 def get_len_detectors():
@@ -78,14 +79,7 @@ def get_queue_length():
 
 
 def get_lanes_by_street():
-    lanes_by_street = []
-    lanes = traci.lane.getIDList()
-    for lane in lanes:
-        street = lane.split('_')[0]  # Assuming street name is part of lane ID
-        if street not in lanes_by_street:
-            lanes_by_street[street] = []
-        lanes_by_street[street].append(lane)
-    return lanes_by_street
+    return subscription_manager.network.lanes_by_direction()
 
 
 def get_avg_speed_by_street():
@@ -140,9 +134,10 @@ def collect_metrics(env):
 
 
 def get_lane_density(lane_id):
-    lane_length = traci.lane.getLength(lane_id)
-    lane_vehicles = traci.lane.getLastStepVehicleNumber(lane_id)
+    snapshot = subscription_manager.snapshot
+    lane_length = snapshot.network.length(lane_id)
+    lane_vehicles = snapshot.lanes[lane_id]["vehicle_count"]
     return lane_vehicles / lane_length if lane_length > 0 else 0
 
 def get_lane_queue_length(lane_id):
-    return traci.lane.getLastStepHaltingNumber(lane_id)
\ No newline at end of file
+    return subscription_manager.snapshot.lanes[lane_id]["halting_number"]
\ No newline at end of file
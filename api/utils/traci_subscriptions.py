@@ -1,52 +1,379 @@
-from typing import Dict, List
-import traci
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from .logger import logger
+from .network_index import NetworkIndex
+from .sumo_backend import traci
+from .tracing import tracer
+from .vehicle_tracker import VehicleTracker
+import traci.constants as tc
+
+
+TLS_VARS = [
+    tc.TL_RED_YELLOW_GREEN_STATE,
+    tc.TL_PHASE_DURATION,
+    tc.TL_CURRENT_PHASE,
+    tc.TL_SPENT_DURATION,
+    tc.TL_NEXT_SWITCH
+]
+
+DETECTOR_VARS = [
+    tc.LAST_STEP_VEHICLE_NUMBER,
+    tc.LAST_STEP_OCCUPANCY,
+    tc.LAST_STEP_MEAN_SPEED
+]
+
+LANE_VARS = [
+    tc.LAST_STEP_VEHICLE_NUMBER,
+    tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+    tc.LAST_STEP_MEAN_SPEED,
+    tc.VAR_WAITING_TIME,
+    tc.LAST_STEP_VEHICLE_ID_LIST
+]
+
+# vehicles around the junction controlled by the "semaforos" TLS, one context
+# subscription on the junction itself (a TLS context is centered elsewhere)
+JUNCTION_ID = "main_interseccion"
+JUNCTION_RADIUS = 175.0  # meters, reaches the far end of the 128 m approach lanes
+
+JUNCTION_VEHICLE_VARS = [
+    tc.VAR_SPEED,
+    tc.VAR_WAITING_TIME,
+    tc.VAR_ACCUMULATED_WAITING_TIME,
+    tc.VAR_LANE_ID,
+    tc.VAR_LANEPOSITION
+]
+
+SIMULATION_VARS = [
+    tc.VAR_TIME,
+    tc.VAR_MIN_EXPECTED_VEHICLES,
+    tc.VAR_DEPARTED_VEHICLES_IDS,
+    tc.VAR_ARRIVED_VEHICLES_IDS
+]
+
+
+@dataclass(frozen=True)
+class SimulationSnapshot:
+    """State of one simulation step, built from subscription results.
+
+    Reading a snapshot never talks to SUMO: every service, endpoint, websocket
+    frame and the RL env share the same object until the next step.
+    """
+    step: int
+    time: float
+    vehicle_count: int = 0
+    min_expected: int = 0
+    departed: Tuple[str, ...] = ()
+    arrived: Tuple[str, ...] = ()
+    traffic_lights: Dict[str, dict] = field(default_factory=dict)
+    e1: Dict[str, dict] = field(default_factory=dict)
+    e2: Dict[str, dict] = field(default_factory=dict)
+    lanes: Dict[str, dict] = field(default_factory=dict)
+    junction_vehicles: Dict[str, dict] = field(default_factory=dict)
+    junction_lanes: Dict[str, dict] = field(default_factory=dict)
+    fleet: Dict[str, object] = field(default_factory=dict)  # VehicleTracker aggregates
+    network: Optional[NetworkIndex] = None  # shared, static for the connection
+
+
+def _detector_entry(results: dict) -> dict:
+    return {
+        "vehicle_count": results.get(tc.LAST_STEP_VEHICLE_NUMBER, 0),
+        "occupancy": results.get(tc.LAST_STEP_OCCUPANCY, 0.0),
+        "mean_speed": results.get(tc.LAST_STEP_MEAN_SPEED, 0.0)
+    }
+
+
+def _tls_entry(results: dict) -> dict:
+    return {
+        "red_yellow_green_state": results.get(tc.TL_RED_YELLOW_GREEN_STATE, "unknown"),
+        "phase_duration": results.get(tc.TL_PHASE_DURATION, 0.0),
+        "current_phase": results.get(tc.TL_CURRENT_PHASE, 0),
+        "spent_duration": results.get(tc.TL_SPENT_DURATION, 0.0),
+        "next_switch": results.get(tc.TL_NEXT_SWITCH, 0.0)
+    }
+
+
+def _lane_entry(results: dict) -> dict:
+    return {
+        "vehicle_count": results.get(tc.LAST_STEP_VEHICLE_NUMBER, 0),
+        "halting_number": results.get(tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 0),
+        "mean_speed": results.get(tc.LAST_STEP_MEAN_SPEED, 0.0),
+        "waiting_time": results.get(tc.VAR_WAITING_TIME, 0.0),
+        "vehicle_ids": results.get(tc.LAST_STEP_VEHICLE_ID_LIST, ())
+    }
+
+
+def _vehicle_entry(veh_id: str, results: dict) -> dict:
+    # same fields as schemas.models.VehicleData
+    return {
+        "id": veh_id,
+        "speed": results.get(tc.VAR_SPEED, 0.0),
+        "waiting_time": results.get(tc.VAR_WAITING_TIME, 0.0),
+        "accumulated_waiting_time": results.get(tc.VAR_ACCUMULATED_WAITING_TIME, 0.0),
+        "lane": results.get(tc.VAR_LANE_ID, ""),
+        "position": results.get(tc.VAR_LANEPOSITION, 0.0)
+    }
+
+
+# aggregate of a lane with no vehicles near the junction
+EMPTY_JUNCTION_LANE = {
+    "vehicle_count": 0,
+    "speed_sum": 0.0,
+    "waiting_time": 0.0,
+    "accumulated_waiting_time": 0.0
+}
+
+
+def _aggregate_by_lane(vehicles: Dict[str, dict]) -> Dict[str, dict]:
+    """Per-lane sums over the junction vehicles, lanes without vehicles are absent"""
+    lanes: Dict[str, dict] = {}
+    for vehicle in vehicles.values():
+        lane = lanes.get(vehicle["lane"])
+        if lane is None:
+            lane = lanes[vehicle["lane"]] = dict(EMPTY_JUNCTION_LANE)
+        lane["vehicle_count"] += 1
+        lane["speed_sum"] += vehicle["speed"]
+        lane["waiting_time"] += vehicle["waiting_time"]
+        lane["accumulated_waiting_time"] += vehicle["accumulated_waiting_time"]
+    return lanes
+
 
 class SubscriptionManager:
-    def __init__(self):
+    def __init__(self, conn=traci):
+        self.conn = conn
         self._subscribed = False
-        
+        self._step = 0
+        self._snapshot: Optional[SimulationSnapshot] = None
+        self._junction: Optional[str] = None
+        self._network: Optional[NetworkIndex] = None
+        self._vehicles: Optional[VehicleTracker] = None
+        self._demand = None  # DemandStreamer feeding vehicles ahead of their depart
+        self._metrics = None  # MetricsStore recording every stepped snapshot
+        self._recorder = None  # SnapshotRecorder writing every stepped snapshot to disk
+        self.delta_t = 1.0  # seconds per simulation step, read on subscribe
+
     def subscribe_all(self):
         """Initialize all TraCI subscriptions"""
         if self._subscribed:
             return
 
         self._subscribed = True
-            
+        conn = self.conn
+
+        # Static topology, the ids below come from it instead of new getIDList calls
+        if self._network is None:
+            self._network = NetworkIndex.build(conn)
+        network = self._network
+        self.delta_t = conn.simulation.getDeltaT()
+
         # Traffic Lights
-        for tls_id in traci.trafficlight.getIDList():
-            traci.trafficlight.subscribe(
-                tls_id,
-                [
-                    traci.constants.TL_RED_YELLOW_GREEN_STATE,
-                    traci.constants.TL_PHASE_DURATION,
-                    traci.constants.TL_CURRENT_PHASE,
-                    traci.constants.TL_NEXT_SWITCH
-                ]
+        for tls_id in network.tls_controlled:
+            conn.trafficlight.subscribe(tls_id, TLS_VARS)
+
+        # Vehicles near the controlled junction, replaces per-vehicle getter loops
+        if JUNCTION_ID in conn.junction.getIDList():
+            conn.junction.subscribeContext(
+                JUNCTION_ID, tc.CMD_GET_VEHICLE_VARIABLE, JUNCTION_RADIUS, JUNCTION_VEHICLE_VARS
             )
-        
+            self._junction = JUNCTION_ID
+
         # Induction Loops (E1)
-        for loop_id in traci.inductionloop.getIDList():
-            traci.inductionloop.subscribe(
-                loop_id,
-                [
-                    traci.constants.LAST_STEP_VEHICLE_NUMBER,
-                    traci.constants.LAST_STEP_OCCUPANCY,
-                    traci.constants.LAST_STEP_MEAN_SPEED
-                ]
-            )
-            
+        for loop_id in network.e1_ids:
+            conn.inductionloop.subscribe(loop_id, DETECTOR_VARS)
+
         # Lane Area Detectors (E2)
-        for area_id in traci.lanearea.getIDList():
-            traci.lanearea.subscribe(
-                area_id,
-                [
-                    traci.constants.LAST_STEP_VEHICLE_NUMBER,
-                    traci.constants.LAST_STEP_OCCUPANCY,
-                    traci.constants.LAST_STEP_MEAN_SPEED
-                ]
-            )
-            
-        
+        for area_id in network.e2_ids:
+            conn.lanearea.subscribe(area_id, DETECTOR_VARS)
+
+        # Lanes
+        for lane_id in network.lane_ids:
+            conn.lane.subscribe(lane_id, LANE_VARS)
+
+        # Simulation clock, departures/arrivals and running vehicle count
+        conn.simulation.subscribe(SIMULATION_VARS)
+        conn.vehicle.subscribe("", [tc.ID_COUNT])
+
+        # Every vehicle from its departure, the ones already running are subscribed now
+        self._vehicles = VehicleTracker(conn, network)
+        self._vehicles.track(conn.vehicle.getIDList())
+
+        self.refresh()
+
+    def reset(self):
+        """Forget subscriptions and the last snapshot (connection closed)"""
+        self._subscribed = False
+        self._step = 0
+        self._snapshot = None
+        self._junction = None
+        self._network = None
+        self._vehicles = None
+        self._demand = None
+        self._metrics = None
+        self.detach_recorder()
+
+    def resubscribe(self) -> SimulationSnapshot:
+        """Subscribe again after ``simulation.loadState``/``load``, which drop all subscriptions.
+
+        The network index is kept, the scenario's topology is unchanged.
+        """
+        self._subscribed = False
+        self.subscribe_all()
+        return self._snapshot
+
+    @property
+    def subscribed(self) -> bool:
+        return self._subscribed
+
+    @property
+    def network(self) -> Optional[NetworkIndex]:
+        return self._network
+
+    @property
+    def snapshot(self) -> Optional[SimulationSnapshot]:
+        return self._snapshot
+
+    @property
+    def vehicles(self) -> Optional[VehicleTracker]:
+        return self._vehicles
+
+    @property
+    def trips(self):
+        """TripLog of the vehicles that arrived since the subscriptions started"""
+        return self._vehicles.trips if self._vehicles is not None else None
+
+    def attach_demand(self, demand):
+        """Stream vehicles from ``demand`` (a DemandStreamer) into this connection"""
+        demand.reset()
+        self._demand = demand
+        demand.feed(self.conn, self._snapshot.time if self._snapshot else 0.)
+
+    @property
+    def demand(self):
+        return self._demand
+
+    def attach_metrics(self, metrics):
+        """Record every stepped snapshot into ``metrics`` (a MetricsStore)"""
+        metrics.clear()
+        self._metrics = metrics
+        if self._snapshot is not None:
+            metrics.record(self._snapshot)
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    def attach_recorder(self, recorder):
+        """Append every stepped snapshot to ``recorder`` (a SnapshotRecorder)"""
+        self.detach_recorder()
+        self._recorder = recorder
+        if self._snapshot is not None:
+            recorder.record(self._snapshot)
+
+    def detach_recorder(self):
+        """Stop recording and close the recording, returns the recorder (if any)"""
+        recorder, self._recorder = self._recorder, None
+        if recorder is not None:
+            recorder.close()
+        return recorder
+
+    @property
+    def recorder(self):
+        return self._recorder
+
+    def step(self, target_time: float = 0.) -> SimulationSnapshot:
+        """Advance SUMO and rebuild the snapshot from the new results.
+
+        ``target_time`` > 0 runs every step up to that simulation time in a
+        single ``simulationStep`` call.
+        """
+        if self._demand is not None:
+            with tracer.span("demand"):
+                self._demand.feed(self.conn, max(self._snapshot.time, target_time) if self._snapshot else target_time)
+        with tracer.span("simulationStep"):
+            self.conn.simulationStep(target_time)
+        # a targetTime jump runs several steps inside SUMO, count them all
+        if target_time > 0 and self._snapshot is not None:
+            self._step += max(1, round((target_time - self._snapshot.time) / self.delta_t))
+        else:
+            self._step += 1
+        with tracer.span("refresh"):
+            snapshot = self.refresh()
+        with tracer.span("record"):
+            if self._metrics is not None:
+                self._metrics.record(snapshot)
+            if self._recorder is not None:
+                self._recorder.record(snapshot)
+        return snapshot
+
+    def refresh(self) -> SimulationSnapshot:
+        """Build the snapshot from the results SUMO sent with the last step.
+
+        Subscription results arrive together with the simulationStep response,
+        so this is one bulk read per domain and no extra round trips.
+        """
+        conn = self.conn
+        sim = conn.simulation.getSubscriptionResults() or {}
+        sim_time = sim.get(tc.VAR_TIME, 0.0)
+        departed = tuple(sim.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()))
+        arrived = tuple(sim.get(tc.VAR_ARRIVED_VEHICLES_IDS, ()))
+        fleet = {}
+        if self._vehicles is not None:
+            logged = len(self._vehicles.trips)
+            self._vehicles.untrack(arrived, arrival=sim_time)
+            # the lists hold every departure and arrival of a targetTime jump: vehicles in both
+            # were never tracked, they departed in the jump's first step at the earliest
+            arrived_ids = set(arrived)
+            unseen = sum(1 for veh_id in departed if veh_id in arrived_ids)
+            if unseen:
+                first_step = self._snapshot.time + self.delta_t if self._snapshot is not None else sim_time
+                self._vehicles.log_untracked(unseen, min(first_step, sim_time), arrival=sim_time)
+            if len(self._vehicles.trips) - logged != len(arrived):
+                logger.warning(f"{len(arrived)} vehicles arrived at {sim_time} but "
+                               f"{len(self._vehicles.trips) - logged} trips were logged")
+            self._vehicles.track(veh_id for veh_id in departed if veh_id not in arrived_ids)
+        all_vehicles = conn.vehicle.getAllSubscriptionResults()
+        vehicles = all_vehicles.get("", {})
+        if self._vehicles is not None:
+            if vehicles.get(tc.ID_COUNT, 0) > len(self._vehicles):
+                # vehicles that never showed up as departed (a restored state, a tracker started mid-run)
+                self._vehicles.track(conn.vehicle.getIDList())
+                all_vehicles = conn.vehicle.getAllSubscriptionResults()
+            fleet = self._vehicles.update(all_vehicles, sim_time)
+        junction_vehicles = {}
+        if self._junction is not None:
+            junction_vehicles = {
+                veh_id: _vehicle_entry(veh_id, results)
+                for veh_id, results in (conn.junction.getContextSubscriptionResults(self._junction) or {}).items()
+            }
+
+        self._snapshot = SimulationSnapshot(
+            step=self._step,
+            time=sim_time,
+            vehicle_count=vehicles.get(tc.ID_COUNT, 0),
+            min_expected=sim.get(tc.VAR_MIN_EXPECTED_VEHICLES, 0),
+            departed=departed,
+            arrived=arrived,
+            traffic_lights={
+                tls_id: _tls_entry(results)
+                for tls_id, results in conn.trafficlight.getAllSubscriptionResults().items()
+            },
+            e1={
+                loop_id: _detector_entry(results)
+                for loop_id, results in conn.inductionloop.getAllSubscriptionResults().items()
+            },
+            e2={
+                area_id: _detector_entry(results)
+                for area_id, results in conn.lanearea.getAllSubscriptionResults().items()
+            },
+            lanes={
+                lane_id: _lane_entry(results)
+                for lane_id, results in conn.lane.getAllSubscriptionResults().items()
+            },
+            junction_vehicles=junction_vehicles,
+            junction_lanes=_aggregate_by_lane(junction_vehicles),
+            fleet=fleet,
+            network=self._network
+        )
+        return self._snapshot
 
 
-subscription_manager = SubscriptionManager()
\ No newline at end of file
+subscription_manager = SubscriptionManager()
@@ -0,0 +1,257 @@
+"""Lightweight tracing of the telemetry pipeline.
+
+A trace is one unit of work (a WebSocket frame, a ``/simulation/step``
+request, an env step) made of named spans. Every span also feeds a
+per-stage latency histogram, and when the trace has a ``TraciCounter`` the
+round trips and bytes exchanged with SUMO during the span are recorded.
+
+The current trace lives in a context variable; ``SimulationDriver.submit``
+runs callables in the caller's context, so spans opened on the driver thread
+(``simulationStep``, ``refresh``...) land in the trace of the request that
+queued them.
+
+Disabled (``tracing`` in sumo_config.json, or ``POST /debug/tracing``),
+``span`` and ``trace`` return a shared no-op context manager and the
+connection socket is left untouched.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+import numpy as np
+import traci.constants as tc
+
+from .sumo_backend import sumo_cfg
+
+
+# histogram bucket upper bounds in milliseconds, the last bucket is open
+BUCKETS_MS = np.round(np.geomspace(0.01, 10_000, 19), 4)
+
+_COMMANDS = {value: name[4:].lower() for name, value in vars(tc).items()
+             if name.startswith("CMD_") and isinstance(value, int)}
+
+_NULL = nullcontext()
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+
+class TraciCounter:
+    """Round trips, bytes and commands sent over one TraCI connection.
+
+    Installed by wrapping the connection's socket, so every call is counted
+    however it is made (domains, the module proxy, the env). libsumo has no
+    socket and nothing to count.
+    """
+    def __init__(self):
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.commands: Counter = Counter()
+
+    @property
+    def bytes(self) -> int:
+        return self.bytes_sent + self.bytes_received
+
+    @classmethod
+    def install(cls, conn) -> Optional["TraciCounter"]:
+        sock = getattr(conn, "_socket", None)
+        if sock is None:
+            return None
+        if isinstance(sock, _CountingSocket):
+            return sock.counter
+        counter = cls()
+        conn._socket = _CountingSocket(sock, counter)
+        return counter
+
+    def to_dict(self) -> dict:
+        return {
+            "round_trips": self.round_trips,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "commands": dict(self.commands.most_common())
+        }
+
+
+class _CountingSocket:
+    def __init__(self, sock, counter: TraciCounter):
+        self._sock = sock
+        self.counter = counter
+
+    def send(self, data: bytes, *args) -> int:
+        counter = self.counter
+        counter.round_trips += 1
+        counter.bytes_sent += len(data)
+        # message: total length (4), command length (1, or 0 and 4 more), command id
+        command = data[5] if data[4] else data[9]
+        counter.commands[_COMMANDS.get(command, hex(command))] += 1
+        return self._sock.send(data, *args)
+
+    def recv(self, size: int, *args) -> bytes:
+        data = self._sock.recv(size, *args)
+        self.counter.bytes_received += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class StageHistogram:
+    def __init__(self):
+        self.counts = np.zeros(len(BUCKETS_MS) + 1, dtype=np.int64)
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.round_trips = 0
+        self.bytes = 0
+
+    def add(self, ms: float, round_trips: int, nbytes: int):
+        self.counts[np.searchsorted(BUCKETS_MS, ms)] += 1
+        self.calls += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.round_trips += round_trips
+        self.bytes += nbytes
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q``-th percentile"""
+        rank = np.searchsorted(np.cumsum(self.counts), q / 100 * self.calls)
+        return float(BUCKETS_MS[rank]) if rank < len(BUCKETS_MS) else self.max_ms
+
+    def to_dict(self) -> dict:
+        calls = max(self.calls, 1)
+        return {
+            "calls": self.calls,
+            "mean_ms": round(self.total_ms / calls, 4),
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 4),
+            "round_trips": round(self.round_trips / calls, 2),
+            "bytes": round(self.bytes / calls, 1),
+            "counts": self.counts.tolist()
+        }
+
+
+class Trace:
+    __slots__ = ("name", "sim_id", "counter", "started_at", "duration_ms", "round_trips", "bytes", "spans",
+                 "_start", "_io")
+
+    def __init__(self, name: str, sim_id: Optional[str], counter: Optional[TraciCounter]):
+        self.name = name
+        self.sim_id = sim_id
+        self.counter = counter
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.round_trips = 0
+        self.bytes = 0
+        self.spans: List[tuple] = []  # (stage, start offset ms, duration ms, round trips, bytes)
+        self._start = time.perf_counter()
+        self._io = _io(counter)
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 4)
+        self.round_trips, self.bytes = _delta(self.counter, self._io)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "sim_id": self.sim_id,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "round_trips": self.round_trips,
+            "bytes": self.bytes,
+            "spans": [
+                {"stage": stage, "offset_ms": offset, "duration_ms": ms, "round_trips": rt, "bytes": b}
+                for stage, offset, ms, rt, b in self.spans
+            ]
+        }
+
+
+def _io(counter: Optional[TraciCounter]):
+    return (counter.round_trips, counter.bytes) if counter is not None else (0, 0)
+
+
+def _delta(counter: Optional[TraciCounter], io: tuple):
+    """Round trips and bytes since ``io`` was read"""
+    if counter is None:
+        return 0, 0
+    return counter.round_trips - io[0], counter.bytes - io[1]
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, keep: int = 200):
+        self.enabled = enabled
+        self._recent: deque = deque(maxlen=keep)
+        self._histograms: Dict[str, StageHistogram] = {}
+        self._lock = threading.Lock()
+
+    def trace(self, name: str, sim_id: Optional[str] = None, counter: Optional[TraciCounter] = None):
+        """Start a trace for the enclosed block, spans inside are part of it"""
+        if not self.enabled:
+            return _NULL
+        return self._trace(name, sim_id, counter)
+
+    @contextmanager
+    def _trace(self, name, sim_id, counter):
+        trace = Trace(name, sim_id, counter)
+        token = _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.reset(token)
+            trace.finish()
+            with self._lock:
+                self._recent.append(trace)
+            self._record(name, trace.duration_ms, trace.round_trips, trace.bytes)
+
+    def span(self, stage: str):
+        """Time the enclosed block as ``stage`` of the current trace (and its histogram)"""
+        if not self.enabled:
+            return _NULL
+        return self._span(stage)
+
+    @contextmanager
+    def _span(self, stage):
+        trace = _current.get()
+        counter = trace.counter if trace is not None else None
+        io = _io(counter)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            ms = round((end - start) * 1000, 4)
+            round_trips, nbytes = _delta(counter, io)
+            if trace is not None:
+                stage = f"{trace.name}.{stage}"
+                trace.spans.append((stage, round((start - trace._start) * 1000, 4), ms, round_trips, nbytes))
+            self._record(stage, ms, round_trips, nbytes)
+
+    def _record(self, stage: str, ms: float, round_trips: int, nbytes: int):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = StageHistogram()
+            histogram.add(ms, round_trips, nbytes)
+
+    def recent(self, limit: int = 50, name: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            traces = [t for t in self._recent if name is None or t.name == name]
+        return [t.to_dict() for t in traces[-limit:]]
+
+    def histograms(self) -> dict:
+        with self._lock:
+            return {
+                "buckets_ms": BUCKETS_MS.tolist(),
+                "stages": {stage: h.to_dict() for stage, h in sorted(self._histograms.items())}
+            }
+
+    def reset(self):
+        with self._lock:
+            self._recent.clear()
+            self._histograms.clear()
+
+
+tracer = Tracer(enabled=sumo_cfg.get("tracing", False), keep=sumo_cfg.get("tracing_keep", 200))
@@ -0,0 +1,81 @@
+"""Completed trips of a run, for comparing controllers.
+
+Each arrival appends one row of ``TRIP_FIELDS`` to a column-major float
+array that doubles when full; vehicle ids are not kept, so a run of any
+length costs 48 bytes per trip and no Python object per vehicle.
+
+- ``travel_time``: arrival - depart (seconds)
+- ``time_loss``: SUMO's time lost driving below the ideal speed
+- ``delay``: time spent halted (speed below ``HALTING_SPEED``)
+- ``stops``: times the vehicle came to a halt after having moved
+
+Trips that started and ended inside one targetTime jump have no time loss,
+delay or stops (NaN); those KPIs are summarized over the trips that have them.
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+
+TRIP_FIELDS = ("depart", "arrival", "travel_time", "time_loss", "delay", "stops")
+KPI_FIELDS = ("travel_time", "time_loss", "delay", "stops")
+PERCENTILES = (50, 90, 95)
+
+
+class TripLog:
+    def __init__(self, capacity: int = 1024):
+        self._data = np.zeros((len(TRIP_FIELDS), capacity), dtype=np.float64)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def append(self, depart: np.ndarray, arrival: float, time_loss: np.ndarray, delay: np.ndarray,
+               stops: np.ndarray):
+        """One trip per element of ``depart``, all arriving at ``arrival`` (the others may be scalars)"""
+        n = len(depart)
+        if n == 0:
+            return
+        while self.count + n > self._data.shape[1]:
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)], axis=1)
+        rows = slice(self.count, self.count + n)
+        data = self._data
+        data[0, rows] = depart
+        data[1, rows] = arrival
+        data[2, rows] = arrival - depart
+        data[3, rows] = time_loss
+        data[4, rows] = delay
+        data[5, rows] = stops
+        self.count += n
+
+    def column(self, name: str) -> np.ndarray:
+        return self._data[TRIP_FIELDS.index(name), :self.count]
+
+    def summary(self, start: Optional[float] = None, end: Optional[float] = None,
+                percentiles: Sequence[float] = PERCENTILES) -> Dict[str, object]:
+        """Mean, min, max, sum and percentiles of every KPI over trips arriving in [start, end]"""
+        arrival = self.column("arrival")
+        selected = np.ones(self.count, dtype=bool)
+        if start is not None:
+            selected &= arrival >= start
+        if end is not None:
+            selected &= arrival <= end
+        trips = int(selected.sum())
+        summary: Dict[str, object] = {"trips": trips}
+        for name in KPI_FIELDS:
+            values = self.column(name)[selected]
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                summary[name] = None
+                continue
+            summary[name] = {
+                "mean": float(values.mean()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "sum": float(values.sum()),
+                **{f"p{p:g}": float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+            }
+        return summary
@@ -0,0 +1,194 @@
+"""Variable subscriptions for every vehicle in the network.
+
+Vehicles are subscribed when they show up in the departed list and forgotten
+when they arrive (SUMO drops their subscription by itself), so all of their
+values come with the ``simulationStep`` response and are read with the one
+``vehicle.getAllSubscriptionResults`` call the SubscriptionManager already
+makes. Values live in arrays indexed by a slot per vehicle; freed slots are
+reused, and fleet-wide aggregates are a few numpy reductions per step.
+
+The slots also accumulate each vehicle's trip (depart, delay, stops, time
+loss), written to a TripLog on arrival.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import traci.constants as tc
+
+from .network_index import DIRECTIONS, NO_DIRECTION, NetworkIndex
+from .trip_stats import TripLog
+
+
+VEHICLE_VARS = [
+    tc.VAR_SPEED,
+    tc.VAR_WAITING_TIME,
+    tc.VAR_ACCUMULATED_WAITING_TIME,
+    tc.VAR_LANE_ID,
+    tc.VAR_TIMELOSS,
+    tc.VAR_DEPARTURE
+]
+
+HALTING_SPEED = 0.1  # m/s, the threshold of SUMO's halting numbers
+
+# slot arrays: dtype and value of a free slot
+SLOT_ARRAYS = {
+    "speed": (np.float64, 0.0),
+    "waiting_time": (np.float64, 0.0),
+    "accumulated_waiting_time": (np.float64, 0.0),
+    "direction": (np.int8, NO_DIRECTION),
+    "active": (bool, False),
+    # trip accumulators
+    "depart": (np.float64, 0.0),
+    "time_loss": (np.float64, 0.0),
+    "delay": (np.float64, 0.0),
+    "stops": (np.int32, 0),
+    "halted": (bool, True)  # a vehicle departing at 0 m/s has not stopped yet
+}
+
+EMPTY_FLEET = {
+    "vehicle_count": 0,
+    "mean_speed": 0.0,
+    "moving_mean_speed": 0.0,
+    "waiting_time": 0.0,
+    "accumulated_waiting_time": 0.0,
+    "halted": 0
+}
+
+
+class VehicleTracker:
+    """Slot arrays with the subscribed values of the running vehicles"""
+    speed: np.ndarray
+    waiting_time: np.ndarray
+    accumulated_waiting_time: np.ndarray
+    direction: np.ndarray
+    active: np.ndarray
+    depart: np.ndarray
+    time_loss: np.ndarray
+    delay: np.ndarray
+    stops: np.ndarray
+    halted: np.ndarray
+
+    def __init__(self, conn, network: NetworkIndex, capacity: int = 256, trips: Optional[TripLog] = None):
+        self.conn = conn
+        self.trips = trips if trips is not None else TripLog()
+        self._lane_direction = dict(zip(network.lane_ids, network.lane_direction.tolist()))
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))  # lowest slot first
+        self._time: Optional[float] = None
+        for name, (dtype, fill) in SLOT_ARRAYS.items():
+            setattr(self, name, np.full(capacity, fill, dtype=dtype))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, veh_id: str) -> bool:
+        return veh_id in self._slots
+
+    def _grow(self):
+        capacity = len(self.active)
+        for name, (dtype, fill) in SLOT_ARRAYS.items():
+            setattr(self, name, np.concatenate([getattr(self, name), np.full(capacity, fill, dtype=dtype)]))
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def track(self, veh_ids: Iterable[str]):
+        """Subscribe ``veh_ids``, vehicles already tracked are skipped"""
+        for veh_id in veh_ids:
+            if veh_id in self._slots:
+                continue
+            self.conn.vehicle.subscribe(veh_id, VEHICLE_VARS)
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slots[veh_id] = slot
+            self.active[slot] = True
+
+    def untrack(self, veh_ids: Iterable[str], arrival: Optional[float] = None):
+        """Free the slots of ``veh_ids``, their trips are logged when they arrived at ``arrival``"""
+        slots = [slot for slot in (self._slots.pop(veh_id, None) for veh_id in veh_ids) if slot is not None]
+        if not slots:
+            return
+        if arrival is not None:
+            self.trips.append(self.depart[slots], arrival, self.time_loss[slots], self.delay[slots], self.stops[slots])
+        for name, (_, fill) in SLOT_ARRAYS.items():
+            getattr(self, name)[slots] = fill
+        self._free.extend(slots)
+
+    def log_untracked(self, count: int, depart: float, arrival: float):
+        """Trips of ``count`` vehicles that departed and arrived between two updates.
+
+        They were never subscribed: time loss, delay and stops are unknown (NaN).
+        """
+        self.trips.append(np.full(count, depart), arrival, np.nan, np.nan, np.nan)
+
+    def update(self, results: Dict[str, dict], sim_time: float) -> dict:
+        """Store this step's subscription results and return the fleet aggregates"""
+        lane_direction = self._lane_direction
+        gone = []
+        for veh_id, slot in self._slots.items():
+            values = results.get(veh_id)
+            if values is None:
+                gone.append(veh_id)  # no results: left the network without being listed as arrived
+                continue
+            self.speed[slot] = values.get(tc.VAR_SPEED, 0.0)
+            self.waiting_time[slot] = values.get(tc.VAR_WAITING_TIME, 0.0)
+            self.accumulated_waiting_time[slot] = values.get(tc.VAR_ACCUMULATED_WAITING_TIME, 0.0)
+            self.direction[slot] = lane_direction.get(values.get(tc.VAR_LANE_ID, ""), NO_DIRECTION)
+            self.time_loss[slot] = values.get(tc.VAR_TIMELOSS, 0.0)
+            self.depart[slot] = values.get(tc.VAR_DEPARTURE, 0.0)
+
+        self.untrack(gone, arrival=sim_time)
+
+        # trips: halted time since the last update and new halts
+        dt = sim_time - self._time if self._time is not None and sim_time > self._time else 0.0
+        self._time = sim_time
+        halted = self.active & (self.speed < HALTING_SPEED)
+        self.delay[halted] += dt
+        self.stops[halted & ~self.halted] += 1
+        self.halted[self.active] = halted[self.active]
+        return self.aggregates()
+
+    def aggregates(self) -> dict:
+        """Fleet totals and means, split by the approach direction of the vehicles' lanes"""
+        active = self.active
+        count = int(active.sum())
+        if count == 0:
+            return {**EMPTY_FLEET, "directions": {d: {**EMPTY_FLEET} for d in DIRECTIONS}}
+
+        speed = self.speed[active]
+        waiting = self.waiting_time[active]
+        halted = speed < HALTING_SPEED
+        moving = speed[speed > 0]
+
+        direction = self.direction[active]
+        directed = direction != NO_DIRECTION
+        by_direction = direction[directed].astype(np.intp)
+
+        def per_direction(values):
+            return np.bincount(by_direction, weights=values[directed], minlength=len(DIRECTIONS))
+
+        dir_count = np.bincount(by_direction, minlength=len(DIRECTIONS))
+        dir_speed = per_direction(speed)
+        dir_moving = per_direction((speed > 0).astype(np.float64))
+        dir_waiting = per_direction(waiting)
+        dir_accumulated = per_direction(self.accumulated_waiting_time[active])
+        dir_halted = per_direction(halted.astype(np.float64))
+
+        return {
+            "vehicle_count": count,
+            "mean_speed": float(speed.mean()),
+            "moving_mean_speed": float(moving.mean()) if len(moving) else 0.0,
+            "waiting_time": float(waiting.sum()),
+            "accumulated_waiting_time": float(self.accumulated_waiting_time[active].sum()),
+            "halted": int(halted.sum()),
+            "directions": {
+                d: {
+                    "vehicle_count": int(dir_count[i]),
+                    "mean_speed": float(dir_speed[i] / dir_count[i]) if dir_count[i] else 0.0,
+                    "moving_mean_speed": float(dir_speed[i] / dir_moving[i]) if dir_moving[i] else 0.0,
+                    "waiting_time": float(dir_waiting[i]),
+                    "accumulated_waiting_time": float(dir_accumulated[i]),
+                    "halted": int(dir_halted[i])
+                }
+                for i, d in enumerate(DIRECTIONS)
+            }
+        }
@@ -0,0 +1,132 @@
+"""Binary frames for the simulation WebSocket (``format=binary``).
+
+The client first receives the id table as a JSON text message::
+
+    {"type": "ids", "version": 1, "table": n, "e1": [...], "e2": [...], "tls": [...]}
+
+then one binary message per step, little-endian::
+
+    header   <2sBBIdIHHHH  magic b"SF", version, flags, seq, time, vehicles,
+                            n_e1, n_e2, n_tls, table
+    body     float32 e1_occupancy[n_e1], e1_mean_speed[n_e1],
+             float32 e2_occupancy[n_e2], e2_mean_speed[n_e2],
+             uint16  e1_vehicle_count[n_e1], e2_vehicle_count[n_e2],
+             uint16  tls_phase[n_tls]
+
+Arrays follow the order of the id table. The header is never compressed,
+with FLAG_COMPRESSED the body is zlib-compressed. The table is sent again
+(with a new ``table`` number) whenever the network changes. Frames are read
+straight from the snapshot, no pydantic models or JSON on this path.
+"""
+import struct
+import zlib
+from dataclasses import dataclass
+from itertools import count
+from typing import Tuple
+
+import numpy as np
+
+from .traci_subscriptions import SimulationSnapshot
+
+
+VERSION = 1
+MAGIC = b"SF"
+HEADER = struct.Struct("<2sBBIdIHHHH")
+
+FLAG_PAUSED = 1
+FLAG_COMPRESSED = 2
+
+_table_numbers = count(1)
+_NO_READING = {"occupancy": 0.0, "mean_speed": 0.0, "vehicle_count": 0}
+
+
+@dataclass(frozen=True)
+class IdTable:
+    """Detector and traffic light ids in the order of the binary arrays"""
+    number: int
+    e1: Tuple[str, ...]
+    e2: Tuple[str, ...]
+    tls: Tuple[str, ...]
+
+    @classmethod
+    def for_snapshot(cls, snapshot: SimulationSnapshot) -> "IdTable":
+        network = snapshot.network
+        if network is not None:
+            e1, e2, tls = network.e1_ids, network.e2_ids, tuple(network.tls_controlled)
+        else:
+            e1, e2, tls = tuple(snapshot.e1), tuple(snapshot.e2), tuple(snapshot.traffic_lights)
+        return cls(next(_table_numbers) & 0xFFFF, e1, e2, tls)
+
+    def to_dict(self) -> dict:
+        return {
+            "type": "ids",
+            "version": VERSION,
+            "table": self.number,
+            "e1": list(self.e1),
+            "e2": list(self.e2),
+            "tls": list(self.tls)
+        }
+
+
+def _detector_arrays(readings: dict, ids: Tuple[str, ...]):
+    values = np.array(
+        [(r["occupancy"], r["mean_speed"], r["vehicle_count"])
+         for r in (readings.get(sensor_id, _NO_READING) for sensor_id in ids)],
+        dtype=np.float64
+    ).reshape(len(ids), 3)
+    return values[:, 0], values[:, 1], values[:, 2]
+
+
+def encode_binary(snapshot: SimulationSnapshot, table: IdTable, seq: int,
+                  paused: bool = False, compress: bool = False) -> bytes:
+    e1_occupancy, e1_speed, e1_count = _detector_arrays(snapshot.e1, table.e1)
+    e2_occupancy, e2_speed, e2_count = _detector_arrays(snapshot.e2, table.e2)
+    phases = [snapshot.traffic_lights[tls_id]["current_phase"] for tls_id in table.tls]
+
+    body = b"".join((
+        np.concatenate((e1_occupancy, e1_speed, e2_occupancy, e2_speed)).astype("<f4").tobytes(),
+        np.concatenate((e1_count, e2_count, phases)).astype("<u2").tobytes()
+    ))
+    flags = FLAG_PAUSED if paused else 0
+    if compress:
+        body = zlib.compress(body, 1)
+        flags |= FLAG_COMPRESSED
+
+    header = HEADER.pack(
+        MAGIC, VERSION, flags, seq & 0xFFFFFFFF, snapshot.time, snapshot.vehicle_count,
+        len(table.e1), len(table.e2), len(table.tls), table.number
+    )
+    return header + body
+
+
+def decode_binary(data: bytes, table: IdTable) -> dict:
+    """Inverse of ``encode_binary``, for scripts and debugging"""
+    magic, version, flags, seq, time, vehicles, n_e1, n_e2, n_tls, number = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} simulation frame")
+    if number != table.number:
+        raise ValueError(f"Frame uses id table {number}, got table {table.number}")
+    body = data[HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+
+    floats = np.frombuffer(body, dtype="<f4", count=2 * (n_e1 + n_e2))
+    ints = np.frombuffer(body, dtype="<u2", offset=floats.nbytes, count=n_e1 + n_e2 + n_tls)
+
+    def detectors(ids, occupancy, speed, vehicles_):
+        return {
+            sensor_id: {"vehicle_count": int(c), "occupancy": float(o), "mean_speed": float(s)}
+            for sensor_id, o, s, c in zip(ids, occupancy, speed, vehicles_)
+        }
+
+    return {
+        "seq": seq,
+        "time": time,
+        "paused": bool(flags & FLAG_PAUSED),
+        "vehicles": vehicles,
+        "e1_sensors": detectors(table.e1, floats[:n_e1], floats[n_e1:2 * n_e1], ints[:n_e1]),
+        "e2_sensors": detectors(
+            table.e2, floats[2 * n_e1:2 * n_e1 + n_e2], floats[2 * n_e1 + n_e2:], ints[n_e1:n_e1 + n_e2]
+        ),
+        "traffic_lights": {tls_id: int(p) for tls_id, p in zip(table.tls, ints[n_e1 + n_e2:])}
+    }
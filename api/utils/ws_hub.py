@@ -0,0 +1,378 @@
+"""WebSocket fan-out: one producer per simulation, any number of subscribers.
+
+The hub watches the simulation snapshot, builds a frame once per step and
+hands it to every subscriber. Each subscriber owns a bounded queue, a client
+that cannot keep up loses frames (``drop_oldest`` keeps the most recent
+``queue_size``, ``latest`` only the newest one) instead of holding back the
+producer and the other clients.
+
+Clients either get the full legacy frame or subscribe to topics and, with
+``delta``, receive only what changed since the last frame sent to them plus a
+keyframe every ``keyframe_every`` frames. A client that lost frames to its
+queue policy gets a keyframe next, so it never applies a delta to a base it
+does not have. ``binary`` clients get packed arrays
+read from the snapshot (see ws_binary). Encodings are cached on the frame,
+clients with the same subscription and base frame share one serialization.
+"""
+import asyncio
+import json
+from collections import deque
+from typing import Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Union
+
+from .logger import logger
+from .sim_registry import SimulationInstance, simulation_registry
+from .traci_subscriptions import SimulationSnapshot
+from .tracing import tracer
+from .ws_binary import IdTable, encode_binary
+
+
+POLICIES = ("drop_oldest", "latest")
+FORMATS = ("json", "binary")
+POLL_INTERVAL = 0.01  # seconds between snapshot checks
+IDLE_INTERVAL = 1.0  # seconds between "not running" frames
+
+# topic -> WebSocketResponse field
+TOPICS = {
+    "tls": "traffic_lights",
+    "lanes": "lanes",
+    "e1": "e1_sensors",
+    "e2": "e2_sensors",
+    "aggregates": "e2_aggregated",
+    "observation": "observation",
+    "vehicles": "vehicles"
+}
+META_FIELDS = ("timestamp", "message", "paused")
+
+FrameBuilder = Callable[[SimulationInstance, Optional[FrozenSet[str]]], Awaitable[dict]]
+
+_UNCHANGED = object()
+
+
+def encode_frame(frame: dict) -> str:
+    # same encoding as WebSocket.send_json
+    return json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+
+
+def diff(old, new):
+    """Changes turning ``old`` into ``new``.
+
+    Dicts are compared key by key (recursively), removed keys map to None,
+    any other value is sent whole when it differs.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = {}
+        for key, value in new.items():
+            if key not in old:
+                changes[key] = value
+                continue
+            change = diff(old[key], value)
+            if change is not _UNCHANGED:
+                changes[key] = change
+        for key in old.keys() - new.keys():
+            changes[key] = None
+        return changes if changes else _UNCHANGED
+    return _UNCHANGED if old == new else new
+
+
+def parse_topics(topics: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    """WebSocketResponse fields for ``topics``, None (full frame) when not given"""
+    if topics is None:
+        return None
+    if isinstance(topics, str):
+        topics = topics.split(",")
+    topics = [topic.strip() for topic in topics if topic.strip()]
+    unknown = [topic for topic in topics if topic not in TOPICS]
+    if unknown:
+        raise ValueError(f"Unknown topics {unknown}, expected some of {list(TOPICS)}")
+    return frozenset(TOPICS[topic] for topic in topics)
+
+
+class Frame:
+    """One produced step: field values, metadata and the encodings built so far"""
+    __slots__ = ("seq", "time", "data", "meta", "status", "snapshot", "table", "fields", "_encoded")
+
+    def __init__(self, seq: int, time: Optional[float], data: dict, meta: dict, status: bool = False,
+                 snapshot: Optional[SimulationSnapshot] = None, table: Optional[IdTable] = None,
+                 fields: Optional[FrozenSet[str]] = None):
+        self.seq = seq
+        self.time = time
+        self.data = data
+        self.meta = meta
+        self.status = status  # error/not running message, not a simulation step
+        self.snapshot = snapshot
+        self.table = table
+        self.fields = fields  # fields in data, None for the full frame
+        self._encoded: Dict[tuple, Union[str, bytes]] = {}
+
+    def encode_binary(self, compress: bool = False) -> bytes:
+        key = ("binary", compress)
+        data = self._encoded.get(key)
+        if data is None:
+            data = self._encoded[key] = encode_binary(
+                self.snapshot, self.table, self.seq, self.meta.get("paused", False), compress
+            )
+        return data
+
+    def encode(self, fields: Optional[FrozenSet[str]] = None, base: Optional["Frame"] = None) -> str:
+        """Full frame (``fields`` None), keyframe of ``fields`` or delta against ``base``"""
+        key = (fields, base.seq if base is not None else None)
+        text = self._encoded.get(key)
+        if text is not None:
+            return text
+
+        if self.status or fields is None:
+            payload = {**self.data, **self.meta}
+        elif base is None:
+            payload = {"type": "key", "seq": self.seq, "time": self.time, **self.meta}
+            payload.update((field, self.data.get(field)) for field in fields)
+        else:
+            payload = {"type": "delta", "seq": self.seq, "base": base.seq, "time": self.time, **self.meta}
+            for field in fields:
+                change = diff(base.data.get(field), self.data.get(field))
+                if change is not _UNCHANGED:
+                    payload[field] = change
+
+        text = self._encoded[key] = encode_frame(payload)
+        return text
+
+
+class Subscriber:
+    """Bounded frame queue of one client and what it subscribed to"""
+    def __init__(self, queue_size: int = 8, policy: str = "drop_oldest",
+                 topics: Optional[Iterable[str]] = None, delta: bool = False, keyframe_every: int = 30,
+                 format: str = "json", compress: bool = False):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {POLICIES}")
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format '{format}', expected one of {FORMATS}")
+        self.policy = policy
+        self.queue_size = 1 if policy == "latest" else max(1, queue_size)
+        self.format = format
+        self.compress = compress
+        # binary frames come from the snapshot, no JSON fields needed
+        self.fields = frozenset() if format == "binary" else parse_topics(topics)
+        self.delta = delta
+        self.keyframe_every = max(1, keyframe_every)
+        self._frames: deque = deque(maxlen=self.queue_size)
+        self._ready = asyncio.Event()
+        self._base: Optional[Frame] = None  # last frame sent, deltas are relative to it
+        self._table: Optional[IdTable] = None  # id table the client has
+        self._outbox: deque = deque()  # encoded messages not sent yet
+        self._since_keyframe = 0  # frames sent since the last keyframe, the keyframe included
+        self.sent = 0
+        self.dropped = 0
+        self.bytes_sent = 0
+
+    def subscribe(self, topics: Optional[Iterable[str]] = None, delta: Optional[bool] = None):
+        """Change topics and/or delta mode, the next frame is a keyframe"""
+        if topics is not None and self.format == "json":
+            self.fields = parse_topics(topics)
+        if delta is not None:
+            self.delta = delta
+        self.resync()
+
+    def resync(self):
+        self._base = None
+        self._table = None
+
+    def put(self, frame: Frame):
+        if len(self._frames) == self.queue_size:
+            self.dropped += 1  # deque drops the oldest frame
+            self._base = None  # the client misses a step: rebase on a keyframe
+        self._frames.append(frame)
+        self._ready.set()
+
+    def _encode(self, frame: Frame) -> List[Union[str, bytes]]:
+        if frame.status:
+            self._base = None
+            return [frame.encode()]
+        if self.format == "binary":
+            messages = []
+            if frame.table is not self._table:
+                messages.append(encode_frame(frame.table.to_dict()))
+                self._table = frame.table
+            messages.append(frame.encode_binary(self.compress))
+            return messages
+        if self.fields is None:
+            return [frame.encode()]
+
+        base = self._base
+        if (not self.delta or base is None or self._since_keyframe >= self.keyframe_every
+                or not self.fields <= base.data.keys()):
+            base = None
+            self._since_keyframe = 1
+        else:
+            self._since_keyframe += 1
+        self._base = frame
+        return [frame.encode(self.fields, base)]
+
+    async def ready(self):
+        """Wait until a message is available"""
+        if not self._outbox:
+            while not self._frames:
+                self._ready.clear()
+                await self._ready.wait()
+
+    async def get(self) -> Union[str, bytes]:
+        """Next message, text (JSON) or bytes (binary frame)"""
+        await self.ready()
+        if not self._outbox:
+            with tracer.span("encode"):
+                self._outbox.extend(self._encode(self._frames.popleft()))
+        message = self._outbox.popleft()
+        self.sent += 1
+        self.bytes_sent += len(message)
+        return message
+
+    def to_dict(self) -> dict:
+        return {
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "topics": sorted(self.fields) if self.fields is not None else None,
+            "delta": self.delta,
+            "format": self.format,
+            "compress": self.compress,
+            "queued": len(self._frames),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "bytes_sent": self.bytes_sent
+        }
+
+
+class BroadcastHub:
+    """Builds one frame per simulation step of ``sim_id`` for all its subscribers.
+
+    The producer task runs while there is at least one subscriber and only
+    builds the fields some subscriber asked for.
+    """
+    def __init__(self, sim_id: str, build_frame: FrameBuilder):
+        self.sim_id = sim_id
+        self.build_frame = build_frame
+        self.subscribers: Set[Subscriber] = set()
+        self.frames = 0
+        self._table: Optional[IdTable] = None
+        self._table_network = None
+        self._last: Optional[Frame] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, queue_size: int = 8, policy: str = "drop_oldest", **kwargs) -> Subscriber:
+        subscriber = Subscriber(queue_size, policy, **kwargs)
+        self.subscribers.add(subscriber)
+        last = self._last
+        if last is not None and (
+            last.fields is None or (subscriber.fields is not None and subscriber.fields <= last.fields)
+        ):
+            # start from the current step instead of waiting for the next one
+            subscriber.put(last)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._produce())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._last = None
+
+    @property
+    def fields(self) -> Optional[FrozenSet[str]]:
+        """Fields needed by the current subscribers, None when one wants the full frame"""
+        fields = frozenset()
+        for subscriber in self.subscribers:
+            if subscriber.fields is None:
+                return None
+            fields |= subscriber.fields
+        return fields
+
+    def _table_for(self, snapshot: SimulationSnapshot) -> IdTable:
+        # a new network (restarted simulation) gets a new table
+        if self._table is None or snapshot.network is not self._table_network:
+            self._table = IdTable.for_snapshot(snapshot)
+            self._table_network = snapshot.network
+        return self._table
+
+    def publish(self, frame: dict, time: Optional[float] = None, status: bool = False,
+                snapshot: Optional[SimulationSnapshot] = None, fields: Optional[FrozenSet[str]] = None):
+        meta = {key: frame.pop(key) for key in META_FIELDS if key in frame}
+        self.frames += 1
+        table = self._table_for(snapshot) if snapshot is not None else None
+        entry = Frame(self.frames, time, frame, meta, status, snapshot, table, fields)
+        self._last = entry
+        for subscriber in self.subscribers:
+            subscriber.put(entry)
+
+    async def _produce(self):
+        last_time = None
+        paused_sent = False
+        while self.subscribers:
+            try:
+                sim = simulation_registry.get(self.sim_id)
+            except KeyError:
+                sim = None
+            if sim is None or not sim.proc or sim.manager.snapshot is None:
+                self.publish({"error": "Simulation not running", "sim_id": self.sim_id}, status=True)
+                last_time, paused_sent = None, False
+                await asyncio.sleep(IDLE_INTERVAL)
+                continue
+
+            try:
+                if sim.driver.paused:
+                    # paused status once, then wait until resumed
+                    if not paused_sent:
+                        snapshot, fields = sim.manager.snapshot, self.fields
+                        frame = await self.build_frame(sim, fields)
+                        frame.update({"paused": True, "message": "Simulation paused"})
+                        self.publish(frame, snapshot.time, snapshot=snapshot, fields=fields)
+                        paused_sent = True
+                    await asyncio.sleep(0.1)
+                    continue
+                paused_sent = False
+
+                snapshot = sim.manager.snapshot
+                current_time = snapshot.time
+                if current_time != last_time:
+                    with tracer.trace("ws_frame", self.sim_id, sim.traci_counter):
+                        fields = self.fields
+                        with tracer.span("build"):
+                            frame = await self.build_frame(sim, fields)
+                        frame["paused"] = False
+                        with tracer.span("publish"):
+                            self.publish(frame, current_time, snapshot=snapshot, fields=fields)
+                    last_time = current_time
+            except Exception as e:
+                # keep serving, the simulation may be restarted
+                logger.error(f"WebSocket hub '{self.sim_id}' frame error: {str(e)}")
+                self.publish({"error": str(e), "sim_id": self.sim_id}, status=True)
+                await asyncio.sleep(IDLE_INTERVAL)
+                continue
+
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def to_dict(self) -> dict:
+        fields = self.fields
+        return {
+            "sim_id": self.sim_id,
+            "running": self._task is not None and not self._task.done(),
+            "frames": self.frames,
+            "fields": sorted(fields) if fields is not None else None,
+            "subscribers": [subscriber.to_dict() for subscriber in self.subscribers]
+        }
+
+
+class HubRegistry:
+    """One BroadcastHub per simulation id, created on first subscription"""
+    def __init__(self):
+        self._hubs: Dict[str, BroadcastHub] = {}
+
+    def get(self, sim_id: str, build_frame: FrameBuilder) -> BroadcastHub:
+        hub = self._hubs.get(sim_id)
+        if hub is None:
+            hub = self._hubs[sim_id] = BroadcastHub(sim_id, build_frame)
+        return hub
+
+    def list(self):
+        return list(self._hubs.values())
+
+
+broadcast_hubs = HubRegistry()
@@ -0,0 +1,64 @@
+"""Step throughput of the TraCI socket backend vs in-process libsumo.
+
+Usage (from the repo root):
+    python -m benchmarks.backend_throughput --steps 2000
+    python -m benchmarks.backend_throughput --backends libsumo --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.utils.sumo_backend import BACKENDS, get_backend
+from api.utils.traci_subscriptions import SubscriptionManager
+
+
+def run_backend(name: str, cfg_file: str, steps: int) -> dict:
+    backend = get_backend(name)
+    backend.start_sync(["sumo", "-c", cfg_file, "--no-step-log", "true", "--no-warnings", "true",
+                        "--verbose", "false", "--duration-log.statistics", "false"])
+    try:
+        manager = SubscriptionManager(conn=backend.module)
+        manager.subscribe_all()
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            snapshot = manager.step()
+        elapsed = time.perf_counter() - start
+    finally:
+        backend.close()
+
+    return {
+        "backend": name,
+        "steps": steps,
+        "seconds": round(elapsed, 4),
+        "steps_per_sec": round(steps / elapsed, 1),
+        "sim_time": snapshot.time,
+        "vehicles": snapshot.vehicle_count
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cfg", default="escenario/osm2.sumocfg", help="sumocfg to run")
+    parser.add_argument("--steps", type=int, default=1000, help="simulation steps per backend")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.backends:
+        result = run_backend(name, args.cfg, args.steps)
+        results.append(result)
+        print(f"{name:>8}: {result['steps_per_sec']:>9} steps/s  ({result['steps']} steps in {result['seconds']} s)")
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""Scripted stand-in for a TraCI connection, for benchmarks without SUMO.
+
+``FakeTraci`` exposes the part of the TraCI API the SubscriptionManager,
+the services and the RL env use, over the lanes, detectors and traffic
+lights of a scenario's NetworkModel. Traffic is scripted: vehicles depart
+on the signalized approach lanes at a fixed rate, move or queue at random
+(seeded) and arrive after a random number of steps. Subscription results
+are rebuilt as dicts on every step, as traci does when it parses the
+step response, so the manager and everything downstream do the work they
+do against SUMO, minus the socket and the simulation itself.
+
+``CountingTraci`` wraps any connection (fake or real) and counts the calls
+that cost a round trip to SUMO.
+"""
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+import traci.constants as tc
+from traci._trafficlight import Logic, Phase
+
+from api.utils.net_model import NetworkModel, load_scenario
+from api.utils.traci_subscriptions import JUNCTION_ID
+
+
+# answered from the results traci already holds, no round trip
+LOCAL_CALLS = frozenset({
+    "getSubscriptionResults", "getAllSubscriptionResults",
+    "getContextSubscriptionResults", "getAllContextSubscriptionResults"
+})
+
+
+class _Domain:
+    """Subscriptions of one TraCI domain, results come from ``FakeTraci``"""
+    def __init__(self, sim: "FakeTraci", name: str, ids: List[str]):
+        self._sim = sim
+        self._name = name
+        self._ids = ids
+        self._subscribed: Dict[str, list] = {}
+        self._context: Dict[str, list] = {}
+
+    def getIDList(self):
+        return tuple(self._ids)
+
+    def getIDCount(self):
+        return len(self._ids)
+
+    def subscribe(self, obj_id, var_ids=()):
+        self._subscribed[obj_id] = list(var_ids)
+
+    def subscribeContext(self, obj_id, domain, dist, var_ids=()):
+        self._context[obj_id] = list(var_ids)
+
+    def unsubscribe(self, obj_id):
+        self._subscribed.pop(obj_id, None)
+
+    def getSubscriptionResults(self, obj_id=None):
+        return self.getAllSubscriptionResults().get(obj_id, {})
+
+    def getAllSubscriptionResults(self):
+        return self._sim.results(self._name, self._subscribed)
+
+    def getContextSubscriptionResults(self, obj_id):
+        if obj_id not in self._context:
+            return {}
+        return self._sim.context_results(self._context[obj_id])
+
+
+class _Simulation(_Domain):
+    def subscribe(self, var_ids=()):
+        self._subscribed[""] = list(var_ids)
+
+    def getSubscriptionResults(self, obj_id=None):
+        return self.getAllSubscriptionResults().get("", {})
+
+    def getDeltaT(self):
+        return self._sim.delta_t
+
+    def getTime(self):
+        return self._sim.time
+
+    def getMinExpectedNumber(self):
+        return len(self._sim.vehicles)
+
+
+class _Lane(_Domain):
+    def getLength(self, lane_id):
+        return float(self._sim.network.lane_length[self._sim.lane_index[lane_id]])
+
+    def getLastStepVehicleNumber(self, lane_id):
+        return int(self._sim.lane_counts()[self._sim.lane_index[lane_id]])
+
+    def getLastStepHaltingNumber(self, lane_id):
+        return int(self._sim.lane_halting()[self._sim.lane_index[lane_id]])
+
+
+class _Detector(_Domain):
+    def __init__(self, sim, name, ids, lanes):
+        super().__init__(sim, name, ids)
+        self._lanes = dict(zip(ids, lanes))
+
+    def getLaneID(self, det_id):
+        return self._lanes[det_id]
+
+
+class _TrafficLight(_Domain):
+    def getControlledLanes(self, tls_id):
+        return tuple(self._sim.controlled[tls_id])
+
+    def getControlledLinks(self, tls_id):
+        return [[link] for link in self._sim.links[tls_id]]
+
+    def setPhase(self, tls_id, index):
+        self._sim.tls_phase[tls_id] = index
+        self._sim.tls_spent[tls_id] = 0.0
+
+    def setRedYellowGreenState(self, tls_id, state):
+        # SUMO switches to a one-phase "online" program that holds the state
+        self._sim.tls_override[tls_id] = state
+        self._sim.tls_spent[tls_id] = 0.0
+
+    def setProgram(self, tls_id, program_id):
+        self._sim.tls_override.pop(tls_id, None)
+
+    def getProgram(self, tls_id):
+        return "online" if tls_id in self._sim.tls_override else "0"
+
+    def setPhaseDuration(self, tls_id, duration):
+        self._sim.tls_duration[tls_id] = duration
+
+    def getPhase(self, tls_id):
+        return self._sim.tls_phase[tls_id]
+
+    def getPhaseDuration(self, tls_id):
+        return self._sim.tls_duration[tls_id]
+
+    def getAllProgramLogics(self, tls_id):
+        phases = [Phase(self._sim.tls_duration[tls_id], state) for state in self._sim.tls_states[tls_id]]
+        return [Logic("0", 0, self._sim.tls_phase[tls_id], phases)]
+
+
+class _Vehicle(_Domain):
+    def getIDList(self):
+        return tuple(self._sim.vehicles)
+
+    def getIDCount(self):
+        return len(self._sim.vehicles)
+
+    def getDeparture(self, veh_id):
+        return self._sim.vehicles[veh_id][3]
+
+
+class FakeTraci:
+    """TraCI-like connection over the network of ``cfg_file`` with scripted traffic"""
+    def __init__(self, cfg_file: str, seed: int = 0, depart_rate: float = 0.5, mean_trip_steps: int = 120,
+                 delta_t: float = 1.0):
+        _, self.network = load_scenario(cfg_file)
+        network: NetworkModel = self.network
+        self.rng = np.random.default_rng(seed)
+        self.depart_rate = depart_rate
+        self.mean_trip_steps = mean_trip_steps
+        self.delta_t = delta_t
+        self.time = 0.0
+        self._step = 0
+        self._cache: Dict[tuple, dict] = {}
+
+        lane_ids = network.lane_ids.tolist()
+        self.lane_index = network.lane_index
+        self.controlled: Dict[str, List[str]] = {}
+        self.links: Dict[str, List[tuple]] = {}  # (from, to, via) per link index
+        for t, tls_id in enumerate(network.tls_ids.tolist()):
+            links = np.flatnonzero(network.link_tls == t)
+            links = links[np.argsort(network.link_index[links])]
+            self.controlled[tls_id] = [lane_ids[i] for i in network.link_from_lane[links]]
+            self.links[tls_id] = [
+                (lane_ids[f], lane_ids[t], lane_ids[v] if v >= 0 else "")
+                for f, t, v in zip(network.link_from_lane[links], network.link_to_lane[links], network.link_via_lane[links])
+            ]
+        self.approach = sorted({self.lane_index[lane] for lanes in self.controlled.values() for lane in lanes})
+        self.tls_phase = {tls_id: 0 for tls_id in self.controlled}
+        self.tls_spent = {tls_id: 0.0 for tls_id in self.controlled}
+        self.tls_duration = {tls_id: 30.0 for tls_id in self.controlled}
+        self.tls_override: Dict[str, str] = {}  # state set with setRedYellowGreenState
+        self.tls_states = {
+            tls_id: network.phase_state[network.phase_tls == t].tolist() or ["r"]
+            for t, tls_id in enumerate(network.tls_ids.tolist())
+        }
+
+        # veh_id -> [lane index, position, speed, depart, waiting, accumulated waiting, steps left, time loss]
+        self.vehicles: Dict[str, list] = {}
+        self.departed: List[str] = []
+        self.arrived: List[str] = []
+        self._next_id = 0
+
+        self.simulation = _Simulation(self, "simulation", [])
+        self.vehicle = _Vehicle(self, "vehicle", [])
+        self.lane = _Lane(self, "lane", lane_ids)
+        self.inductionloop = _Detector(self, "inductionloop", network.e1_ids.tolist(),
+                                       [lane_ids[i] for i in network.e1_lane])
+        self.lanearea = _Detector(self, "lanearea", network.e2_ids.tolist(),
+                                  [lane_ids[i] for i in network.e2_lane])
+        self.trafficlight = _TrafficLight(self, "trafficlight", list(self.controlled))
+        self.junction = _Domain(self, "junction", [j for j in network.junction_ids.tolist() if j == JUNCTION_ID])
+        self.constants = tc
+
+    # connection
+    def isLoaded(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+    def simulationStep(self, step: float = 0.):
+        steps = max(1, round((step - self.time) / self.delta_t)) if step > 0 else 1
+        self.departed, self.arrived = [], []
+        for _ in range(steps):
+            self._advance()
+        self._cache.clear()
+
+    def _advance(self):
+        rng = self.rng
+        self._step += 1
+        self.time = self._step * self.delta_t
+        for veh_id in [v for v, state in self.vehicles.items() if state[6] <= 0]:
+            del self.vehicles[veh_id]
+            self.arrived.append(veh_id)
+        for _ in range(rng.poisson(self.depart_rate)):
+            veh_id = f"veh{self._next_id}"
+            self._next_id += 1
+            lane = self.approach[rng.integers(len(self.approach))] if self.approach else 0
+            steps = max(1, int(rng.exponential(self.mean_trip_steps)))
+            self.vehicles[veh_id] = [lane, 0.0, 0.0, self.time, 0.0, 0.0, steps, 0.0]
+            self.departed.append(veh_id)
+        for state in self.vehicles.values():
+            halted = rng.random() < 0.3
+            state[2] = 0.0 if halted else float(rng.uniform(2.0, 13.9))
+            state[1] += state[2] * self.delta_t
+            state[4] = state[4] + self.delta_t if halted else 0.0
+            state[5] += self.delta_t if halted else 0.0
+            state[7] += self.delta_t * (1 - state[2] / 13.9)
+            state[6] -= 1
+        for tls_id in self.tls_spent:
+            self.tls_spent[tls_id] += self.delta_t
+            if tls_id not in self.tls_override and self.tls_spent[tls_id] >= self.tls_duration[tls_id]:
+                self.tls_phase[tls_id] = (self.tls_phase[tls_id] + 1) % len(self.tls_states[tls_id])
+                self.tls_spent[tls_id] = 0.0
+
+    # per-step aggregates
+    def _memo(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    def _lane_column(self, column: int, where=None) -> np.ndarray:
+        lanes = np.fromiter((s[0] for s in self.vehicles.values()), dtype=np.int64, count=len(self.vehicles))
+        weights = np.fromiter((s[column] for s in self.vehicles.values()), dtype=np.float64, count=len(self.vehicles))
+        if where is not None:
+            weights = where(weights)
+        return np.bincount(lanes, weights=weights, minlength=len(self.lane_index))
+
+    def lane_counts(self) -> np.ndarray:
+        return self._memo("count", lambda: self._lane_column(2, lambda s: np.ones_like(s)))
+
+    def lane_halting(self) -> np.ndarray:
+        return self._memo("halting", lambda: self._lane_column(2, lambda s: (s < 0.1).astype(np.float64)))
+
+    def _lane_values(self, var: int, lane: int):
+        count = self.lane_counts()[lane]
+        if var == tc.LAST_STEP_VEHICLE_NUMBER:
+            return int(count)
+        if var == tc.LAST_STEP_VEHICLE_HALTING_NUMBER:
+            return int(self.lane_halting()[lane])
+        if var == tc.LAST_STEP_MEAN_SPEED:
+            speeds = self._memo("speed", lambda: self._lane_column(2))
+            return float(speeds[lane] / count) if count else 13.9
+        if var == tc.LAST_STEP_OCCUPANCY:
+            return float(min(100.0, 7.5 * count / max(self.network.lane_length[lane], 1.0) * 100))
+        if var == tc.VAR_WAITING_TIME:
+            return float(self._memo("waiting", lambda: self._lane_column(4))[lane])
+        if var == tc.LAST_STEP_VEHICLE_ID_LIST:
+            by_lane = self._memo("ids", self._ids_by_lane)
+            return tuple(by_lane.get(lane, ()))
+        return 0
+
+    def _ids_by_lane(self) -> Dict[int, List[str]]:
+        by_lane: Dict[int, List[str]] = {}
+        for veh_id, state in self.vehicles.items():
+            by_lane.setdefault(state[0], []).append(veh_id)
+        return by_lane
+
+    def _vehicle_values(self, veh_id: str, var: int):
+        state = self.vehicles[veh_id]
+        return {
+            tc.VAR_SPEED: state[2],
+            tc.VAR_WAITING_TIME: state[4],
+            tc.VAR_ACCUMULATED_WAITING_TIME: state[5],
+            tc.VAR_LANE_ID: self.network.lane_ids[state[0]],
+            tc.VAR_LANEPOSITION: state[1],
+            tc.VAR_TIMELOSS: state[7],
+            tc.VAR_DEPARTURE: state[3]
+        }.get(var, 0.0)
+
+    def _tls_values(self, tls_id: str, var: int):
+        states = self.tls_states[tls_id]
+        return {
+            tc.TL_RED_YELLOW_GREEN_STATE: self.tls_override.get(tls_id) or states[self.tls_phase[tls_id] % len(states)],
+            tc.TL_PHASE_DURATION: self.tls_duration[tls_id],
+            tc.TL_CURRENT_PHASE: self.tls_phase[tls_id],
+            tc.TL_SPENT_DURATION: self.tls_spent[tls_id],
+            tc.TL_NEXT_SWITCH: self.time + self.tls_duration[tls_id] - self.tls_spent[tls_id]
+        }.get(var, 0)
+
+    def _simulation_values(self, var: int):
+        return {
+            tc.VAR_TIME: self.time,
+            tc.VAR_MIN_EXPECTED_VEHICLES: len(self.vehicles),
+            tc.VAR_DEPARTED_VEHICLES_IDS: tuple(self.departed),
+            tc.VAR_ARRIVED_VEHICLES_IDS: tuple(self.arrived)
+        }.get(var, 0)
+
+    def results(self, domain: str, subscribed: Dict[str, list]) -> Dict[str, dict]:
+        """``{object id: {var: value}}`` of this step for the subscribed objects"""
+        def build():
+            lane_index = self.lane_index
+            results = {}
+            for obj_id, var_ids in subscribed.items():
+                if domain == "simulation":
+                    results[obj_id] = {var: self._simulation_values(var) for var in var_ids}
+                elif domain == "vehicle":
+                    if obj_id == "":
+                        results[obj_id] = {tc.ID_COUNT: len(self.vehicles)}
+                    elif obj_id in self.vehicles:
+                        results[obj_id] = {var: self._vehicle_values(obj_id, var) for var in var_ids}
+                elif domain == "lane":
+                    results[obj_id] = {var: self._lane_values(var, lane_index[obj_id]) for var in var_ids}
+                elif domain in ("inductionloop", "lanearea"):
+                    lane = lane_index[getattr(self, domain).getLaneID(obj_id)]
+                    results[obj_id] = {var: self._lane_values(var, lane) for var in var_ids}
+                elif domain == "trafficlight":
+                    results[obj_id] = {var: self._tls_values(obj_id, var) for var in var_ids}
+            return results
+        # vehicle subscriptions change between steps, never serve those from the cache
+        if domain == "vehicle":
+            return build()
+        return self._memo(("results", domain), build)
+
+    def context_results(self, var_ids: list) -> Dict[str, dict]:
+        approach = set(self.approach)
+        return self._memo(("context",), lambda: {
+            veh_id: {var: self._vehicle_values(veh_id, var) for var in var_ids}
+            for veh_id, state in self.vehicles.items() if state[0] in approach
+        })
+
+
+class _CountingDomain:
+    def __init__(self, domain, name: str, counts: Counter):
+        self._domain = domain
+        self._name = name
+        self._counts = counts
+
+    def __getattr__(self, attr):
+        value = getattr(self._domain, attr)
+        if not callable(value) or attr in LOCAL_CALLS or attr.startswith("_"):
+            return value
+        key = f"{self._name}.{attr}"
+        counts = self._counts
+
+        def call(*args, **kwargs):
+            counts[key] += 1
+            return value(*args, **kwargs)
+        return call
+
+
+class CountingTraci:
+    """Counts the calls to ``conn`` that go to SUMO (``counts``, ``total``)"""
+    DOMAINS = ("simulation", "vehicle", "lane", "inductionloop", "lanearea", "trafficlight", "junction",
+               "edge", "person", "route", "poi", "polygon")
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.counts: Counter = Counter()
+        for name in self.DOMAINS:
+            if hasattr(conn, name):
+                setattr(self, name, _CountingDomain(getattr(conn, name), name, self.counts))
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+    def simulationStep(self, step: float = 0.):
+        self.counts["simulationStep"] += 1
+        return self._conn.simulationStep(step)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def reset(self):
+        self.counts.clear()
+
+
+def counted(conn, fn, *args, **kwargs):
+    """``fn(*args)`` and the number of round trips it made through ``conn`` (a CountingTraci)"""
+    before = conn.total
+    result = fn(*args, **kwargs)
+    return result, conn.total - before
@@ -0,0 +1,234 @@
+"""Latency of the step -> snapshot -> frame / observation pipeline.
+
+Times ``SubscriptionManager.step``, the WebSocket frame build
+(``_build_websocket_response`` and its JSON encoding),
+``TrafficControlEnv.get_observation``/``step`` and every snapshot service
+getter, and counts the TraCI round trips each of them makes. Runs against
+the scripted ``FakeTraci`` (no SUMO needed, isolates our own overhead) and
+a headless SUMO on the same scenario.
+
+Usage (from the repo root):
+    python -m benchmarks.pipeline_latency --steps 500
+    python -m benchmarks.pipeline_latency --targets fake --json results.json
+    python -m benchmarks.pipeline_latency --json new.json --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.routes.simulation import _build_websocket_response
+from api.services import lane_service, metrics_service, sensors_service, traffic_light_service
+import api.services.vehicle_service as veh_service
+from api.utils.sim_registry import SimulationInstance
+from api.utils.sumo_backend import bind_connection, get_backend
+from api.utils.traci_subscriptions import subscription_manager
+from api.utils.ws_hub import encode_frame
+from benchmarks.fake_traci import CountingTraci, FakeTraci
+from model.environment import TrafficControlEnv
+
+
+TARGETS = ("fake", "sumo")
+FORMAT_VERSION = 1
+
+SERVICES: Dict[str, Callable] = {
+    "traffic_lights": traffic_light_service.get_traffic_lights_data,
+    "lanes_by_street": lane_service.get_lanes_by_street,
+    "lane_details": lane_service.get_detailed_lane_data,
+    "directional_metrics": lane_service.get_detailed_directional_metrics,
+    "avg_speed_by_street": lane_service.get_avg_speed_by_street,
+    "e1_sensors": sensors_service.get_e1_sensors_data,
+    "e2_sensors": sensors_service.get_e2_sensors_data,
+    "e2_aggregated": sensors_service.aggregate_e2_sensor_data_per_edge,
+    "vehicle_count": veh_service.get_vehicle_count,
+    "junction_vehicles": veh_service.get_junction_vehicles,
+    "fleet_metrics": veh_service.get_fleet_metrics,
+    "collect_metrics": metrics_service.collect_metrics
+}
+
+
+class Timer:
+    """Per-call latencies and round trips of one measured operation"""
+    def __init__(self, conn: CountingTraci):
+        self.conn = conn
+        self.seconds: List[float] = []
+        self.round_trips: List[int] = []
+
+    def __call__(self, fn: Callable, *args):
+        before = self.conn.total
+        start = time.perf_counter()
+        result = fn(*args)
+        self.seconds.append(time.perf_counter() - start)
+        self.round_trips.append(self.conn.total - before)
+        return result
+
+    def stats(self) -> dict:
+        ms = np.array(self.seconds) * 1000
+        return {
+            "calls": len(ms),
+            "mean_ms": round(float(ms.mean()), 4),
+            "p50_ms": round(float(np.percentile(ms, 50)), 4),
+            "p99_ms": round(float(np.percentile(ms, 99)), 4),
+            "max_ms": round(float(ms.max()), 4),
+            "round_trips": round(float(np.mean(self.round_trips)), 2)
+        }
+
+
+def _run_coroutine(coro):
+    """Result of a coroutine that never suspends, without an event loop's overhead"""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("coroutine suspended, run it on an event loop")
+
+
+def _open(target: str, cfg_file: str, seed: int):
+    if target == "fake":
+        return FakeTraci(cfg_file, seed=seed), None
+    backend = get_backend("traci")
+    backend.start_sync(["sumo", "-c", cfg_file, "--seed", str(seed), "--no-step-log", "true",
+                        "--no-warnings", "true", "--verbose", "false", "--duration-log.statistics", "false"])
+    return backend.module, backend
+
+
+def run_target(target: str, cfg_file: str, steps: int, warmup: int, seed: int) -> dict:
+    conn, backend = _open(target, cfg_file, seed)
+    counting = CountingTraci(conn)
+    # the module-level manager, the services and the env all resolve traci to this thread's connection
+    bind_connection(counting)
+    try:
+        manager = subscription_manager
+        manager.reset()
+        manager.subscribe_all()
+        for _ in range(warmup):
+            manager.step()
+
+        app = SimpleNamespace(state=SimpleNamespace(status_message="", training_mode=False, rl_env=None))
+        sim = SimulationInstance(sim_id="benchmark", manager=manager, driver=None)
+        step, frame_build, frame_encode = Timer(counting), Timer(counting), Timer(counting)
+        services = {name: Timer(counting) for name in SERVICES}
+        frame_bytes = []
+
+        start = time.perf_counter()
+        for _ in range(steps):
+            snapshot = step(manager.step)
+            frame = frame_build(lambda: _run_coroutine(_build_websocket_response(app, sim)))
+            frame_bytes.append(len(frame_encode(encode_frame, frame)))
+            for name, fn in SERVICES.items():
+                services[name](fn, snapshot)
+        loop_seconds = time.perf_counter() - start
+
+        env = TrafficControlEnv(sumo_cfg=cfg_file)
+        observation, env_step = Timer(counting), Timer(counting)
+        rng = np.random.default_rng(seed)
+        for _ in range(steps):
+            env_step(env.step, int(rng.integers(env.action_space.n)))
+            observation(env.get_observation)
+
+        snapshot = manager.snapshot
+        step_stats = step.stats()
+        return {
+            "target": target,
+            "steps": steps,
+            "warmup": warmup,
+            "sim_time": snapshot.time,
+            "vehicles": snapshot.vehicle_count,
+            "steps_per_sec": round(steps / sum(step.seconds), 1),
+            "loop_seconds": round(loop_seconds, 4),
+            "step": step_stats,
+            "frame_build": frame_build.stats(),
+            "frame_encode": frame_encode.stats(),
+            "frame_bytes": int(np.mean(frame_bytes)),
+            "observation": observation.stats(),
+            "env_step": env_step.stats(),
+            "services": {name: timer.stats() for name, timer in services.items()},
+            "round_trip_calls": dict(counting.counts.most_common(10))
+        }
+    finally:
+        bind_connection(None)
+        subscription_manager.reset()
+        if backend is not None:
+            backend.close()
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline: dict):
+    """Print p50 changes against a previous run's JSON"""
+    previous = {r["target"]: r for r in baseline.get("results", [])}
+    for result in results:
+        old = previous.get(result["target"])
+        if old is None:
+            continue
+        print(f"\n{result['target']} vs baseline {baseline.get('commit')}:")
+        rows = [(key, result[key], old.get(key)) for key in ("step", "frame_build", "frame_encode",
+                                                             "observation", "env_step")]
+        rows += [(f"services.{name}", stats, old.get("services", {}).get(name))
+                 for name, stats in result["services"].items()]
+        for name, new, before in rows:
+            if before is None:
+                continue
+            change = (new["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+            print(f"  {name:<32} p50 {before['p50_ms']:>9.4f} -> {new['p50_ms']:>9.4f} ms  ({change:+.1f}%)"
+                  f"  round trips {before['round_trips']} -> {new['round_trips']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cfg", default="escenario/osm2.sumocfg", help="sumocfg to run")
+    parser.add_argument("--steps", type=int, default=500, help="measured steps per phase")
+    parser.add_argument("--warmup", type=int, default=100, help="steps before measuring (fills the network)")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=TARGETS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = []
+    for target in args.targets:
+        result = run_target(target, args.cfg, args.steps, args.warmup, args.seed)
+        results.append(result)
+        print(f"{target:>5}: {result['steps_per_sec']:>9} steps/s  "
+              f"step p50 {result['step']['p50_ms']} ms ({result['step']['round_trips']} round trips)  "
+              f"frame p50/p99 {result['frame_build']['p50_ms']}/{result['frame_build']['p99_ms']} ms "
+              f"({result['frame_build']['round_trips']} round trips, {result['frame_bytes']} B)  "
+              f"observation p50 {result['observation']['p50_ms']} ms  "
+              f"env step p50 {result['env_step']['p50_ms']} ms")
+
+    report = {
+        "benchmark": "pipeline_latency",
+        "format": FORMAT_VERSION,
+        "commit": _commit(),
+        "created_at": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cfg": args.cfg,
+        "results": results
+    }
+    if args.baseline:
+        with open(args.baseline) as fp:
+            compare(results, json.load(fp))
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
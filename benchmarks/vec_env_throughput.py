@@ -0,0 +1,66 @@
+"""Env steps/sec of the vectorized TrafficControlEnv as the worker count grows.
+
+Usage (from the repo root):
+    python -m benchmarks.vec_env_throughput --workers 1 2 4 8 --steps 500
+    python -m benchmarks.vec_env_throughput --json results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.vec_env import make_vec_env
+
+
+def run_workers(n_envs: int, cfg_file: str, steps: int, seed: int) -> dict:
+    start = time.perf_counter()
+    vec_env = make_vec_env(n_envs, sumo_cfg=cfg_file, seed=seed)
+    try:
+        vec_env.reset()
+        startup = time.perf_counter() - start
+
+        actions = [vec_env.action_space.sample() for _ in range(n_envs)]
+        start = time.perf_counter()
+        for _ in range(steps):
+            vec_env.step(actions)
+        elapsed = time.perf_counter() - start
+    finally:
+        vec_env.close()
+
+    return {
+        "workers": n_envs,
+        "steps": steps,
+        "env_steps": steps * n_envs,
+        "startup_seconds": round(startup, 4),
+        "seconds": round(elapsed, 4),
+        "env_steps_per_sec": round(steps * n_envs / elapsed, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cfg", default="escenario/osm2.sumocfg", help="sumocfg each worker runs")
+    parser.add_argument("--steps", type=int, default=500, help="vectorized steps per worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for n_envs in sorted(set(args.workers)):
+        result = run_workers(n_envs, args.cfg, args.steps, args.seed)
+        results.append(result)
+        speedup = result["env_steps_per_sec"] / results[0]["env_steps_per_sec"]
+        print(f"{n_envs:>3} workers: {result['env_steps_per_sec']:>9} env steps/s  "
+              f"(x{speedup:.2f}, startup {result['startup_seconds']} s)")
+
+    if args.json:
+        with open(args.json, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,4 +29,13 @@ class RTPlotCallback(BaseCallback):
         plt.title('Training Progress')
         plt.legend()
         plt.show(block=False)
-        plt.pause(0.001)  # Pause to allow for real-time plot updates
\ No newline at end of file
+        plt.pause(0.001)  # Pause to allow for real-time plot updates
+
+
+class RewardComponentsCallback(BaseCallback):
+    """Logs the mean of every reward component the env reports in ``info["reward_components"]``"""
+    def _on_step(self) -> bool:
+        for info in self.locals.get("infos", ()):
+            for name, value in info.get("reward_components", {}).items():
+                self.logger.record_mean(f"reward/{name}", value)
+        return True
@@ -1,11 +1,17 @@
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import traci
-from .rewards import reward_minimize_waiting_time, reward_minimize_queue_length, reward_maximize_speed, reward_composite
+from api.utils.checkpoints import CheckpointPool
+from api.utils.sumo_backend import backend, traci
+from api.utils.traci_subscriptions import subscription_manager
+from api.utils.tracing import TraciCounter, tracer
+from .observation import ObservationBuilder
+from .rewards import LEGACY_REWARDS, RewardEngine
 
 
 class TrafficControlEnv(gym.Env):
+    DEFAULT_CHECKPOINT = "start"
+
     lanes_by_street = {
             "E": ["E_0", "E_1", "E_2"],
             "N": ["N_0", "N_1", "N_2"],
@@ -13,7 +19,10 @@ class TrafficControlEnv(gym.Env):
             "W": ["W_0", "W_1", "W_2"]
         }
     
-    def __init__(self, sumo_cfg="escenario/osm2.sumocfg", reward_fn = reward_minimize_waiting_time):
+    def __init__(self, sumo_cfg="escenario/osm2.sumocfg", reward_fn="waiting_time",
+                 seed=None, port=None, sumo_binary="sumo", warmup_steps=0, curriculum=False,
+                 checkpoint_dir=None, normalize=True, frame_stack=1, decision_interval=1.0,
+                 yellow_time=0.0, all_red_time=0.0, min_green=0.0):
         super(TrafficControlEnv, self).__init__()
         
         self.phases = [
@@ -25,43 +34,74 @@ class TrafficControlEnv(gym.Env):
             "W"
         ]
 
-        self.reward_function = reward_fn
+        # reward_fn: a RewardEngine preset name, {component: weight}, or a callable taking get_observation()'s dict
+        if callable(reward_fn) and reward_fn in LEGACY_REWARDS:
+            reward_fn = LEGACY_REWARDS[reward_fn]
+        self._reward_function = reward_fn if callable(reward_fn) else None
         self.sumo_cfg = sumo_cfg
-        
+        self.sumo_seed = seed
+        self.sumo_binary = sumo_binary
 
+        # timing of a decision (simulated seconds): each step() advances decision_interval with as few
+        # simulationStep calls as possible; a phase switch first shows yellow_time of yellow and
+        # all_red_time of red, and is refused while the current phase has run for less than min_green
+        if decision_interval < yellow_time + all_red_time:
+            raise ValueError("decision_interval must fit the yellow and all-red transition")
+        self.decision_interval = decision_interval
+        self.yellow_time = yellow_time
+        self.all_red_time = all_red_time
+        self.min_green = min_green
+        self._pending_phase = None  # switch requested by apply_action, run by step()
 
         # let traci not fail
-        if not traci.isLoaded():
-            traci.start(["sumo", "-c", self.sumo_cfg])
+        # an env that starts SUMO itself (vectorized workers, scripts) also closes it,
+        # one attached to the API's running simulation leaves it alone
+        self.owns_simulation = not traci.isLoaded()
+        if self.owns_simulation:
+            traci.start([self.sumo_binary] + self.sumo_args(), port=port)
+        subscription_manager.subscribe_all()
+        self._counter = None  # TraciCounter, see _traci_counter
+
+        # episode starts: reset() restores a saved state instead of relaunching SUMO.
+        # The default checkpoint is captured on the first reset after warmup_steps steps,
+        # more can be added with env.checkpoints.capture(name) and are sampled with curriculum
+        self.warmup_steps = warmup_steps
+        self.curriculum = curriculum
+        self.checkpoints = CheckpointPool(subscription_manager, checkpoint_dir) if self.owns_simulation else None
 
         
         # Initialize e1 and e2 sensors (these represent the induction loops and lane area detectors)
-        self.e1_sensors = traci.inductionloop.getIDList()  # All E1 induction loop sensors
-        self.e2_sensors = traci.lanearea.getIDList()  # All E2 lane area detectors
-
-        # Observation Space
-        self.observation_space = spaces.Dict({
-            "traffic_lights": spaces.Dict({
-                "phase": spaces.Discrete(len(self.phases)),
-                "duration": spaces.Box(low=0, high=100, shape=(1,))
-            }),
-            "lanes": spaces.Dict({
-                "queue_length": spaces.Box(low=0, high=50, shape=(len(self.lanes_by_street) * 3,)),
-                "waiting_time": spaces.Box(low=0, high=1, shape=(len(self.lanes_by_street) * 3,))
-            }),
-            "sensors": spaces.Dict({
-                "e1": spaces.Box(low=0, high=1, shape=(len(self.e1_sensors),)),
-                "e2": spaces.Box(low=0, high=1, shape=(len(self.e2_sensors),))
-            })
-        })
-
-
-        # Action Space -> 3 actions per TLS
-        #       #spaces.Discrete(3)
-        self.action_space = spaces.Tuple((
-            spaces.Discrete(len(self.phases)),        # Phase index
-            spaces.Discrete(5)  # E.g., -2, -1, 0, +1, +2 for duration change
-        ))
+        # detectors on the approach lanes the "semaforos" TLS controls, from the network index
+        network = subscription_manager.network
+        self.e1_sensors = network.controlled_detectors("semaforos", "e1")  # E1 induction loop sensors
+        self.e2_sensors = network.controlled_detectors("semaforos", "e2")  # E2 lane area detectors
+
+        # Observation Space -> flat float32 vector (phase one-hot, lanes, detectors), see model/observation.py
+        self._program_id = traci.trafficlight.getProgram("semaforos")
+        logics = traci.trafficlight.getAllProgramLogics("semaforos")
+        logic = next((l for l in logics if l.programID == self._program_id), logics[0])
+        self._phase_states = [phase.state for phase in logic.phases]
+        n_phases = len(self._phase_states)
+        self.observation_builder = ObservationBuilder(
+            network, "semaforos",
+            lanes=[lane_id for lanes in self.lanes_by_street.values() for lane_id in lanes],
+            e1_ids=self.e1_sensors, e2_ids=self.e2_sensors,
+            n_phases=max(n_phases, len(self.phases)), normalize=normalize, frame_stack=frame_stack
+        )
+        self.observation_space = self.observation_builder.space
+        links = [link[0][:2] for link in traci.trafficlight.getControlledLinks("semaforos") if link]
+        self.reward_engine = RewardEngine(
+            self.observation_builder, links, reward="waiting_time" if self._reward_function else reward_fn
+        )
+
+
+        # Action Space -> what apply_action understands: keep, switch to one of the
+        #       phases, extend or reduce the current phase
+        self.action_space = spaces.Discrete(len(self.phases) + 3)
+        # spaces.Tuple((
+        #     spaces.Discrete(len(self.phases)),        # Phase index
+        #     spaces.Discrete(5)  # E.g., -2, -1, 0, +1, +2 for duration change
+        # ))
         
         # = spaces.Dict({
         #     "tls_0": spaces.Discrete(3),
@@ -70,57 +110,91 @@ class TrafficControlEnv(gym.Env):
         #     "tls_3": spaces.Discrete(3)
         # })
 
-    def reset(self):
-        # if traci.isLoaded():
-        #     traci.close()  # Close existing connection
-        # traci.start(["sumo", "-c", self.sumo_cfg])
-        # traci.simulationStep()
-        obs = self.get_observation()
-        return obs
+    def sumo_args(self):
+        args = ["-c", self.sumo_cfg, "--no-step-log", "true"]
+        if self.sumo_seed is not None:
+            args += ["--seed", str(self.sumo_seed)]
+        return args
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        options = options or {}
+
+        if self.owns_simulation:
+            if seed is not None and seed != self.sumo_seed:
+                # a new seed needs a fresh scenario, states saved under the old one are dropped
+                self.sumo_seed = seed
+                traci.load(self.sumo_args())
+                subscription_manager.resubscribe()
+                self.checkpoints.clear()
+
+            if self.DEFAULT_CHECKPOINT not in self.checkpoints:
+                self.checkpoints.capture(self.DEFAULT_CHECKPOINT, warmup_steps=self.warmup_steps)
+            else:
+                name = options.get("checkpoint")
+                if name is None:
+                    name = self.checkpoints.sample(self.np_random) if self.curriculum else self.DEFAULT_CHECKPOINT
+                self.checkpoints.restore(name)
+
+        obs = self.observation_builder.reset(subscription_manager.snapshot)
+        if self._reward_function is None:
+            self.reward_engine.reset()
+            self.reward_engine.compute(subscription_manager.snapshot)
+        return obs, {}
+
+    def close(self):
+        if self.owns_simulation and traci.isLoaded():
+            traci.close()
+            subscription_manager.reset()
+        if self.checkpoints is not None:
+            self.checkpoints.close()
     
 
     def get_observation(self):
-        # Collect and normalize all data needed for the observation
-        # Get data from WebSocket or directly from SUMO subscriptions
-        observation = {
-            "traffic_lights": {
-                "phase": traci.trafficlight.getPhase("semaforos"),
-                "duration": traci.trafficlight.getPhaseDuration("semaforos"),
-            },
-            "lanes": {
-                "queue_length": np.array([
-                    traci.lane.getLastStepHaltingNumber(lane_id)
-                    for direction in self.lanes_by_street.values()
-                    for lane_id in direction
-                ]),
-                "waiting_time": np.array([
-                    sum(traci.vehicle.getAccumulatedWaitingTime(veh_id)
-                        for veh_id in traci.lane.getLastStepVehicleIDs(lane_id))
-                    for direction in self.lanes_by_street.values()
-                    for lane_id in direction
-                ]),
-            },
-            "sensors": {
-                "e1_sensors": np.array([
-                    traci.inductionloop.getLastStepVehicleNumber(sensor_id)
-                    for sensor_id in self.e1_sensors if sensor_id.startswith(tuple(self.lanes_by_street.keys()))
-                ]),
-                "e2_sensors": np.array([
-                    traci.lanearea.getLastStepVehicleNumber(sensor_id)
-                    for sensor_id in self.e2_sensors if sensor_id.startswith(tuple(self.lanes_by_street.keys()))
-                ]),
-            },
-        }
-        return observation
+        # Readable form of the current step (websocket, rewards): nested dict of unscaled values,
+        # the agent gets the flat vector of step()/reset()
+        self.observation_builder.update(subscription_manager.snapshot)
+        return self.observation_builder.as_dict(copy=True)
     
 
     
+    def _traci_counter(self):
+        """Round trip counter of the default connection, installed the first time tracing is on"""
+        if not tracer.enabled:
+            return None
+        if self._counter is None:
+            try:
+                self._counter = TraciCounter.install(backend.connection())
+            except Exception:  # bound to another connection (benchmarks, custom labels)
+                self._counter = None
+        return self._counter
+
     def step(self, action):
-        self.apply_action(action)
-        traci.simulationStep()
+        with tracer.trace("env_step", counter=self._traci_counter()):
+            return self._step(action)
+
+    def _step(self, action):
+        start = subscription_manager.snapshot.time
+        self.reward_engine.begin()
+        with tracer.span("apply_action"):
+            self.apply_action(action)
+        if self._pending_phase is not None:
+            with tracer.span("transition"):
+                self._transition(self._pending_phase)
+
+        # the rest of the interval in one simulationStep, rewards count every skipped step
+        previous = subscription_manager.snapshot.time
+        end = start + self.decision_interval
+        remaining = previous == start or end - previous > 1e-6  # a transition may fill the interval
+        if remaining:
+            snapshot = subscription_manager.step(end if self.decision_interval > subscription_manager.delta_t else 0.)
+            steps = max(1.0, (snapshot.time - previous) / subscription_manager.delta_t)
+        else:
+            snapshot = subscription_manager.snapshot
 
         # Get new observation
-        observation = self.get_observation()
+        with tracer.span("observation"):
+            observation = self.observation_builder.build(snapshot)
 
         # Calculate reward
         # if self.reward_function == "queue_length":
@@ -133,16 +207,46 @@ class TrafficControlEnv(gym.Env):
         #     reward = reward_composite(observation)
         # else:
         #     raise ValueError(f"Unknown reward function: {self.reward_function}")
-        reward = self.calculate_reward(observation)
+        with tracer.span("reward"):
+            if self._reward_function is not None:
+                # a custom callable replaces the engine, its components are not computed
+                reward = self.calculate_reward(self.observation_builder.as_dict())
+                components = {"reward": reward}
+            else:
+                if remaining:
+                    self.reward_engine.accumulate(snapshot, steps)
+                reward = self.reward_engine.collect()
+                components = self.reward_engine.components()
 
-        # Return Gym-like step results
-        done = traci.simulation.getMinExpectedNumber() == 0
-        return observation, reward, done, {}
+        # Return Gym-like step results, every reward component is in the info
+        terminated = snapshot.min_expected == 0
+        return observation, reward, terminated, False, {"reward_components": components}
     
 
 
     def calculate_reward(self, state):
-        return self.reward_function(state)
+        return self._reward_function(state)
+
+    @property
+    def reward_function(self):
+        """The custom reward callable, None while the RewardEngine computes the reward"""
+        return self._reward_function
+
+    @reward_function.setter
+    def reward_function(self, reward_fn):
+        self.configure_reward(reward_fn)
+
+    def configure_reward(self, reward_fn):
+        """Switch the reward between episodes, same forms as the ``reward_fn`` argument"""
+        if callable(reward_fn) and reward_fn in LEGACY_REWARDS:
+            reward_fn = LEGACY_REWARDS[reward_fn]
+        if callable(reward_fn):
+            self._reward_function = reward_fn
+        else:
+            if self._reward_function is not None:
+                self.reward_engine.reset()  # not sampled while the callable was in use
+            self.reward_engine.configure(reward_fn)
+            self._reward_function = None
 
     
 
@@ -171,7 +275,7 @@ class TrafficControlEnv(gym.Env):
                     - n+1: Extend current phase
                     - n+2: Reduce current phase
         """
-        current_phase = traci.trafficlight.getPhase("semaforos")
+        current_phase = subscription_manager.snapshot.traffic_lights["semaforos"]["current_phase"]
 
         # Total phases
         total_phases = len(self.phases)  # Define phases list somewhere
@@ -181,16 +285,46 @@ class TrafficControlEnv(gym.Env):
             pass
         elif 1 <= action <= total_phases:
             # Switch to a specific phase
-            traci.trafficlight.setPhase("semaforos", action - 1)
+            self.switch_phase(action - 1)
         elif action == total_phases + 1:
             # Extend the current phase duration
             traci.trafficlight.setPhaseDuration(
-                "semaforos", traci.trafficlight.getPhaseDuration("semaforos") + 5
+                "semaforos", subscription_manager.snapshot.traffic_lights["semaforos"]["phase_duration"] + 5
             )
         elif action == total_phases + 2:
             # Reduce the current phase duration (minimum of 5 seconds)
             new_duration = max(
-                5, traci.trafficlight.getPhaseDuration("semaforos") - 5
+                5, subscription_manager.snapshot.traffic_lights["semaforos"]["phase_duration"] - 5
             )
             traci.trafficlight.setPhaseDuration("semaforos", new_duration)
         
+
+    def switch_phase(self, phase):
+        """Switch to ``phase``, through yellow and all-red when configured, unless min green forbids it"""
+        tls = subscription_manager.snapshot.traffic_lights["semaforos"]
+        if phase == tls["current_phase"] or tls["spent_duration"] < self.min_green:
+            return
+        if (self.yellow_time <= 0 and self.all_red_time <= 0) or phase >= len(self._phase_states):
+            traci.trafficlight.setPhase("semaforos", phase)
+            return
+        self._pending_phase = phase
+
+    def _transition(self, phase):
+        """Yellow then all-red on the links losing green, each one simulationStep; then ``phase``"""
+        self._pending_phase = None
+        current = subscription_manager.snapshot.traffic_lights["semaforos"]["red_yellow_green_state"]
+        target = self._phase_states[phase]
+        yellow = "".join("y" if c in "Gg" and t not in "Gg" else c for c, t in zip(current, target))
+        all_red = "".join(c if c in "Gg" and t in "Gg" else "r" for c, t in zip(current, target))
+        delta_t = subscription_manager.delta_t
+        for state, seconds in ((yellow, self.yellow_time), (all_red, self.all_red_time)):
+            if seconds <= 0:
+                continue
+            # a fixed state runs SUMO's one-phase "online" program until the original is restored
+            traci.trafficlight.setRedYellowGreenState("semaforos", state)
+            snapshot = subscription_manager.step(subscription_manager.snapshot.time + seconds)
+            self.observation_builder.update(snapshot)
+            if self._reward_function is None:
+                self.reward_engine.accumulate(snapshot, seconds / delta_t)
+        traci.trafficlight.setProgram("semaforos", self._program_id)
+        traci.trafficlight.setPhase("semaforos", phase)
@@ -0,0 +1,150 @@
+"""Flat float32 observations for TrafficControlEnv.
+
+The layout is resolved once from the network index: every feature group
+owns a fixed slice of one preallocated vector, and each step only copies
+snapshot values into it. The vector is what SB3's ``MlpPolicy`` expects
+(``observation_space`` is a Box), optionally scaled to [0, 1] and stacked
+with the previous ``frame_stack - 1`` frames (oldest first).
+
+Layout of one frame:
+
+- ``phase``: one-hot of the TLS program phase
+- ``phase_duration``: duration of the current phase (s)
+- ``queue_length``: halting vehicles per approach lane
+- ``waiting_time``: accumulated waiting time per approach lane (s)
+- ``e1``/``e2``: vehicle count per detector on the controlled lanes
+
+Normalized, queues and E2 counts are divided by the lane's capacity
+(length / ``JAM_SPACING``), the rest by ``SCALES``, and clipped.
+"""
+from typing import Dict, List, Sequence
+
+import numpy as np
+from gymnasium import spaces
+
+from api.utils.network_index import NetworkIndex
+from api.utils.traci_subscriptions import EMPTY_JUNCTION_LANE, SimulationSnapshot
+
+
+JAM_SPACING = 7.5  # m per halted vehicle (length + min gap)
+
+SCALES = {
+    "phase_duration": 100.0,
+    "waiting_time": 300.0,
+    "e1": 5.0
+}
+
+_EMPTY_DETECTOR = {"vehicle_count": 0}
+_EMPTY_LANE = {"halting_number": 0}
+
+
+class ObservationBuilder:
+    def __init__(self, network: NetworkIndex, tls_id: str, lanes: Sequence[str], e1_ids: Sequence[str],
+                 e2_ids: Sequence[str], n_phases: int, normalize: bool = True, frame_stack: int = 1):
+        self.tls_id = tls_id
+        self.lanes = list(lanes)
+        self.e1_ids = list(e1_ids)
+        self.e2_ids = list(e2_ids)
+        self.n_phases = n_phases
+        self.normalize = normalize
+        self.frame_stack = frame_stack
+
+        sizes = {
+            "phase": n_phases,
+            "phase_duration": 1,
+            "queue_length": len(self.lanes),
+            "waiting_time": len(self.lanes),
+            "e1": len(self.e1_ids),
+            "e2": len(self.e2_ids)
+        }
+        self.slices: Dict[str, slice] = {}
+        offset = 0
+        for name, size in sizes.items():
+            self.slices[name] = slice(offset, offset + size)
+            offset += size
+        self.size = offset
+
+        # reciprocal of each feature's scale, 1 for the one-hot phase
+        scale = np.ones(self.size, dtype=np.float32)
+        scale[self.slices["phase_duration"]] = SCALES["phase_duration"]
+        scale[self.slices["queue_length"]] = self._capacity(network, self.lanes)
+        scale[self.slices["waiting_time"]] = SCALES["waiting_time"]
+        scale[self.slices["e1"]] = SCALES["e1"]
+        scale[self.slices["e2"]] = self._capacity(network, [network.e2_lane(d) for d in self.e2_ids])
+        self._inv_scale = 1.0 / scale
+
+        self.raw = np.zeros(self.size, dtype=np.float32)  # latest frame, unscaled
+        self.phase = 0
+        self._frames = np.zeros((frame_stack, self.size), dtype=np.float32)
+        self._flat = self._frames.reshape(-1)  # view, returned by build()
+
+        high = 1.0 if normalize else np.inf
+        self.space = spaces.Box(low=0.0, high=high, shape=(frame_stack * self.size,), dtype=np.float32)
+
+    @staticmethod
+    def _capacity(network: NetworkIndex, lane_ids: List[str]) -> np.ndarray:
+        lengths = np.array([network.length(lane_id) if lane_id in network.lane_index else JAM_SPACING
+                            for lane_id in lane_ids], dtype=np.float32)
+        return np.maximum(lengths / JAM_SPACING, 1.0)
+
+    def update(self, snapshot: SimulationSnapshot):
+        """Copy ``snapshot`` into ``raw``, the stacked frames are left alone"""
+        raw, s = self.raw, self.slices
+        tls = snapshot.traffic_lights[self.tls_id]
+        self.phase = tls["current_phase"]
+        raw[s["phase"]] = 0.0
+        raw[s["phase"].start + min(self.phase, self.n_phases - 1)] = 1.0
+        raw[s["phase_duration"]] = tls["phase_duration"]
+
+        lanes, junction_lanes = snapshot.lanes, snapshot.junction_lanes
+        n = len(self.lanes)
+        raw[s["queue_length"]] = np.fromiter(
+            (lanes.get(lane_id, _EMPTY_LANE)["halting_number"] for lane_id in self.lanes), np.float32, n)
+        raw[s["waiting_time"]] = np.fromiter(
+            (junction_lanes.get(lane_id, EMPTY_JUNCTION_LANE)["accumulated_waiting_time"] for lane_id in self.lanes),
+            np.float32, n)
+        raw[s["e1"]] = np.fromiter(
+            (snapshot.e1.get(d, _EMPTY_DETECTOR)["vehicle_count"] for d in self.e1_ids), np.float32, len(self.e1_ids))
+        raw[s["e2"]] = np.fromiter(
+            (snapshot.e2.get(d, _EMPTY_DETECTOR)["vehicle_count"] for d in self.e2_ids), np.float32, len(self.e2_ids))
+
+    def _write(self, frame: np.ndarray):
+        if self.normalize:
+            np.multiply(self.raw, self._inv_scale, out=frame)
+            np.clip(frame, 0.0, 1.0, out=frame)
+        else:
+            frame[:] = self.raw
+
+    def build(self, snapshot: SimulationSnapshot) -> np.ndarray:
+        """Observation of ``snapshot``: the builder's own buffer, overwritten by the next call"""
+        self.update(snapshot)
+        frames = self._frames
+        if self.frame_stack > 1:
+            frames[:-1] = frames[1:]
+        self._write(frames[-1])
+        return self._flat
+
+    def reset(self, snapshot: SimulationSnapshot) -> np.ndarray:
+        """First observation of an episode, every stacked frame is this step"""
+        self.update(snapshot)
+        self._write(self._frames[-1])
+        self._frames[:-1] = self._frames[-1]
+        return self._flat
+
+    def as_dict(self, copy: bool = False) -> dict:
+        """The latest frame in the env's nested layout, unscaled (views into ``raw`` unless ``copy``)"""
+        raw, s = (self.raw.copy() if copy else self.raw), self.slices
+        return {
+            "traffic_lights": {
+                "phase": self.phase,
+                "duration": float(raw[s["phase_duration"].start])
+            },
+            "lanes": {
+                "queue_length": raw[s["queue_length"]],
+                "waiting_time": raw[s["waiting_time"]]
+            },
+            "sensors": {
+                "e1_sensors": raw[s["e1"]],
+                "e2_sensors": raw[s["e2"]]
+            }
+        }
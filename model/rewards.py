@@ -1,5 +1,9 @@
+from typing import Dict, Mapping, Sequence, Tuple, Union
+
 import numpy as np
-import traci
+from api.utils.network_index import NO_DIRECTION, direction_of
+from api.utils.traci_subscriptions import SimulationSnapshot
+from .observation import ObservationBuilder
 
 # Reward function for minimizing queue length
 def reward_minimize_queue_length(observation):
@@ -12,13 +16,11 @@ def reward_minimize_waiting_time(observation):
     return -np.sum(waiting_times)  # Negative reward for more waiting time
 
 # Reward function for maximizing average speed
-def reward_maximize_speed(observation):
-    lane_speeds = [
-        traci.lane.getLastStepMeanSpeed(lane_id)
-        for direction in observation["lanes"]
-        for lane_id in direction
-    ]
-    return np.mean(lane_speeds)  # Reward for higher average speed
+def reward_maximize_speed(observation, snapshot: SimulationSnapshot):
+    # mean speed of the approach lanes, from the snapshot of the env's simulation (no TraCI calls)
+    lanes = snapshot.lanes
+    lane_speeds = [lane["mean_speed"] for lane_id, lane in lanes.items() if direction_of(lane_id) != NO_DIRECTION]
+    return np.mean(lane_speeds) if lane_speeds else 0.0  # Reward for higher average speed
 
 
 # Reward function for hybrid approach (weighted combination)
@@ -42,4 +44,140 @@ def reward_composite(observation, weights=None):
     #     for lane_id in observation["lanes"]
     # ])
     
-    # return queue_penalty + waiting_time_penalty + speed_reward
\ No newline at end of file
+    # return queue_penalty + waiting_time_penalty + speed_reward
+
+
+
+# Fused reward: every component from one pass over the step snapshot
+REWARD_COMPONENTS = ("queue", "waiting", "speed", "throughput", "pressure")
+# components counted over the interval since the last sample, the others are levels held by every step
+FLOW_COMPONENTS = ("throughput",)
+
+# named composites, weights carry the sign (penalties are negative)
+REWARD_PRESETS = {
+    "queue_length": {"queue": -1.0},
+    "waiting_time": {"waiting": -1.0},
+    "speed": {"speed": 1.0},
+    "throughput": {"throughput": 1.0},
+    "pressure": {"pressure": -1.0},
+    "hybrid": {"queue": -0.5, "waiting": -0.3, "speed": 0.2}
+}
+
+# the functions above, as RewardEngine presets
+LEGACY_REWARDS = {
+    reward_minimize_queue_length: "queue_length",
+    reward_minimize_waiting_time: "waiting_time",
+    reward_maximize_speed: "speed",
+    reward_composite: "hybrid"
+}
+
+Reward = Union[str, Mapping[str, float]]
+
+_EMPTY_LANE = {"vehicle_count": 0, "mean_speed": 0.0, "vehicle_ids": ()}
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """``"queue=-0.5,speed=0.2"`` -> ``{"queue": -0.5, "speed": 0.2}``"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected component=weight, got '{item}'")
+        weights[name.strip()] = float(value)
+    return weights
+
+
+def reward_weights(reward: Reward) -> np.ndarray:
+    """Weight vector over REWARD_COMPONENTS of a preset name or a {component: weight} mapping"""
+    if isinstance(reward, str):
+        if reward not in REWARD_PRESETS:
+            raise ValueError(f"Unknown reward '{reward}', choose one of {list(REWARD_PRESETS)}")
+        reward = REWARD_PRESETS[reward]
+    unknown = set(reward) - set(REWARD_COMPONENTS)
+    if unknown:
+        raise ValueError(f"Unknown reward components {sorted(unknown)}, choose from {list(REWARD_COMPONENTS)}")
+    return np.array([reward.get(name, 0.0) for name in REWARD_COMPONENTS], dtype=np.float64)
+
+
+class RewardEngine:
+    """All reward components of a step at once, the reward is their weighted sum.
+
+    Queue and waiting time are read from the observation builder's frame of
+    the same step; speed, throughput and pressure from one pass over the
+    controlled lanes of the snapshot:
+
+    - ``queue``: halting vehicles on the approach lanes
+    - ``waiting``: their accumulated waiting time (s)
+    - ``speed``: mean of the approach lanes' mean speeds (m/s)
+    - ``throughput``: vehicles that left the approach lanes since the last step
+    - ``pressure``: |vehicles on incoming - vehicles on outgoing lanes| over the controlled links
+
+    Across several steps (an env decision interval) samples are accumulated:
+    a level sampled at the end of a targetTime jump of ``n`` steps counts
+    ``n`` times, flows count once as they already cover the jump.
+    """
+    def __init__(self, observation: ObservationBuilder, links: Sequence[Tuple[str, str]],
+                 reward: Reward = "waiting_time"):
+        self.observation = observation
+        self.lanes = list(dict.fromkeys(observation.lanes + [lane for link in links for lane in link]))
+        lane_index = {lane_id: i for i, lane_id in enumerate(self.lanes)}
+        self._approach = np.array([lane_index[lane_id] for lane_id in observation.lanes], dtype=np.intp)
+        self._link_in = np.array([lane_index[lane_in] for lane_in, _ in links], dtype=np.intp)
+        self._link_out = np.array([lane_index[lane_out] for _, lane_out in links], dtype=np.intp)
+        self._counts = np.zeros(len(self.lanes), dtype=np.float64)
+        self._speeds = np.zeros(len(self.lanes), dtype=np.float64)
+        self._queued: set = set()
+        self.values = np.zeros(len(REWARD_COMPONENTS), dtype=np.float64)  # latest sample
+        self.totals = np.zeros(len(REWARD_COMPONENTS), dtype=np.float64)  # accumulated since begin()
+        self._flow = np.array([name in FLOW_COMPONENTS for name in REWARD_COMPONENTS], dtype=np.float64)
+        self.weights = reward_weights(reward)
+        self.reward = 0.0
+
+    def configure(self, reward: Reward):
+        self.weights = reward_weights(reward)
+
+    def reset(self):
+        self._queued = set()
+
+    def begin(self):
+        self.totals[:] = 0.0
+
+    def accumulate(self, snapshot: SimulationSnapshot, steps: float = 1.0):
+        """Add the sample of ``snapshot``, reached by a jump of ``steps`` steps"""
+        self._sample(snapshot)
+        self.totals += self.values * (self._flow + steps * (1.0 - self._flow))
+
+    def collect(self) -> float:
+        """Weighted reward of the accumulated components"""
+        self.reward = float(self.totals @ self.weights)
+        return self.reward
+
+    def compute(self, snapshot: SimulationSnapshot) -> float:
+        """Reward of one step: components of ``snapshot`` (the builder must hold the same step), weighted"""
+        self.begin()
+        self.accumulate(snapshot)
+        return self.collect()
+
+    def _sample(self, snapshot: SimulationSnapshot):
+        lanes = snapshot.lanes
+        entries = [lanes.get(lane_id, _EMPTY_LANE) for lane_id in self.lanes]
+        counts, speeds = self._counts, self._speeds
+        counts[:] = [entry["vehicle_count"] for entry in entries]
+        speeds[:] = [entry["mean_speed"] for entry in entries]
+
+        queued = set()
+        for i in self._approach:
+            queued.update(entries[i]["vehicle_ids"])
+
+        raw, s = self.observation.raw, self.observation.slices
+        values = self.values
+        values[0] = raw[s["queue_length"]].sum()
+        values[1] = raw[s["waiting_time"]].sum()
+        values[2] = speeds[self._approach].mean() if len(self._approach) else 0.0
+        values[3] = len(self._queued - queued)
+        values[4] = abs(counts[self._link_in].sum() - counts[self._link_out].sum())
+        self._queued = queued
+
+    def components(self) -> Dict[str, float]:
+        """Accumulated components and reward, e.g. for the step info"""
+        return {**dict(zip(REWARD_COMPONENTS, self.totals.tolist())), "reward": self.reward}
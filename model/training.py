@@ -1,9 +1,10 @@
 from stable_baselines3 import DQN, PPO
+from stable_baselines3.common.callbacks import CallbackList
 from model.environment import TrafficControlEnv
-from model.callbacks import RTPlotCallback
+from model.callbacks import RewardComponentsCallback, RTPlotCallback
 
 
-callback = RTPlotCallback()
+callback = CallbackList([RTPlotCallback(), RewardComponentsCallback()])
 
 
 def train_model(model_type: str, env: TrafficControlEnv, total_timesteps: int = 12000):
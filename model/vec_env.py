@@ -0,0 +1,45 @@
+import multiprocessing as mp
+from typing import Callable, Optional, Union
+
+from sumolib.miscutils import getFreeSocketPort
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+from .environment import TrafficControlEnv
+from .rewards import Reward
+
+
+def make_env(rank: int, sumo_cfg: str = "escenario/osm2.sumocfg",
+             reward_fn: Union[Reward, Callable] = "waiting_time", seed: int = 0,
+             env_kwargs: Optional[dict] = None) -> Callable[[], TrafficControlEnv]:
+    """Thunk building the env of worker ``rank``, called inside the worker process.
+
+    Each worker owns a SUMO instance on its own port with seed ``seed + rank``,
+    so episodes differ across workers but a run is reproducible. ``env_kwargs``
+    go to TrafficControlEnv (decision_interval, yellow_time, frame_stack...).
+    """
+    def _init() -> TrafficControlEnv:
+        return TrafficControlEnv(
+            sumo_cfg=sumo_cfg,
+            reward_fn=reward_fn,
+            seed=seed + rank,
+            port=getFreeSocketPort(),
+            **(env_kwargs or {})
+        )
+    return _init
+
+
+def make_vec_env(n_envs: int, sumo_cfg: str = "escenario/osm2.sumocfg",
+                 reward_fn: Union[Reward, Callable] = "waiting_time", seed: int = 0,
+                 start_method: Optional[str] = None, env_kwargs: Optional[dict] = None) -> SubprocVecEnv:
+    """``n_envs`` TrafficControlEnv workers stepped in parallel, one process each.
+
+    Steps and observations are batched across workers by SubprocVecEnv, the
+    result plugs into any stable-baselines3 algorithm in place of a single env.
+
+    Workers are never forked from the parent: a parent that already holds a
+    TraCI connection (the API server) would share its socket with every child.
+    """
+    if start_method is None:
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    env_fns = [make_env(rank, sumo_cfg, reward_fn, seed, env_kwargs) for rank in range(n_envs)]
+    return SubprocVecEnv(env_fns, start_method=start_method)
@@ -0,0 +1,60 @@
+from api.utils.detector_logs import E1_LOG_METRICS, DetectorLogTail
+
+
+HEADER = b'<?xml version="1.0" encoding="UTF-8"?>\n<detector>\n'
+
+
+def interval(det_id: str, end: float, flow: float) -> bytes:
+    return (f'    <interval begin="{end - 60:.2f}" end="{end:.2f}" id="{det_id}" nVehContrib="1" '
+            f'flow="{flow:.2f}" occupancy="0.50"/>\n').encode()
+
+
+def write(path, data: bytes, mode: str = "ab"):
+    with open(path, mode) as fp:
+        fp.write(data)
+
+
+def test_missing_file_reads_nothing(tmp_path):
+    assert DetectorLogTail(str(tmp_path / "e1.xml"), E1_LOG_METRICS).read() == []
+
+
+def test_reads_only_what_was_appended(tmp_path):
+    path = tmp_path / "e1.xml"
+    write(path, HEADER + interval("a", 60.0, 10.0) + interval("b", 60.0, 20.0), "wb")
+    tail = DetectorLogTail(str(path), ("flow", "occupancy", "speed"))
+    assert tail.read() == [("a", 60.0, {"flow": 10.0, "occupancy": 0.5}),
+                           ("b", 60.0, {"flow": 20.0, "occupancy": 0.5})]
+    assert tail.read() == []
+    write(path, interval("a", 120.0, 30.0))
+    assert tail.read() == [("a", 120.0, {"flow": 30.0, "occupancy": 0.5})]
+    assert tail.offset == path.stat().st_size
+
+
+def test_partial_element_is_returned_once_complete(tmp_path):
+    path = tmp_path / "e1.xml"
+    line = interval("a", 60.0, 10.0)
+    write(path, HEADER + line[:25], "wb")
+    tail = DetectorLogTail(str(path), ("flow",))
+    assert tail.read() == []
+    write(path, line[25:-5])
+    assert tail.read() == []
+    write(path, line[-5:] + b"</detector>\n")
+    assert tail.read() == [("a", 60.0, {"flow": 10.0})]
+
+
+def test_small_chunks_and_processed_elements_leave_the_root(tmp_path):
+    path = tmp_path / "e1.xml"
+    write(path, HEADER + b"".join(interval("a", 60.0 * i, float(i)) for i in range(1, 51)), "wb")
+    tail = DetectorLogTail(str(path), ("flow",), chunk_size=7)
+    intervals = tail.read()
+    assert [end for _, end, _ in intervals] == [60.0 * i for i in range(1, 51)]
+    assert len(tail._root) <= 1
+
+
+def test_shrunk_file_is_read_from_the_start(tmp_path):
+    path = tmp_path / "e1.xml"
+    write(path, HEADER + interval("a", 60.0, 1.0) + interval("a", 120.0, 2.0), "wb")
+    tail = DetectorLogTail(str(path), ("flow",))
+    assert len(tail.read()) == 2
+    write(path, HEADER + interval("a", 60.0, 5.0), "wb")  # SUMO restarted
+    assert tail.read() == [("a", 60.0, {"flow": 5.0})]
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+from api.utils.metrics_store import IntervalSeries, MetricsStore
+from api.utils.network_index import NetworkIndex
+from api.utils.traci_subscriptions import SimulationSnapshot
+
+
+def network() -> NetworkIndex:
+    lane_ids = ("N_0", "S_0", ":c_0")
+    return NetworkIndex(
+        lane_ids=lane_ids,
+        lane_lengths=np.array([100.0, 50.0, 10.0]),
+        lane_direction=np.array([0, 1, -1], dtype=np.int8),
+        e1_ids=("e1_n",),
+        e1_lanes=np.array([0], dtype=np.int32),
+        tls_controlled={"c": np.array([0, 1], dtype=np.int32)},
+        lane_index={lane_id: i for i, lane_id in enumerate(lane_ids)}
+    )
+
+
+def snapshot(net: NetworkIndex, time: float, count: float = 0.0) -> SimulationSnapshot:
+    """``count`` vehicles on N_0 and twice that on S_0, all at 10 m/s"""
+    return SimulationSnapshot(
+        step=int(time), time=time, vehicle_count=int(3 * count), network=net,
+        e1={"e1_n": {"vehicle_count": count, "occupancy": 0.0, "mean_speed": 0.0}},
+        lanes={
+            "N_0": {"vehicle_count": count, "halting_number": 0, "mean_speed": 10.0, "waiting_time": 0.0},
+            "S_0": {"vehicle_count": 2 * count, "halting_number": count, "mean_speed": 10.0, "waiting_time": 1.0}
+        },
+        traffic_lights={"c": {"current_phase": int(time) % 4, "spent_duration": time}}
+    )
+
+
+def test_ring_wraps_to_the_newest_rows():
+    net, store = network(), MetricsStore(retention=4)
+    for t in range(10):
+        store.record(snapshot(net, float(t), count=t))
+    assert len(store) == 4
+    result = store.query("e1", "vehicle_count")
+    assert result["time"] == [6.0, 7.0, 8.0, 9.0]
+    assert result["values"]["e1_n"] == [6.0, 7.0, 8.0, 9.0]
+    assert store.latest("tls")["c"] == {"current_phase": 1.0, "spent_duration": 9.0}
+    catalog = store.catalog()
+    assert (catalog["start"], catalog["end"], catalog["count"]) == (6.0, 9.0, 4)
+
+
+def test_range_bounds_are_inclusive_across_the_wrap():
+    net, store = network(), MetricsStore(retention=5)
+    for t in range(8):
+        store.record(snapshot(net, float(t), count=t))
+    assert store.query("e1", "vehicle_count", start=4.0, end=6.0)["time"] == [4.0, 5.0, 6.0]
+    assert store.query("e1", "vehicle_count", start=6.5)["time"] == [7.0]
+    assert store.query("e1", "vehicle_count", end=2.0)["time"] == []
+
+
+def test_derived_columns():
+    net, store = network(), MetricsStore(retention=2)
+    store.record(snapshot(net, 1.0, count=2))
+    lanes = store.latest("lanes")
+    assert lanes["N_0"]["density"] == pytest.approx(0.02)
+    assert lanes[":c_0"]["density"] == 0.0
+    directions = store.latest("directions")
+    assert directions["N"]["vehicle_count"] == 2.0
+    assert directions["S"]["halting_number"] == 2.0
+    assert directions["W"]["mean_speed"] == 0.0
+    simulation = store.latest("simulation")["all"]
+    assert simulation["mean_speed"] == pytest.approx(10.0)
+    assert simulation["vehicle_count"] == 6.0
+
+
+def test_bucket_edges():
+    net, store = network(), MetricsStore(retention=16)
+    for t in range(10):
+        store.record(snapshot(net, float(t), count=t))
+    result = store.query("e1", "vehicle_count", resolution=3.0)
+    # buckets start at the first row: [0, 3) [3, 6) [6, 9) [9, 12)
+    assert result["time"] == [0.0, 3.0, 6.0, 9.0]
+    assert result["count"] == [3, 3, 3, 1]
+    values = result["values"]["e1_n"]
+    assert values["min"] == [0.0, 3.0, 6.0, 9.0]
+    assert values["max"] == [2.0, 5.0, 8.0, 9.0]
+    assert values["mean"] == [1.0, 4.0, 7.0, 9.0]
+
+
+def test_points_bucket_over_the_queried_range():
+    net, store = network(), MetricsStore(retention=16)
+    for t in range(11):
+        store.record(snapshot(net, float(t), count=t))
+    result = store.query("e1", "vehicle_count", points=5)
+    assert result["resolution"] == 2.0
+    assert sum(result["count"]) == 11
+    assert result["time"] == [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+
+
+def test_time_going_back_starts_a_new_history():
+    net, store = network(), MetricsStore(retention=4)
+    for t in range(3):
+        store.record(snapshot(net, float(t)))
+    store.record(snapshot(net, 0.0))
+    assert store.query("e1", "vehicle_count")["time"] == [0.0]
+
+
+def test_new_network_reallocates():
+    store = MetricsStore(retention=4)
+    store.record(snapshot(network(), 0.0))
+    store.record(snapshot(network(), 1.0))
+    assert len(store) == 1
+    store.record(SimulationSnapshot(step=2, time=2.0))  # no network, not recorded
+    assert len(store) == 1
+
+
+def test_unknown_kind_metric_and_ids():
+    net, store = network(), MetricsStore(retention=4)
+    store.record(snapshot(net, 0.0))
+    with pytest.raises(KeyError):
+        store.query("nope", "vehicle_count")
+    with pytest.raises(KeyError):
+        store.query("e1", "nope")
+    with pytest.raises(KeyError):
+        store.query("e1", "vehicle_count", ids=["nope"])
+
+
+def test_interval_series_wraps_per_entity_and_skips_old_ends():
+    series = IntervalSeries(["a", "b"], ["flow"], retention=3)
+    for end in (60.0, 120.0, 180.0, 240.0):
+        series.append("a", end, {"flow": end / 60})
+    series.append("a", 180.0, {"flow": 99.0})  # the file read again from the start
+    series.append("b", 90.0, {})
+    result = series.query("flow")
+    assert result["a"]["time"] == [120.0, 180.0, 240.0]
+    assert result["a"]["values"] == [2.0, 3.0, 4.0]
+    assert result["b"]["values"] == [0.0]
+    assert series.latest()["a"] == {"end": 240.0, "flow": 4.0}
+    assert series.query("flow", ["a"], start=150.0, end=240.0)["a"]["time"] == [180.0, 240.0]
+
+
+def test_store_interval_series():
+    store = MetricsStore(retention=4)
+    store.add_intervals("e1_log", ["a"], ["flow"])
+    store.append_intervals("e1_log", [("a", 60.0, {"flow": 3.0})])
+    assert store.query("e1_log", "flow")["series"]["a"]["values"] == [3.0]
+    # same ids and metrics keep the series, others replace it
+    assert store.add_intervals("e1_log", ["a"], ["flow"]) is store.intervals["e1_log"]
+    assert store.add_intervals("e1_log", ["a", "b"], ["flow"]).ids == ("a", "b")
+    store.clear()
+    assert store.latest("e1_log") == {}
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from api.utils.network_index import NetworkIndex
+from api.utils.traci_subscriptions import SimulationSnapshot
+from model.observation import JAM_SPACING, SCALES, ObservationBuilder
+
+
+LANES = ["N_0", "S_0"]
+
+
+def network() -> NetworkIndex:
+    return NetworkIndex(
+        lane_ids=tuple(LANES),
+        lane_lengths=np.array([75.0, 3.0]),  # room for 10 halted vehicles, and for less than one
+        lane_direction=np.array([0, 1], dtype=np.int8),
+        e1_ids=("e1_n",),
+        e1_lanes=np.array([0], dtype=np.int32),
+        e2_ids=("e2_n", "e2_s"),
+        e2_lanes=np.array([0, 1], dtype=np.int32),
+        tls_controlled={"c": np.array([0, 1], dtype=np.int32)},
+        lane_index={lane_id: i for i, lane_id in enumerate(LANES)}
+    )
+
+
+def builder(normalize: bool = True, frame_stack: int = 1) -> ObservationBuilder:
+    return ObservationBuilder(network(), "c", LANES, ["e1_n"], ["e2_n", "e2_s"], n_phases=4,
+                              normalize=normalize, frame_stack=frame_stack)
+
+
+def snapshot(phase: int = 1, duration: float = 50.0, halting=(5, 3), waiting=(150.0, 600.0), e1: int = 2,
+             e2=(4, 2)) -> SimulationSnapshot:
+    return SimulationSnapshot(
+        step=0, time=0.0,
+        traffic_lights={"c": {"current_phase": phase, "phase_duration": duration}},
+        lanes={lane: {"halting_number": h} for lane, h in zip(LANES, halting)},
+        junction_lanes={lane: {"accumulated_waiting_time": w} for lane, w in zip(LANES, waiting)},
+        e1={"e1_n": {"vehicle_count": e1}},
+        e2={d: {"vehicle_count": c} for d, c in zip(("e2_n", "e2_s"), e2)}
+    )
+
+
+def test_layout_follows_the_feature_order():
+    obs = builder()
+    assert list(obs.slices) == ["phase", "phase_duration", "queue_length", "waiting_time", "e1", "e2"]
+    assert [(s.start, s.stop) for s in obs.slices.values()] == [(0, 4), (4, 5), (5, 7), (7, 9), (9, 10), (10, 12)]
+    assert obs.size == 12
+
+
+@pytest.mark.parametrize("frame_stack", [1, 3])
+def test_space_matches_the_observation(frame_stack):
+    for normalize, high in ((True, 1.0), (False, np.inf)):
+        obs = builder(normalize, frame_stack)
+        assert obs.space.shape == (frame_stack * obs.size,)
+        assert obs.space.dtype == np.float32
+        assert np.all(obs.space.low == 0.0) and np.all(obs.space.high == high)
+        for build in (obs.reset, obs.build):
+            vector = build(snapshot())
+            assert vector.shape == obs.space.shape and vector.dtype == np.float32
+            assert obs.space.contains(vector)
+
+
+def test_normalized_values():
+    vector = builder().reset(snapshot())
+    expected = [0, 1, 0, 0,
+                50.0 / SCALES["phase_duration"],
+                5 / (75.0 / JAM_SPACING), 1.0,  # 3 halted on a lane shorter than one vehicle
+                150.0 / SCALES["waiting_time"], 1.0,
+                2 / SCALES["e1"],
+                4 / (75.0 / JAM_SPACING), 1.0]
+    np.testing.assert_allclose(vector, expected, rtol=1e-6)
+
+
+def test_raw_values_and_missing_entities():
+    obs = builder(normalize=False)
+    vector = obs.reset(SimulationSnapshot(step=0, time=0.0, traffic_lights={"c": {"current_phase": 9,
+                                                                                   "phase_duration": 5.0}}))
+    # a phase past n_phases sets the last slot, entities missing from the snapshot read 0
+    np.testing.assert_array_equal(vector, [0, 0, 0, 1, 5.0] + [0.0] * 7)
+    assert obs.as_dict()["traffic_lights"] == {"phase": 9, "duration": 5.0}
+
+
+def test_frames_stack_oldest_first():
+    obs = builder(normalize=False, frame_stack=3)
+    first = obs.reset(snapshot(duration=1.0)).copy()
+    assert np.all(first.reshape(3, -1)[:, 4] == 1.0)
+    obs.build(snapshot(duration=2.0))
+    vector = obs.build(snapshot(duration=3.0))
+    assert vector.reshape(3, -1)[:, 4].tolist() == [1.0, 2.0, 3.0]
+    assert obs.reset(snapshot(duration=4.0)).reshape(3, -1)[:, 4].tolist() == [4.0, 4.0, 4.0]
+
+
+def test_as_dict_is_unscaled():
+    obs = builder()
+    obs.build(snapshot())
+    view = obs.as_dict(copy=True)
+    assert view["lanes"]["queue_length"].tolist() == [5.0, 3.0]
+    assert view["lanes"]["waiting_time"].tolist() == [150.0, 600.0]
+    assert view["sensors"]["e2_sensors"].tolist() == [4.0, 2.0]
+    obs.build(snapshot(halting=(0, 0)))
+    assert view["lanes"]["queue_length"].tolist() == [5.0, 3.0]
+    assert obs.as_dict()["lanes"]["queue_length"].tolist() == [0.0, 0.0]
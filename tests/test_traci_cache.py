@@ -0,0 +1,101 @@
+import os
+
+import pytest
+from api.utils.traci_cache import CachedConnection, cached
+from benchmarks.fake_traci import CountingTraci, FakeTraci
+
+
+CFG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "escenario", "osm2.sumocfg")
+
+
+class LoadableTraci(FakeTraci):
+    """FakeTraci with ``load``, which starts the scripted traffic over"""
+    def load(self, args):
+        self.__init__(CFG_FILE)
+
+
+@pytest.fixture
+def conn():
+    return CountingTraci(LoadableTraci(CFG_FILE))
+
+
+@pytest.fixture
+def lane(conn):
+    return conn.lane.getIDList()[0]
+
+
+def test_getters_are_answered_once_per_step(conn, lane):
+    cache = cached(conn)
+    assert cached(cache) is cache
+    first = cache.lane.getLastStepVehicleNumber(lane)
+    assert cache.lane.getLastStepVehicleNumber(lane) == first
+    cache.lane.getLength(lane)
+    assert conn.counts["lane.getLastStepVehicleNumber"] == 1
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_step_invalidates(conn, lane):
+    cache = CachedConnection(conn)
+    cache.lane.getLastStepVehicleNumber(lane)
+    cache.simulationStep()
+    cache.lane.getLastStepVehicleNumber(lane)
+    assert conn.counts["lane.getLastStepVehicleNumber"] == 2
+
+
+def test_load_invalidates(conn):
+    cache = CachedConnection(conn)
+    tls_id = cache.trafficlight.getIDList()[0]
+    conn.trafficlight.setPhase(tls_id, 2)  # behind the cache's back
+    assert cache.trafficlight.getPhase(tls_id) == 2
+    cache.load([])
+    assert cache.trafficlight.getPhase(tls_id) == 0
+    assert conn.counts["trafficlight.getPhase"] == 2
+
+
+def test_setter_invalidates_its_object_and_id_lists(conn, lane):
+    cache = CachedConnection(conn)
+    tls_id = cache.trafficlight.getIDList()[0]
+    cache.trafficlight.getPhase(tls_id)
+    cache.lane.getLength(lane)
+    cache.trafficlight.setPhase(tls_id, 1)
+    assert cache.trafficlight.getPhase(tls_id) == 1
+    cache.trafficlight.getIDList()
+    cache.lane.getLength(lane)
+    assert conn.counts["trafficlight.getPhase"] == 2
+    assert conn.counts["trafficlight.getIDList"] == 2
+    assert conn.counts["lane.getLength"] == 1
+
+
+def test_commands_invalidate_their_domain():
+    class Domain:
+        def __init__(self):
+            self.ids = ["a"]
+
+        def getIDList(self):
+            return tuple(self.ids)
+
+        def add(self, obj_id):
+            self.ids.append(obj_id)
+
+        def getSubscriptionResults(self, obj_id):
+            return {"calls": len(self.ids)}
+
+    class Connection:
+        vehicle = Domain()
+        simulation = Domain()
+
+    conn = Connection()
+    cache = CachedConnection(conn)
+    assert cache.vehicle.getIDList() == ("a",)
+    cache.simulation.getIDList()
+    cache.vehicle.add("b")
+    assert cache.vehicle.getIDList() == ("a", "b")
+    assert cache.misses == 3  # simulation kept its entry
+    cache.simulation.getIDList()
+    assert cache.hits == 1
+
+    # subscription results are never cached
+    cache.vehicle.getSubscriptionResults("a")
+    conn.vehicle.ids.append("c")
+    assert cache.vehicle.getSubscriptionResults("a") == {"calls": 3}
+    assert cache.hits == 1
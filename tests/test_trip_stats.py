@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from api.utils.trip_stats import TripLog
+
+
+def test_append_grows_past_capacity():
+    log = TripLog(capacity=2)
+    for arrival in range(5):
+        log.append(np.array([0.0, 1.0]), float(arrival + 10), 0.0, 0.0, 0)
+    assert len(log) == 10
+    assert log.column("arrival").tolist() == [10.0, 10.0, 11.0, 11.0, 12.0, 12.0, 13.0, 13.0, 14.0, 14.0]
+    assert log.column("travel_time")[:2].tolist() == [10.0, 9.0]
+
+
+def test_empty_append_and_clear():
+    log = TripLog(capacity=1)
+    log.append(np.array([]), 5.0, 0.0, 0.0, 0)
+    assert len(log) == 0
+    assert log.summary() == {"trips": 0, "travel_time": None, "time_loss": None, "delay": None, "stops": None}
+    log.append(np.array([1.0]), 5.0, 0.0, 0.0, 0)
+    log.clear()
+    assert len(log) == 0
+
+
+def test_summary_of_a_window():
+    log = TripLog()
+    log.append(np.array([0.0, 10.0]), 20.0, np.array([2.0, 4.0]), np.array([1.0, 0.0]), np.array([1, 0]))
+    log.append(np.array([30.0]), 50.0, 6.0, 3.0, 2)
+    summary = log.summary()
+    assert summary["trips"] == 3
+    assert summary["travel_time"] == {"mean": pytest.approx(50 / 3), "min": 10.0, "max": 20.0, "sum": 50.0,
+                                      "p50": 20.0, "p90": 20.0, "p95": 20.0}
+    assert summary["stops"]["sum"] == 3.0
+
+    window = log.summary(start=20.0, end=20.0, percentiles=(50,))
+    assert window["trips"] == 2
+    assert window["time_loss"] == {"mean": 3.0, "min": 2.0, "max": 4.0, "sum": 6.0, "p50": 3.0}
+
+
+def test_nan_kpis_are_left_out():
+    log = TripLog()
+    log.append(np.array([0.0]), 10.0, 5.0, 2.0, 1)
+    log.append(np.array([5.0]), 10.0, np.nan, np.nan, np.nan)  # inside one targetTime jump
+    summary = log.summary()
+    assert summary["trips"] == 2
+    assert summary["travel_time"]["mean"] == 7.5
+    assert summary["time_loss"]["mean"] == 5.0
+    assert log.summary(start=10.0, end=10.0)["delay"]["sum"] == 2.0
+
+    only_nan = TripLog()
+    only_nan.append(np.array([0.0]), 10.0, np.nan, np.nan, np.nan)
+    assert only_nan.summary()["delay"] is None
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import random
+
+import pytest
+from api.utils.traci_subscriptions import SimulationSnapshot
+from api.utils.ws_binary import IdTable, decode_binary, encode_binary
+from api.utils.ws_hub import Frame, Subscriber, diff, _UNCHANGED
+
+
+def apply(state: dict, change: dict) -> dict:
+    """What a client does with a delta: null removes, dicts merge, the rest replaces"""
+    for key, value in change.items():
+        if value is None:
+            state.pop(key, None)
+        elif isinstance(value, dict) and isinstance(state.get(key), dict):
+            apply(state[key], value)
+        else:
+            state[key] = value
+    return state
+
+
+def random_data(rng: random.Random) -> dict:
+    return {
+        "traffic_lights": {
+            tls: {"phase": rng.randrange(4), "state": rng.choice("GgrRy") * 4}
+            for tls in rng.sample(["a", "b", "c"], rng.randrange(1, 4))
+        },
+        "lanes": {
+            f"lane{i}": {"queue": rng.randrange(3), "speeds": [rng.random() for _ in range(rng.randrange(3))]}
+            for i in range(rng.randrange(1, 5))
+        }
+    }
+
+
+def receive(subscriber: Subscriber, frames):
+    """Queue ``frames`` at once and return the decoded messages the client gets"""
+    async def run():
+        for frame in frames:
+            subscriber.put(frame)
+        messages = []
+        while subscriber._frames or subscriber._outbox:
+            messages.append(json.loads(await subscriber.get()))
+        return messages
+    return asyncio.run(run())
+
+
+def test_diff_round_trip():
+    rng = random.Random(7)
+    old = random_data(rng)
+    for _ in range(200):
+        new = random_data(rng)
+        change = diff(old, new)
+        state = json.loads(json.dumps(old))
+        assert (apply(state, change) if change is not _UNCHANGED else state) == new
+        old = new
+
+
+def test_deltas_rebuild_every_frame():
+    rng = random.Random(3)
+    subscriber = Subscriber(queue_size=100, topics="tls,lanes", delta=True, keyframe_every=4)
+    frames = [Frame(seq, float(seq), random_data(rng), {"paused": False}) for seq in range(1, 13)]
+    state = {}
+    for message, frame in zip(receive(subscriber, frames), frames):
+        if message["type"] == "key":
+            state = {field: message[field] for field in ("traffic_lights", "lanes")}
+        else:
+            assert message["base"] == message["seq"] - 1
+            apply(state, {k: v for k, v in message.items() if k in ("traffic_lights", "lanes")})
+        assert state == frame.data
+
+
+def test_keyframe_every_n_frames():
+    subscriber = Subscriber(queue_size=100, topics="tls", delta=True, keyframe_every=3)
+    frames = [Frame(seq, float(seq), {"traffic_lights": {"a": seq}}, {}) for seq in range(1, 8)]
+    types = [message["type"] for message in receive(subscriber, frames)]
+    assert types == ["key", "delta", "delta", "key", "delta", "delta", "key"]
+
+
+def test_dropped_frame_rebases_on_keyframe():
+    subscriber = Subscriber(queue_size=2, topics="tls", delta=True, keyframe_every=100)
+    first = receive(subscriber, [Frame(1, 1.0, {"traffic_lights": {"a": 1}}, {})])
+    assert first[0]["type"] == "key"
+    frames = [Frame(seq, float(seq), {"traffic_lights": {"a": seq}}, {}) for seq in range(2, 5)]
+    messages = receive(subscriber, frames)  # frame 2 is dropped
+    assert subscriber.dropped == 1
+    assert [(m["type"], m["seq"]) for m in messages] == [("key", 3), ("delta", 4)]
+    assert messages[1]["base"] == 3
+
+
+def binary_snapshot() -> SimulationSnapshot:
+    return SimulationSnapshot(
+        step=12, time=12.0, vehicle_count=42,
+        e1={"e1_0": {"vehicle_count": 2, "occupancy": 13.5, "mean_speed": 8.25},
+            "e1_1": {"vehicle_count": 0, "occupancy": 0.0, "mean_speed": -1.0}},
+        e2={"e2_0": {"vehicle_count": 7, "occupancy": 40.0, "mean_speed": 2.5}},
+        traffic_lights={"semaforos": {"current_phase": 3}}
+    )
+
+
+def test_binary_round_trip():
+    snapshot = binary_snapshot()
+    table = IdTable.for_snapshot(snapshot)
+    for compress in (False, True):
+        frame = decode_binary(encode_binary(snapshot, table, seq=5, paused=True, compress=compress), table)
+        assert (frame["seq"], frame["time"], frame["paused"], frame["vehicles"]) == (5, 12.0, True, 42)
+        assert frame["e1_sensors"] == snapshot.e1
+        assert frame["e2_sensors"] == snapshot.e2
+        assert frame["traffic_lights"] == {"semaforos": 3}
+
+
+def test_binary_rejects_other_table():
+    snapshot = binary_snapshot()
+    data = encode_binary(snapshot, IdTable.for_snapshot(snapshot), seq=1)
+    with pytest.raises(ValueError):
+        decode_binary(data, IdTable.for_snapshot(snapshot))